@@ -0,0 +1,239 @@
+"""
+批量话题分析: 从文件或标准输入读取话题，多个话题共用同一组搜索/AI客户端并发处理，
+每个话题完成后立即把结果记录追加到JSONL输出文件，并显示进度和预计剩余时间。
+
+输入每行一个话题，或每行一个JSON对象({"topic": "...", "id": "..."})，空行和#开头的行被忽略。
+
+用法:
+    python batch_analyze.py topics.txt --output batch_results.jsonl --topics 4 --backend http
+    cat topics.jsonl | python batch_analyze.py - --max-llm-requests 16
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from search_and_analyze import (add_arguments, build_clients, build_evidence, build_fetcher, build_retriever,
+                                outcome_status, run_topic)
+
+def read_topics(source):
+    """读取待分析的话题
+
+    Args:
+        source (str): 输入文件路径，"-"表示标准输入
+
+    Returns:
+        list: [{"topic": 话题, "id": 标识}]
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    topics = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                print(f"跳过无法解析的第 {number} 行: {e}")
+                continue
+            if not item.get("topic"):
+                print(f"跳过缺少topic字段的第 {number} 行")
+                continue
+            topics.append({"topic": item["topic"], "id": item.get("id", item["topic"])})
+        else:
+            topics.append({"topic": line, "id": line})
+    return topics
+
+def group_topics(topics):
+    """把同一话题的多个输入合并为一组
+
+    同一话题的各次运行使用同一个话题目录，并发运行会同时写检查点清单、task.json和最终报告，
+    因此每个话题只运行一次，完成记录按组内各输入的标识分别写出。标识相同的重复输入只保留一个。
+
+    Returns:
+        list: [[输入项, ...], ...]，按话题首次出现的顺序
+    """
+    groups = {}
+    for item in topics:
+        items = groups.setdefault(item["topic"], [])
+        if all(other["id"] != item["id"] for other in items):
+            items.append(item)
+    return list(groups.values())
+
+def load_finished(output_path):
+    """读取输出文件中已成功完成的话题标识，用于重新运行时跳过"""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                finished.add(record.get("id"))
+    return finished
+
+class BatchProgress:
+    def __init__(self, total, stream):
+        """批处理进度，根据已完成话题的平均耗时估算剩余时间
+
+        Args:
+            total (int): 话题总数
+            stream: 进度输出流
+        """
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, record):
+        with self._lock:
+            self.done += 1
+            if record["status"] != "ok":
+                self.failed += 1
+            elapsed = time.monotonic() - self.started
+            remaining = self.total - self.done
+            eta = elapsed / self.done * remaining
+            print(f"[{self.done}/{self.total}] {record['status']:<11} {record['topic']} "
+                  f"({record['duration']:.1f}s)  已用 {_format_duration(elapsed)}  "
+                  f"预计剩余 {_format_duration(eta)}", file=self.stream, flush=True)
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+def process_topic(browser, ai, item, args, evidence=None, retriever=None, fetcher=None):
+    """处理单个话题，返回写入输出文件的完成记录"""
+    start = time.monotonic()
+    record = {"id": item["id"], "topic": item["topic"]}
+    try:
+        outcome = run_topic(browser, ai, item["topic"], workers=args.workers,
+                            dedup=not args.no_dedup, store_mode=args.store,
+                            resume=not args.fresh, trace=not args.no_trace, stream=args.stream,
+                            evidence=evidence, retriever=retriever, fetcher=fetcher,
+                            stream_keywords=not args.no_keyword_stream,
+                            incremental=args.incremental or args.synthesis_deadline is not None,
+                            synthesis_deadline=args.synthesis_deadline)
+    except Exception as e:
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+    else:
+        status = outcome_status(outcome)
+        if outcome["error"]:
+            record["error"] = outcome["error"]
+        record.update(status=status, topic_path=outcome["topic_path"],
+                      keywords=len(outcome["keywords"]), final_path=outcome["final_path"])
+    record["duration"] = round(time.monotonic() - start, 3)
+    record["finished"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+def run_batch(browser, ai, topics, args, progress_stream=None, evidence=None, retriever=None, fetcher=None):
+    """并发处理一批话题
+
+    话题级并发由--topics控制，所有话题共用同一组客户端，搜索的全局并发由BrowserSearch
+    的max_concurrency限制，LLM请求由AIClient的限流器控制。重复的话题只运行一次(见group_topics)。
+
+    Returns:
+        list: 完成记录列表(按完成顺序)
+    """
+    groups = group_topics(topics)
+    progress = BatchProgress(sum(len(items) for items in groups), progress_stream or sys.stdout)
+    write_lock = threading.Lock()
+    records = []
+    with open(args.output, 'a', encoding='utf-8') as output:
+        with ThreadPoolExecutor(max_workers=max(1, args.topics)) as executor:
+            futures = {executor.submit(process_topic, browser, ai, items[0], args, evidence, retriever, fetcher): items
+                       for items in groups}
+            for future in as_completed(futures):
+                first = future.result()
+                for item in futures[future]:
+                    record = dict(first, id=item["id"])
+                    with write_lock:
+                        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        output.flush()
+                    records.append(record)
+                    progress.update(record)
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量话题分析")
+    parser.add_argument("input", help="话题文件(每行一个话题或JSON对象)，-表示标准输入")
+    parser.add_argument("--output", default="batch_results.jsonl",
+                        help="完成记录输出文件(JSONL，追加写入)")
+    parser.add_argument("--topics", type=int, default=2, help="同时处理的话题数")
+    parser.add_argument("--max-searches", type=int, default=None,
+                        help="全局同时进行的搜索数上限(默认不限制；win32后端固定为1)")
+    parser.add_argument("--redo", action="store_true",
+                        help="重新处理输出文件中已成功完成的话题")
+    parser.add_argument("--verbose", action="store_true", help="显示每个话题的详细输出")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    topics = read_topics(args.input)
+    if not args.redo:
+        finished = load_finished(args.output)
+        skipped = [t for t in topics if t["id"] in finished]
+        topics = [t for t in topics if t["id"] not in finished]
+        if skipped:
+            print(f"跳过 {len(skipped)} 个已完成的话题")
+    if not topics:
+        print("没有需要处理的话题")
+        return
+    duplicates = len(topics) - len(group_topics(topics))
+    if duplicates:
+        print(f"合并 {duplicates} 个重复的话题，同一话题只运行一次")
+
+    browser, ai, cache = build_clients(args, max_searches=args.max_searches)
+    evidence = build_evidence(args)
+    retriever = build_retriever(args)
+    fetcher = build_fetcher(args)
+    print(f"共 {len(topics)} 个话题，同时处理 {args.topics} 个，结果写入: {args.output}")
+
+    # 多个话题的流程输出会交错在一起，默认只显示进度
+    progress_stream = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            start = time.monotonic()
+            records = run_batch(browser, ai, topics, args, progress_stream=progress_stream,
+                                evidence=evidence, retriever=retriever, fetcher=fetcher)
+            elapsed = time.monotonic() - start
+
+    ok = sum(1 for r in records if r["status"] == "ok")
+    print(f"\n完成 {ok}/{len(records)} 个话题，用时 {_format_duration(elapsed)}，"
+          f"吞吐量 {len(records) / elapsed * 3600:.1f} 话题/小时")
+    print(f"LLM调用重试 {ai.retries} 次，限流状态: {ai.limiter.stats()}")
+    searches, chats = browser.inflight.stats(), ai.inflight.stats()
+    print(f"合并进行中的相同请求: 搜索 {searches['coalesced']}/{searches['calls'] + searches['coalesced']} 次，"
+          f"LLM {chats['coalesced']}/{chats['calls'] + chats['coalesced']} 次")
+    if cache is not None:
+        print(f"LLM缓存命中 {ai.cache_hits} 次，未命中 {ai.cache_misses} 次")
+    if evidence is not None:
+        print(f"复用索引中的搜索结果 {evidence.reused} 次，重新搜索 {evidence.missed} 次")
+    if retriever is not None:
+        stats = retriever.stats()
+        print(f"段落检索: 送入分析 {stats['passages_out']}/{stats['passages_in']} 个结果块，"
+              f"约 {stats['tokens_out']}/{stats['tokens_in']} tokens")
+    if fetcher is not None:
+        stats = fetcher.stats()
+        print(f"深度抓取: 下载 {stats['pages']} 个网页共 {stats['bytes'] / 1024:.0f} KB，复用 {stats['cached']} 个，"
+              f"失败 {stats['failed']} 个，截断 {stats['truncated']} 个，超时 {stats['timed_out']} 个")
+        fetcher.close()
+
+if __name__ == "__main__":
+    main()
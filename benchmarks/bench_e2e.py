@@ -0,0 +1,323 @@
+"""
+离线端到端基准测试: 用假的智谱AI客户端和读取results/快照的搜索后端，完整运行
+生成关键词 → 搜索/分析 → 整合最终分析 的流程，不需要Windows桌面和API密钥。
+
+报告每个话题的总耗时、各阶段延迟分位数、吞吐量(话题/小时)和峰值内存，
+并与JSON基线对比，便于发现性能回退。
+
+用法:
+    python benchmarks/bench_e2e.py --topics 5 --workers 4
+    python benchmarks/bench_e2e.py --save-baseline          # 更新基线
+    python benchmarks/bench_e2e.py --check                  # 有指标回退时返回非零退出码
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import AIClient, BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+import search_and_analyze
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline_e2e.json")
+
+# 越小越好的指标，其余(吞吐量)越大越好
+LOWER_IS_BETTER = ("wall", "p50", "p90", "p99", "max", "mean", "peak_rss_mb")
+
+def percentile(values, q):
+    """按最近秩法计算分位数"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, int(round(q / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": round(percentile(values, 50), 4) if values else None,
+        "p90": round(percentile(values, 90), 4) if values else None,
+        "p99": round(percentile(values, 99), 4) if values else None,
+        "max": round(max(values), 4) if values else None,
+    }
+
+def peak_rss_mb():
+    """进程的峰值常驻内存(MB)，平台不支持时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class StageTimer:
+    def __init__(self):
+        """记录各阶段每次调用的耗时"""
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, elapsed):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(elapsed)
+
+    def wrap(self, obj, method, stage):
+        """用计时包装替换对象上的方法"""
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        setattr(obj, method, timed)
+
+    def wrap_keyword_stream(self, ai):
+        """记录流式生成关键词的总用时(search_tasks)和首个关键词的用时(first_keyword)
+
+        关键词在后台线程中生成，调用返回时还没有结束，因此在生成结束后从KeywordStream读取用时。
+        """
+        original = ai.stream_search_tasks
+        streams = []
+
+        def wrapped(topic):
+            keyword_stream = original(topic)
+            streams.append(keyword_stream)
+            return keyword_stream
+        ai.stream_search_tasks = wrapped
+
+        def collect():
+            while streams:
+                keyword_stream = streams.pop()
+                self.record("search_tasks", keyword_stream.latency)
+                if keyword_stream.first_keyword_latency is not None:
+                    self.record("first_keyword", keyword_stream.first_keyword_latency)
+        return collect
+
+def make_responder(keywords_per_topic, snapshot_keywords):
+    """生成假LLM的回复: 关键词生成请求返回JSON，其余请求返回固定长度的分析文本"""
+    def responder(prompt):
+        if "keywords数组" in prompt:
+            seed = zlib.crc32(prompt.encode('utf-8'))
+            keywords = []
+            for i in range(keywords_per_topic):
+                if snapshot_keywords:
+                    base = snapshot_keywords[(seed + i) % len(snapshot_keywords)]
+                else:
+                    base = "关键词"
+                keywords.append(f"{base} {seed % 1000}-{i}")
+            return json.dumps({"keywords": keywords}, ensure_ascii=False)
+        return "分析结果：" + "要点。" * 80
+    return responder
+
+def run_benchmark(args):
+    snapshot_root = os.path.abspath(args.snapshots)
+    backend = SnapshotSearchBackend(snapshot_root, latency=tuple(args.search_latency),
+                                    failure_rate=args.search_failure_rate, seed=args.seed)
+    snapshot_keywords = sorted(k for k in backend.by_keyword if k)
+    fake = FakeZhipuAI(latency=tuple(args.llm_latency), seed=args.seed,
+                       failure_rate=args.llm_failure_rate,
+                       max_concurrency=args.llm_quota, qps=args.llm_qps_quota,
+                       responder=make_responder(args.keywords, snapshot_keywords))
+    ai = AIClient(client=fake, token_budget=args.token_budget, max_concurrency=args.max_llm_requests)
+    browser = BrowserSearch(backend=backend)
+
+    timer = StageTimer()
+    timer.wrap(ai, "get_search_tasks", "search_tasks")
+    collect_keyword_streams = timer.wrap_keyword_stream(ai)
+    timer.wrap(browser, "search", "search")
+    timer.wrap(ai, "analyze_text", "analyze")
+    timer.wrap(ai, "analyze_final_results", "final_analysis")
+    timer.wrap(ai, "fold_final_analysis", "synthesis_fold")
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    cwd = os.getcwd()
+    topic_walls = []
+    final_ttfts = []
+    completed = 0
+    start = time.perf_counter()
+    try:
+        os.chdir(workdir)
+        for i in range(args.topics):
+            topic = f"基准话题{i}：{snapshot_keywords[i % len(snapshot_keywords)] if snapshot_keywords else i}"
+            topic_start = time.perf_counter()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+                outcome = search_and_analyze.run_topic(
+                    browser, ai, topic, workers=args.workers, store_mode=args.store, resume=False,
+                    stream=args.stream, stream_keywords=not args.no_keyword_stream,
+                    incremental=args.incremental or args.synthesis_deadline is not None,
+                    synthesis_deadline=args.synthesis_deadline)
+            topic_walls.append(time.perf_counter() - topic_start)
+            collect_keyword_streams()
+            if outcome["final_path"]:
+                completed += 1
+                with open(outcome["final_path"], encoding='utf-8') as f:
+                    final_ttfts.append(json.load(f)["timing"]["ttft"])
+            print(f"话题 {i + 1}/{args.topics}: {topic_walls[-1]:.2f}s")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if ai._poller is not None:
+            ai.poller.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "config": {
+            "topics": args.topics,
+            "keywords": args.keywords,
+            "workers": args.workers,
+            "store": args.store,
+            "token_budget": args.token_budget,
+            "llm_latency": args.llm_latency,
+            "search_latency": args.search_latency,
+            "llm_failure_rate": args.llm_failure_rate,
+            "search_failure_rate": args.search_failure_rate,
+            "llm_quota": args.llm_quota,
+            "llm_qps_quota": args.llm_qps_quota,
+            "max_llm_requests": args.max_llm_requests,
+            "stream": args.stream,
+            "keyword_stream": not args.no_keyword_stream,
+            "incremental": args.incremental or args.synthesis_deadline is not None,
+            "synthesis_deadline": args.synthesis_deadline,
+            "seed": args.seed,
+        },
+        "metrics": {
+            "wall": round(elapsed, 3),
+            "topics_per_hour": round(args.topics / elapsed * 3600, 1),
+            "completed_topics": completed,
+            "peak_rss_mb": peak_rss_mb(),
+            "llm_calls": fake.created,
+            "llm_failures": fake.failures,
+            "llm_throttled": fake.throttled,
+            "llm_retries": ai.retries,
+            "search_requests": backend.requests,
+            "search_failures": backend.failures,
+            "topic": summarize(topic_walls),
+            "final_ttft": summarize(final_ttfts),
+            "stages": {stage: summarize(values) for stage, values in sorted(timer.samples.items())},
+        },
+    }
+
+def _flatten(metrics, prefix=""):
+    flat = {}
+    for name, value in metrics.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[key] = value
+    return flat
+
+def compare(baseline, current, threshold):
+    """对比当前结果与基线，打印差异
+
+    Returns:
+        list: 超过阈值的回退指标名
+    """
+    if baseline["config"] != current["config"]:
+        print("\n注意: 基线的配置与本次运行不同，对比结果仅供参考")
+    old = _flatten(baseline["metrics"])
+    new = _flatten(current["metrics"])
+    regressions = []
+    print(f"\n{'指标':<32}{'基线':>12}{'本次':>12}{'变化':>10}")
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        if before is None or after is None:
+            print(f"{key:<32}{before if before is not None else '-':>12}{after if after is not None else '-':>12}")
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = change > threshold if key.rsplit(".", 1)[-1] in LOWER_IS_BETTER else change < -threshold
+        # 计数类指标(调用次数、完成话题数)只显示，不判断回退
+        if key.endswith("count") or key in ("llm_calls", "llm_failures", "llm_throttled", "llm_retries", "search_requests", "search_failures", "completed_topics"):
+            worse = False
+        if worse:
+            regressions.append(key)
+        print(f"{key:<32}{before:>12}{after:>12}{change:>+9.1%}{' !' if worse else ''}")
+    return regressions
+
+def report(result):
+    metrics = result["metrics"]
+    print(f"\n总耗时 {metrics['wall']:.2f}s  吞吐量 {metrics['topics_per_hour']:.1f} 话题/小时  "
+          f"完成 {metrics['completed_topics']}/{result['config']['topics']}  "
+          f"峰值内存 {metrics['peak_rss_mb']} MB")
+    print(f"LLM调用 {metrics['llm_calls']} 次(失败 {metrics['llm_failures']} 次，"
+          f"被限流 {metrics['llm_throttled']} 次，重试 {metrics['llm_retries']} 次)  搜索 {metrics['search_requests']} 次"
+          f"(失败 {metrics['search_failures']} 次)")
+    print(f"\n{'阶段':<16}{'次数':>6}{'平均':>9}{'P50':>9}{'P90':>9}{'P99':>9}{'最大':>9}")
+    rows = [("topic", metrics["topic"]), ("final_ttft", metrics["final_ttft"])] + list(metrics["stages"].items())
+    for name, s in rows:
+        if not s["count"]:
+            continue
+        print(f"{name:<16}{s['count']:>6}{s['mean']:>9.3f}{s['p50']:>9.3f}{s['p90']:>9.3f}"
+              f"{s['p99']:>9.3f}{s['max']:>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    parser.add_argument("--topics", type=int, default=3)
+    parser.add_argument("--keywords", type=int, default=6, help="每个话题的关键词数")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--store", choices=["legacy", "compact", "both"], default="legacy")
+    parser.add_argument("--token-budget", type=int, default=None)
+    parser.add_argument("--llm-latency", type=float, nargs=2, default=[0.3, 1.5], metavar=("MIN", "MAX"),
+                        help="假LLM任务的完成时间范围(秒)")
+    parser.add_argument("--search-latency", type=float, nargs=2, default=[0.1, 0.5], metavar=("MIN", "MAX"),
+                        help="假搜索的耗时范围(秒)")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-quota", type=int, default=None,
+                        help="假LLM服务端的并发配额，超出时提交任务会被限流")
+    parser.add_argument("--llm-qps-quota", type=float, default=None,
+                        help="假LLM服务端的QPS配额")
+    parser.add_argument("--max-llm-requests", type=int, default=None,
+                        help="客户端的LLM并发上限(自适应限流)，默认不限制")
+    parser.add_argument("--stream", action="store_true", help="以流式方式生成最终报告")
+    parser.add_argument("--no-keyword-stream", action="store_true",
+                        help="等全部关键词生成后再开始搜索")
+    parser.add_argument("--incremental", action="store_true", help="增量整合最终报告")
+    parser.add_argument("--synthesis-deadline", type=float, default=None, help="增量整合的截止时间(秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--snapshots", default=os.path.join(ROOT, "results"), help="搜索页面快照目录")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--output", default=None, help="把本次结果另存为JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="判定为回退的相对变化阈值")
+    parser.add_argument("--check", action="store_true", help="存在回退时以非零状态退出")
+    parser.add_argument("--verbose", action="store_true", help="显示流程本身的输出")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    report(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(json.load(f), result, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项指标回退超过 {args.threshold:.0%}: {', '.join(regressions)}")
+    if args.check and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
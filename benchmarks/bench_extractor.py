@@ -0,0 +1,53 @@
+"""
+在results/中已保存的搜索页面快照上测量结构化结果解析的吞吐量和峰值内存
+
+用法:
+    python benchmarks/bench_extractor.py --root results --repeat 5
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.extractor import iter_results
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索结果解析基准测试")
+    parser.add_argument("--root", default="results", help="快照所在目录")
+    parser.add_argument("--repeat", type=int, default=5, help="重复解析次数")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.root, "**", "search_*.html"), recursive=True))
+    if not files:
+        print(f"未在 {args.root} 中找到search_*.html快照")
+        return
+    total_bytes = sum(os.path.getsize(p) for p in files)
+
+    records = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for path in files:
+            records += sum(1 for _ in iter_results(path))
+    elapsed = time.perf_counter() - start
+
+    # 峰值内存单独测量，避免tracemalloc的开销影响吞吐量
+    tracemalloc.start()
+    for path in files:
+        for _ in iter_results(path):
+            pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    megabytes = total_bytes * args.repeat / (1024 * 1024)
+    print(f"快照文件: {len(files)} 个，共 {total_bytes / (1024 * 1024):.2f} MB")
+    print(f"解析结果: 平均每个文件 {records / (len(files) * args.repeat):.1f} 条")
+    print(f"吞吐量:   {megabytes / elapsed:.2f} MB/s ({elapsed:.2f}s / {args.repeat} 轮)")
+    print(f"峰值内存: {peak / 1024:.0f} KB")
+
+if __name__ == "__main__":
+    main()
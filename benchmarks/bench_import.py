@@ -0,0 +1,149 @@
+"""
+入口模块的导入耗时基准测试
+
+在独立的子进程中用 python -X importtime 导入每个命令行入口，取多次运行的中位数，
+报告导入累计耗时、最耗时的子模块，以及是否意外加载了zhipuai、numpy、pywin32等重量级依赖，
+并与JSON基线对比，便于发现启动变慢。
+
+用法:
+    python benchmarks/bench_import.py --repeat 7
+    python benchmarks/bench_import.py --save-baseline          # 更新基线
+    python benchmarks/bench_import.py --check                  # 导入变慢超过阈值时返回非零退出码
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline_import.json")
+
+# 命令行入口，以及单独导入时应当很轻量的包
+ENTRY_POINTS = [
+    "utils",
+    "search_and_analyze",
+    "batch_analyze",
+    "utils.result_store",
+    "utils.evidence_index",
+    "utils.retrieval",
+]
+
+# 只有选用相应后端或功能时才应该加载的依赖
+HEAVY_MODULES = ["zhipuai", "dotenv", "numpy", "win32api", "http.client", "ssl", "asyncio"]
+
+def parse_importtime(stderr, module):
+    """解析-X importtime的输出
+
+    输出按导入完成的顺序排列，子模块在父模块之前，缩进表示层级。
+    目标模块之前最后一个顶层模块(通常是site)之后的行都属于目标模块的导入树。
+
+    Returns:
+        tuple: (目标模块累计耗时(微秒), [(子模块名, 累计耗时)], 加载的模块名集合)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # 名称前固定有一个空格，之后每两个空格表示一层嵌套
+        rows.append((name[1:].rstrip(), int(cumulative)))
+    target = None
+    for i, (name, _) in enumerate(rows):
+        if name.strip() == module and not name.startswith(" "):
+            target = i
+    if target is None:
+        return None, [], set()
+    start = target
+    while start > 0 and rows[start - 1][0].startswith(" "):
+        start -= 1
+    tree = rows[start:target]
+    loaded = {name.strip() for name, _ in tree}
+    children = sorted(((name.strip(), us) for name, us in tree), key=lambda r: r[1], reverse=True)
+    return rows[target][1], children, loaded
+
+def measure(module, repeat, python=sys.executable):
+    """多次导入模块，返回导入耗时中位数(毫秒)、最耗时的子模块和加载的重量级依赖"""
+    times = []
+    children = []
+    loaded = set()
+    for _ in range(repeat):
+        proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return {"error": error}
+        total, children, loaded = parse_importtime(proc.stderr, module)
+        if total is None:
+            return {"error": "没有找到导入记录"}
+        times.append(total / 1000)
+    return {
+        "ms": round(statistics.median(times), 2),
+        "top": [[name, round(us / 1000, 2)] for name, us in children[:5]],
+        "heavy": sorted(m for m in HEAVY_MODULES if m in loaded),
+    }
+
+def compare(baseline, current, threshold):
+    """对比当前结果与基线，打印差异
+
+    Returns:
+        list: 超过阈值的回退入口名
+    """
+    regressions = []
+    print(f"\n{'入口':<24}{'基线(ms)':>10}{'本次(ms)':>10}{'变化':>9}")
+    for module, result in current["modules"].items():
+        before = baseline["modules"].get(module, {}).get("ms")
+        after = result.get("ms")
+        if before is None or after is None:
+            print(f"{module:<24}{before if before is not None else '-':>10}{after if after is not None else '-':>10}")
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = change > threshold
+        new_heavy = set(result["heavy"]) - set(baseline["modules"][module].get("heavy", []))
+        if new_heavy:
+            worse = True
+        if worse:
+            regressions.append(module)
+        note = f"  新加载: {', '.join(sorted(new_heavy))}" if new_heavy else ""
+        print(f"{module:<24}{before:>10.2f}{after:>10.2f}{change:>+8.1%}{' !' if worse else ''}{note}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块导入耗时基准测试")
+    parser.add_argument("--repeat", type=int, default=5, help="每个入口的导入次数，取中位数")
+    parser.add_argument("--module", action="append", default=None, help="只测量指定模块，可重复指定")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.3, help="判定为回退的相对变化阈值")
+    parser.add_argument("--check", action="store_true", help="存在回退时以非零状态退出")
+    args = parser.parse_args()
+
+    result = {"python": sys.version.split()[0], "repeat": args.repeat, "modules": {}}
+    for module in args.module or ENTRY_POINTS:
+        measured = measure(module, args.repeat)
+        result["modules"][module] = measured
+        if "error" in measured:
+            print(f"\n{module}: 导入失败 ({measured['error']})")
+            continue
+        print(f"\n{module}: {measured['ms']:.2f}ms  重量级依赖: {', '.join(measured['heavy']) or '无'}")
+        for name, ms in measured["top"]:
+            print(f"    {name:<40}{ms:>8.2f}ms")
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(json.load(f), result, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 个入口的导入耗时回退超过 {args.threshold:.0%}: {', '.join(regressions)}")
+    if args.check and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+对比旧的逐任务轮询(每个请求一个线程，固定2秒间隔)与共享轮询器的结果获取延迟
+
+用法:
+    python benchmarks/bench_poller.py --requests 100 --min-latency 0.5 --max-latency 6
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ai_client import AIClient
+from utils.fakes import FakeZhipuAI
+
+def legacy_chat(client, prompt, retry_interval=2, max_retries=40):
+    """旧版async_chat的轮询方式: 提交后固定间隔轮询"""
+    response = client.chat.asyncCompletions.create(
+        model="glm-4-flash", messages=[{"role": "user", "content": prompt}])
+    retries = 0
+    while retries <= max_retries:
+        result = client.chat.asyncCompletions.retrieve_completion_result(id=response.id)
+        if result.task_status == "SUCCESS":
+            return result.choices[0].message.content
+        time.sleep(retry_interval)
+        retries += 1
+    return "Request Timeout"
+
+def run_legacy(prompts, latencies):
+    fake = FakeZhipuAI(latency=lambda prompt: latencies[prompt])
+    overheads = [None] * len(prompts)
+
+    def worker(i, prompt):
+        start = time.monotonic()
+        legacy_chat(fake, prompt)
+        overheads[i] = time.monotonic() - start - latencies[prompt]
+
+    threads = [threading.Thread(target=worker, args=(i, p)) for i, p in enumerate(prompts)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.monotonic() - start, overheads, fake.retrieves, len(threads)
+
+def run_poller(prompts, latencies):
+    fake = FakeZhipuAI(latency=lambda prompt: latencies[prompt])
+    ai = AIClient(client=fake)
+    overheads = [None] * len(prompts)
+    start = time.monotonic()
+    futures = []
+    for i, prompt in enumerate(prompts):
+        submitted = time.monotonic()
+        future = ai.submit_chat(prompt)
+        future.add_done_callback(
+            lambda f, i=i, p=prompt, s=submitted: overheads.__setitem__(i, time.monotonic() - s - latencies[p]))
+        futures.append(future)
+    for future in futures:
+        future.result()
+    elapsed = time.monotonic() - start
+    ai.poller.close()
+    return elapsed, overheads, fake.retrieves, 1
+
+def report(name, elapsed, overheads, polls, threads):
+    overheads = sorted(overheads)
+    p95 = overheads[int(len(overheads) * 0.95) - 1]
+    print(f"{name:<8} 总耗时 {elapsed:6.2f}s  额外延迟 平均 {statistics.mean(overheads):.3f}s "
+          f"中位 {statistics.median(overheads):.3f}s P95 {p95:.3f}s  轮询次数 {polls:5d}  等待线程 {threads}")
+
+def main():
+    parser = argparse.ArgumentParser(description="轮询器延迟基准测试")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--min-latency", type=float, default=0.5)
+    parser.add_argument("--max-latency", type=float, default=6.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import random
+    rng = random.Random(args.seed)
+    prompts = [f"prompt-{i}" for i in range(args.requests)]
+    latencies = {p: rng.uniform(args.min_latency, args.max_latency) for p in prompts}
+
+    report("legacy", *run_legacy(prompts, latencies))
+    report("poller", *run_poller(prompts, latencies))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+测量段落检索在大规模归档上的建立和查询耗时
+
+用results/中已保存的搜索结果块合成指定数量的归档结果块(打乱句子顺序并加上编号，避免内容完全相同)，
+在临时目录中建立全文索引和内存映射的归档向量，然后测量归档检索和单个关键词筛选的耗时。
+
+用法:
+    python benchmarks/bench_retrieval.py --passages 50000 --queries 50
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.evidence_index import EvidenceIndex
+from utils.retrieval import HashingVectorizer, PassageArchive, PassageRetriever, inverse_document_frequency
+
+def load_blocks(root):
+    """读取快照中的全部结果块和关键词"""
+    blocks, keywords = [], []
+    for path in sorted(glob.glob(os.path.join(root, "**", "search_*.json"), recursive=True)):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        blocks.extend(b for b in data.get("results") or [] if b.strip())
+        if data.get("keyword"):
+            keywords.append(data["keyword"])
+    return blocks, keywords
+
+def synthesize(blocks, count, rng):
+    """把已有结果块的句子打乱重组为count个互不相同的结果块"""
+    passages = []
+    for i in range(count):
+        sentences = rng.choice(blocks).replace("。", "。\n").splitlines()
+        rng.shuffle(sentences)
+        passages.append(f"{''.join(sentences)} #{i}")
+    return passages
+
+def write_archive(root, passages, keywords, per_file, rng):
+    os.makedirs(root, exist_ok=True)
+    for n, start in enumerate(range(0, len(passages), per_file)):
+        path = os.path.join(root, f"search_bing_{n:06d}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"keyword": rng.choice(keywords), "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+                       "results": passages[start:start + per_file]}, f, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="段落检索基准测试")
+    parser.add_argument("--root", default="results", help="快照所在目录")
+    parser.add_argument("--passages", type=int, default=20000, help="归档结果块数")
+    parser.add_argument("--queries", type=int, default=50, help="查询次数")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    blocks, keywords = load_blocks(args.root)
+    if not blocks:
+        print(f"未在 {args.root} 中找到search_*.json结果")
+        return
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        archive_root = os.path.join(workdir, "results")
+        write_archive(archive_root, synthesize(blocks, args.passages, rng), keywords, 100, rng)
+
+        start = time.perf_counter()
+        index = EvidenceIndex(os.path.join(workdir, "index.sqlite"))
+        index.update(archive_root, verbose=False)
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        archive = PassageArchive(index, os.path.join(workdir, "vectors"), HashingVectorizer(dim=args.dim))
+        archive.update(verbose=False)
+        vector_time = time.perf_counter() - start
+        size = os.path.getsize(os.path.join(workdir, "vectors", "vectors.f32"))
+
+        # 重新打开，模拟新进程通过内存映射使用已有的归档
+        archive = PassageArchive(index, os.path.join(workdir, "vectors"), HashingVectorizer(dim=args.dim))
+        idf = inverse_document_frequency(archive.df, archive.rows)
+        queries = [rng.choice(keywords) for _ in range(args.queries)]
+        start = time.perf_counter()
+        for query in queries:
+            archive.search(archive.vectorizer.query([(query, 1.0)], idf), k=10)
+        search_time = (time.perf_counter() - start) / len(queries)
+
+        retriever = PassageRetriever(archive=archive)
+        start = time.perf_counter()
+        for query in queries:
+            retriever.select(query, "", rng.sample(blocks, min(30, len(blocks))))
+        select_time = (time.perf_counter() - start) / len(queries)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"归档结果块: {archive.rows} 个，向量文件 {size / (1024 * 1024):.1f} MB (dim={args.dim})")
+    print(f"建立全文索引: {index_time:.2f}s")
+    print(f"向量化归档:   {vector_time:.2f}s ({archive.rows / vector_time:.0f} 块/s)")
+    print(f"归档检索:     平均 {search_time * 1000:.2f}ms/次")
+    print(f"关键词筛选:   平均 {select_time * 1000:.2f}ms/次(30个结果块 + 归档)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+离线重新处理results/归档: 改进了结果提取或分析提示后，不重新搜索就能更新已有的结果。
+
+- 用当前的解析器重新提取每个搜索页面快照(search_*.html)，多进程并行；快照通过内存映射分块解码
+  交给流式解析器，不把整个文件读成字符串
+- --analyze用重新提取的结果重新调用analyze_text，--final再按话题重新生成最终报告；LLM调用经过
+  进程内共用的限流器和回复缓存
+- 输出按版本写在原文件旁边，原文件保持不变:
+    search_<引擎>_<时间>.<版本>.json            重新提取的结果
+    search_<引擎>_<时间>.<版本>.analysis.json   重新生成的分析
+    final_analysis.<版本>.json                  重新生成的最终报告
+- 可以中断后重新运行: 快照大小和修改时间未变的提取结果、输入未变的分析和最终报告直接跳过
+
+用法:
+    python reprocess.py results --workers 8
+    python reprocess.py results --version v3 --analyze --final --max-llm-requests 16
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.backends import llm_backend_names
+from utils.extractor import detect_engine, format_record, iter_results
+from utils.rate_limit import LLMError
+from utils.result_store import STORE_DIRNAME, atomic_write, content_hash, is_versioned, versioned_name
+
+# 紧凑存储和深度抓取的网页不是搜索页面快照
+SKIP_DIRS = {STORE_DIRNAME, "pages"}
+
+_TIMESTAMP = re.compile(r'\d{8}_\d{6}')
+
+def find_snapshots(root="results"):
+    """列出root下所有搜索页面快照，按目录和文件名排序"""
+    paths = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            if name.endswith(".html") and "search" in name and not is_versioned(name):
+                paths.append(os.path.join(directory, name))
+    return paths
+
+def read_snapshot(path, engine=None):
+    """通过内存映射流式解析快照文件
+
+    Args:
+        path (str): 快照路径
+        engine (str, optional): 搜索引擎。如果为None则根据文件名推断
+
+    Returns:
+        list: 结构化结果 [{"title", "url", "snippet", "rank"}]
+    """
+    with open(path, 'rb') as f:
+        # 空文件无法映射
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return list(iter_results(view, engine or detect_engine(path)))
+
+def _load(path):
+    """读取JSON文件，不存在或无法解析时返回空字典"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _write_json(path, data):
+    atomic_write(path, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def _source_info(path):
+    stat = os.stat(path)
+    return {"file": os.path.basename(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def reprocess_snapshot(task):
+    """重新提取一个快照并写出版本化的结果文件，在工作进程中执行
+
+    Args:
+        task (tuple): (快照路径, 版本, 是否忽略已有的输出)
+
+    Returns:
+        dict: {"html", "output", "status"(ok/empty/skipped/error), "records", "bytes", "error"}
+    """
+    path, version, force = task
+    output = os.path.join(os.path.dirname(path), versioned_name(os.path.basename(path), version))
+    summary = {"html": path, "output": output, "status": "ok", "records": 0, "bytes": 0, "error": None}
+    try:
+        source = _source_info(path)
+        summary["bytes"] = source["size"]
+        if not force and _load(output).get("source") == source:
+            summary["status"] = "skipped"
+            return summary
+
+        records = read_snapshot(path)
+        original = _load(path[:-len(".html")] + ".json")
+        match = _TIMESTAMP.search(source["file"])
+        _write_json(output, {
+            "keyword": original.get("keyword"),
+            "timestamp": original.get("timestamp") or (match.group(0) if match else None),
+            "version": version,
+            "reprocessed_at": time.strftime("%Y%m%d_%H%M%S"),
+            "engine": detect_engine(path),
+            "source": source,
+            "results": [format_record(r) for r in records],
+            "records": records,
+        })
+        summary["records"] = len(records)
+        if not records:
+            summary["status"] = "empty"
+    except Exception as e:
+        # 单个损坏的快照不影响其他文件
+        summary["status"] = "error"
+        summary["error"] = f"{type(e).__name__}: {e}"
+    return summary
+
+class _Progress:
+    def __init__(self, total, label, interval=2.0):
+        """定期打印处理进度和速度，可被多个线程同时更新"""
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.done = 0
+        self.start = self._last = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def update(self):
+        with self._lock:
+            self.done += 1
+            now = time.perf_counter()
+            if now - self._last >= self.interval and self.done < self.total:
+                self._last = now
+                print(f"{self.label} {self.done}/{self.total}，{self.done / (now - self.start):.1f} 个文件/秒",
+                      flush=True)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+class Reprocessor:
+    def __init__(self, version="v2", workers=None, ai=None, final=False, force=False, llm_workers=8):
+        """重新处理results/归档
+
+        Args:
+            version (str): 输出版本标签，写入文件名，不能包含点
+            workers (int, optional): 提取进程数，默认为CPU核数；不大于1时在当前进程中提取
+            ai (AIClient, optional): 提供时用重新提取的结果重新分析
+            final (bool): 是否按话题重新生成最终报告(需要ai)
+            force (bool): 忽略已有的输出，全部重新处理
+            llm_workers (int): 同时进行分析的线程数，实际并发还受限流器约束
+        """
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', version):
+            raise ValueError(f"Invalid version label: {version}")
+        self.version = version
+        self.workers = workers or os.cpu_count() or 1
+        self.ai = ai
+        self.final = final and ai is not None
+        self.force = force
+        self.llm_workers = llm_workers
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def _extract(self, tasks):
+        """按快照顺序产出提取摘要，多进程时各进程按批领取任务"""
+        if self.workers <= 1 or len(tasks) <= 1:
+            yield from map(reprocess_snapshot, tasks)
+            return
+        chunksize = max(1, min(64, len(tasks) // (self.workers * 8)))
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            yield from pool.map(reprocess_snapshot, tasks, chunksize=chunksize)
+
+    def _analyze(self, output, progress):
+        """重新分析一个快照的提取结果
+
+        Returns:
+            str: 分析结果，没有结果可分析时返回None
+
+        Raises:
+            LLMError: 调用失败
+        """
+        try:
+            results = _load(output).get("results") or []
+            if not results:
+                self._count("analysis_empty")
+                return None
+            results_hash = content_hash(json.dumps(results, ensure_ascii=False))
+            path = output[:-len(".json")] + ".analysis.json"
+            existing = _load(path)
+            if not self.force and existing.get("source_hash") == results_hash and existing.get("analysis"):
+                self._count("analysis_skipped")
+                return existing["analysis"]
+
+            text = "\n".join(results)
+            try:
+                analysis = self.ai.analyze_text(text)
+            except LLMError as e:
+                print(f"分析失败({os.path.basename(output)}): {e}")
+                self._count("analysis_failed")
+                raise
+            _write_json(path, {
+                "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+                "version": self.version,
+                "source": os.path.basename(output),
+                "source_hash": results_hash,
+                "original_text": text,
+                "analysis": analysis,
+            })
+            self._count("analyzed")
+            return analysis
+        finally:
+            progress.update()
+
+    def _final_report(self, topic_path, futures):
+        """用话题目录中各快照的新分析重新生成最终报告"""
+        topic = _load(os.path.join(topic_path, "task.json")).get("topic") \
+            or _load(os.path.join(topic_path, "final_analysis.json")).get("topic")
+        if not topic:
+            # 根目录下的零散文件没有所属话题
+            return
+        failed = sum(1 for future in futures if future.exception() is not None)
+        if failed:
+            print(f"跳过最终报告(有 {failed} 个分析失败): {topic}")
+            self._count("finals_failed")
+            return
+        analyses = [future.result() for future in futures if future.result()]
+        if not analyses:
+            return
+
+        inputs_hash = content_hash(json.dumps(analyses, ensure_ascii=False))
+        path = os.path.join(topic_path, versioned_name("final_analysis.json", self.version))
+        if not self.force and _load(path).get("inputs_hash") == inputs_hash:
+            self._count("finals_skipped")
+            return
+        try:
+            analysis = self.ai.analyze_final_results(topic, analyses)
+        except LLMError as e:
+            print(f"最终报告生成失败({topic}): {e}")
+            self._count("finals_failed")
+            return
+        _write_json(path, {
+            "topic": topic,
+            "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+            "version": self.version,
+            "inputs_hash": inputs_hash,
+            "analysis": analysis,
+        })
+        self._count("finals")
+
+    def run(self, root="results"):
+        """重新处理root下的全部快照
+
+        提取结果一产出就提交分析，分析与其余快照的提取同时进行。
+
+        Returns:
+            dict: 各阶段的计数、字节数和用时
+        """
+        self.counts = {}
+        paths = find_snapshots(root)
+        tasks = [(path, self.version, self.force) for path in paths]
+        extracting = _Progress(len(tasks), "提取")
+        analyzing = _Progress(len(tasks), "分析")
+        by_topic = {}
+        llm = ThreadPoolExecutor(max_workers=self.llm_workers) if self.ai is not None else None
+        try:
+            for summary in self._extract(tasks):
+                self._count(summary["status"])
+                if summary["status"] == "error":
+                    print(f"提取失败({summary['html']}): {summary['error']}")
+                elif summary["status"] != "skipped":
+                    self._count("bytes", summary["bytes"])
+                    self._count("records", summary["records"])
+                extracting.update()
+                if llm is not None and summary["status"] != "error":
+                    future = llm.submit(self._analyze, summary["output"], analyzing)
+                    by_topic.setdefault(os.path.dirname(summary["html"]), []).append(future)
+            self.counts["extract_seconds"] = extracting.elapsed()
+
+            if llm is not None:
+                for futures in by_topic.values():
+                    for future in futures:
+                        future.exception()
+                self.counts["analysis_seconds"] = analyzing.elapsed()
+                if self.final:
+                    list(llm.map(lambda item: self._final_report(*item), by_topic.items()))
+        finally:
+            if llm is not None:
+                llm.shutdown()
+        self.counts["snapshots"] = len(tasks)
+        self.counts["seconds"] = extracting.elapsed()
+        return dict(self.counts)
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else 0.0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线重新处理results/归档")
+    parser.add_argument("root", nargs="?", default="results", help="归档目录(默认: results)")
+    parser.add_argument("--version", default="v2",
+                        help="输出版本标签(默认: v2)，改进提取或提示后换一个新标签以保留之前的输出")
+    parser.add_argument("--workers", type=int, default=None, help="提取进程数(默认: CPU核数)")
+    parser.add_argument("--force", action="store_true", help="忽略已有的输出，全部重新处理")
+    parser.add_argument("--analyze", action="store_true", help="用重新提取的结果重新分析")
+    parser.add_argument("--final", action="store_true", help="重新生成各话题的最终报告(包含--analyze)")
+    parser.add_argument("--llm-backend", choices=llm_backend_names(), default="zhipuai",
+                        help="LLM后端: zhipuai为智谱AI，fake为不调用API的离线替身")
+    parser.add_argument("--token-budget", type=int, default=None,
+                        help="单个提示的内容token上限，超出时分块并行分析并分层合并(map-reduce)")
+    parser.add_argument("--max-llm-requests", type=int, default=8, help="同时进行的LLM请求数上限")
+    parser.add_argument("--qps", type=float, default=None, help="每秒最多提交的LLM任务数(默认不限制)")
+    parser.add_argument("--cache-path", default=os.path.join(".cache", "llm_responses.sqlite"),
+                        help="LLM回复缓存文件路径")
+    parser.add_argument("--cache-mode", choices=["on", "refresh", "off"], default="on", help="缓存模式")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="缓存有效期(秒)，默认永不过期")
+    args = parser.parse_args(argv)
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', args.version):
+        parser.error("--version只能包含字母、数字、下划线和连字符")
+    if not os.path.isdir(args.root):
+        parser.error(f"目录不存在: {args.root}")
+
+    ai = cache = None
+    if args.analyze or args.final:
+        # 提取进程只需要解析器，LLM客户端只在重新分析时才创建
+        from search_and_analyze import build_ai
+        ai, cache = build_ai(args)
+
+    reprocessor = Reprocessor(version=args.version, workers=args.workers, ai=ai, final=args.final,
+                              force=args.force, llm_workers=args.max_llm_requests)
+    print(f"重新处理 {args.root}，版本 {args.version}，{reprocessor.workers} 个提取进程")
+    counts = reprocessor.run(args.root)
+    get = counts.get
+
+    extracted = get("ok", 0) + get("empty", 0)
+    seconds = get("extract_seconds", 0.0)
+    print(f"\n提取: 共 {get('snapshots', 0)} 个快照，重新提取 {extracted} 个"
+          f"({get('bytes', 0) / 1024 / 1024:.1f} MB，{get('records', 0)} 条结果，{get('empty', 0)} 个没有结果)，"
+          f"跳过 {get('skipped', 0)} 个未变化的，失败 {get('error', 0)} 个")
+    print(f"提取用时 {seconds:.2f}s，{_rate(extracted + get('error', 0), seconds):.1f} 个文件/秒，"
+          f"{_rate(get('bytes', 0) / 1024 / 1024, seconds):.1f} MB/秒")
+    if ai is not None:
+        analyzed = get("analyzed", 0)
+        print(f"分析: 重新分析 {analyzed} 个，跳过 {get('analysis_skipped', 0)} 个未变化的，"
+              f"失败 {get('analysis_failed', 0)} 个，用时 {get('analysis_seconds', 0.0):.2f}s，"
+              f"{_rate(analyzed, get('analysis_seconds', 0.0)):.1f} 个文件/秒")
+        if args.final:
+            print(f"最终报告: 重新生成 {get('finals', 0)} 个，跳过 {get('finals_skipped', 0)} 个未变化的，"
+                  f"失败 {get('finals_failed', 0)} 个")
+        print(f"LLM调用重试 {ai.retries} 次，限流状态: {ai.limiter.stats()}")
+        if cache is not None:
+            print(f"LLM缓存命中 {ai.cache_hits} 次，未命中 {ai.cache_misses} 次")
+    print(f"总用时 {get('seconds', 0.0):.2f}s")
+    return 1 if get("error", 0) or get("analysis_failed", 0) or get("finals_failed", 0) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,136 +1,973 @@
 from utils import BrowserSearch, AIClient
+from utils.pipeline import run_pipeline
+from utils.llm_cache import ResponseCache
+from utils.dedup import NearDuplicateFilter
+from utils.result_store import TopicStore, atomic_write, content_hash
+from utils.manifest import TopicManifest
+from utils.evidence_index import DEFAULT_INDEX_PATH, EvidenceIndex, EvidenceReuse
+from utils.rate_limit import LLMError, LLMRateLimiter
+from utils.extractor import extract_results, format_record
+from utils.keyword_stream import KeywordStream
+from utils.synthesis import IncrementalSynthesis
+from utils.backends import llm_backend_names, search_backend_names
+from utils import tracing
+import argparse
+import threading
 import time
 import os
 import json
 import re
 
-def create_topic_dir(topic):
+def _safe_dirname(topic):
+    # 将话题转换为合法的文件夹名
+    return re.sub(r'[\\/:*?"<>|]', '_', topic).strip()
+
+def find_topic_dir(topic, root="results"):
+    """查找话题最近一次运行的目录
+
+    在root下的<话题>和<话题>_<时间戳>目录中，返回时间戳最新、带有该话题检查点清单的一个。
+
+    Returns:
+        str: 话题目录路径，没有可以继续使用的目录时返回None
+    """
+    pattern = re.compile(re.escape(_safe_dirname(topic)) + r'(_\d{8}_\d{6})?$')
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return None
+    candidates = []
+    for name in names:
+        match = pattern.match(name)
+        path = os.path.join(root, name)
+        if match and TopicManifest.exists(path) and TopicManifest(path).data["topic"] in (None, topic):
+            candidates.append((match.group(1) or "", path))
+    return max(candidates)[1] if candidates else None
+
+def create_topic_dir(topic, resume=True):
     """创建话题目录，避免重名
-    
+
     Args:
         topic (str): 话题名称
-        
+        resume (bool): 继续使用该话题最近一次运行的目录(见find_topic_dir)
+
     Returns:
         str: 话题目录路径
     """
-    # 将话题转换为合法的文件夹名
-    safe_topic = re.sub(r'[\\/:*?"<>|]', '_', topic)
-    safe_topic = safe_topic.strip()
-    
+    if resume:
+        topic_path = find_topic_dir(topic)
+        if topic_path is not None:
+            return topic_path
+
     # 基础路径
-    base_path = os.path.join("results", safe_topic)
-    
+    base_path = os.path.join("results", _safe_dirname(topic))
+
     # 如果目录已存在，添加时间戳
     if os.path.exists(base_path):
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         base_path = f"{base_path}_{timestamp}"
-    
+
     os.makedirs(base_path, exist_ok=True)
+    # 立即写入检查点清单，本次运行即使在保存搜索任务之前中断，下次也能找到并继续使用这个目录
+    TopicManifest(base_path).init_topic(topic)
     return base_path
 
-def process_search(browser, ai, keyword, topic_path):
+class TopicRun:
+    def __init__(self, topic_path, topic=None, dedup=None, store=None, legacy=True, manifest=None,
+                 evidence=None, retriever=None, fetcher=None, synthesis=None):
+        """一次话题运行中各关键词共享的状态
+
+        Args:
+            topic_path (str): 话题目录
+            topic (str, optional): 话题名称
+            dedup (NearDuplicateFilter, optional): 话题内共享的去重过滤器，与其他关键词近似重复的结果块不再发送给AI
+            store (TopicStore, optional): 话题的紧凑存储
+            legacy (bool): 是否按旧格式保存search_*.json/html和analysis_*.json文件
+            manifest (TopicManifest, optional): 检查点清单，提供时跳过已完成的阶段
+            evidence (EvidenceReuse, optional): 全文索引，提供时优先复用索引中的已有搜索结果
+            retriever (PassageRetriever, optional): 段落检索，提供时只把最相关的结果块交给AI分析
+            fetcher (PageFetcher, optional): 深度抓取，提供时下载排名靠前的结果网页，正文一并交给AI分析
+            synthesis (IncrementalSynthesis, optional): 增量整合，提供时每个关键词的分析完成后立即并入最终报告
+        """
+        self.topic_path = topic_path
+        self.topic = topic
+        self.dedup = dedup
+        self.store = store
+        self.legacy = legacy
+        self.manifest = manifest
+        self.evidence = evidence
+        self.retriever = retriever
+        self.fetcher = fetcher
+        self.synthesis = synthesis
+        # 增量整合的截止时间到期后设置，尚未开始的关键词不再处理
+        self.stopped = threading.Event()
+
+    def load(self, ref, field):
+        """按清单中记录的位置读取已保存的结果
+
+        Args:
+            ref (dict): {"file": 话题目录下的文件名} 和/或 {"seq": 紧凑存储中的记录序号}
+            field (str): 要读取的字段，如"results"或"analysis"
+
+        Returns:
+            结果内容，无法读取时返回None
+        """
+        if ref.get("file"):
+            path = os.path.join(self.topic_path, ref["file"])
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    return json.load(f).get(field)
+        if ref.get("seq") is not None and self.store is not None:
+            record = self.store.get(ref["seq"])
+            if record is not None:
+                return record.get(field)
+        return None
+
+    def load_html(self, ref):
+        """读取清单中记录的HTML源码，无法读取时返回None"""
+        if ref.get("html_file"):
+            path = os.path.join(self.topic_path, ref["html_file"])
+            if os.path.exists(path):
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    return f.read()
+        if ref.get("html_blob") and self.store is not None:
+            return self.store.get_blob(ref["html_blob"])
+        return None
+
+def _results_hash(results):
+    return content_hash(json.dumps(results, ensure_ascii=False))
+
+def _resume_results(browser, keyword, run):
+    """尝试从检查点恢复关键词的搜索结果
+
+    Returns:
+        list: 已提取的搜索结果，无法恢复时返回None
+    """
+    manifest = run.manifest
+    extracted = manifest.stage(keyword, "extracted")
+    if extracted:
+        results = run.load(extracted["ref"], "results")
+        if results and _results_hash(results) == extracted["hash"]:
+            print(f"\n跳过已完成的搜索: {keyword}")
+            tracing.current_span().set(resumed=True)
+            return results
+
+    # 页面已保存但结果未提取(或提取结果丢失)时，直接从保存的HTML重新提取
+    searched = manifest.stage(keyword, "searched")
+    if searched:
+        html = run.load_html(searched["ref"])
+        if html:
+            records = extract_results(html, browser.search_engine)
+            if records:
+                results = [format_record(r) for r in records]
+                manifest.mark(keyword, "extracted", ref=searched["ref"],
+                              hash=_results_hash(results), source_hash=searched["hash"])
+                print(f"\n从已保存的页面重新提取搜索结果: {keyword}")
+                tracing.current_span().set(resumed=True)
+                return results
+    return None
+
+def search_keyword(browser, keyword, run):
+    """搜索单个关键词并保存搜索结果，启用深度抓取时追加结果网页的正文
+
+    Returns:
+        list: 搜索结果列表，如果失败则返回None
+    """
+    results = _search_results(browser, keyword, run)
+    if results and run.fetcher is not None:
+        results = results + fetch_pages(keyword, results, run)
+    return results
+
+def fetch_pages(keyword, results, run):
+    """下载排名靠前的结果网页并提取正文
+
+    网页和正文保存在话题目录的pages/中，已下载过的网页直接读取保存的正文，从检查点继续时不会重新下载。
+
+    Returns:
+        list: 网页正文切分成的结果块
+    """
+    with tracing.span("deep_fetch", keyword=keyword) as span:
+        blocks, pages = run.fetcher.fetch_results(results, os.path.join(run.topic_path, "pages"))
+        span.set(blocks=len(blocks))
+    if pages:
+        ok = sum(1 for page in pages if page["status"] == "ok")
+        notes = [f"{name} {count}" for name, count in (
+            ("缓存", sum(1 for page in pages if page.get("cached"))),
+            ("截断", sum(1 for page in pages if page["truncated"])),
+            ("超时", sum(1 for page in pages if page["timed_out"])),
+            ("失败", sum(1 for page in pages if page["status"] in ("error", "timeout")))) if count]
+        print(f"深度抓取 {ok}/{len(pages)} 个网页，得到 {len(blocks)} 个正文块"
+              + (f"({'，'.join(notes)})" if notes else ""))
+    return blocks
+
+def _search_results(browser, keyword, run):
+    """search_keyword的搜索和保存部分，不包括深度抓取"""
+    if run.manifest is not None:
+        results = _resume_results(browser, keyword, run)
+        if results:
+            return results
+
+    results = html = reused = None
+    pages, extra, engine = {}, None, browser.search_engine
+    if run.evidence is not None:
+        reused = run.evidence.lookup(keyword)
+        if reused:
+            results = reused["results"]
+            # 记录来源的生成时间，索引按它判断是否过期，复用的结果不会被当作新的搜索
+            extra = {"reused": {"created": reused["created"], "sources": reused["sources"]}}
+            print(f"\n复用索引中的 {len(results)} 条已有搜索结果: {keyword}")
+            tracing.current_span().set(reused=len(results))
+    if not results:
+        if browser.multi_engine:
+            # 多引擎融合结果没有单一的HTML源码，各引擎的页面分别保存
+            merged = browser.search_engines(keyword)
+            results, pages = merged["results"], merged["pages"]
+            extra, engine = {"engines": merged["engines"]}, "multi"
+            summary = "，".join(f"{name} {s['status']} {s['latency']:.1f}s" for name, s in merged["engines"].items())
+            print(f"\n多引擎搜索: {keyword}，融合后 {len(results)} 条结果({summary})")
+        else:
+            results, html = browser.search(keyword)
+    if results:
+        ref = {}
+        # 保存搜索结果到话题目录
+        if run.legacy:
+            for page_engine, page in pages.items():
+                browser.save_results(keyword, [], page, run.topic_path, engine=page_engine)
+            json_path, html_path = browser.save_results(
+                keyword,
+                results,
+                html,
+                run.topic_path,
+                engine=engine,
+                extra=extra
+            )
+            if json_path:
+                print(f"搜索结果已保存到: {json_path}")
+                ref["file"] = os.path.basename(json_path)
+                if run.evidence is not None and not reused:
+                    run.evidence.record(json_path)
+            if html_path:
+                ref["html_file"] = os.path.basename(html_path)
+        if run.store is not None:
+            if pages:
+                extra = dict(extra, pages={e: run.store.put_blob(page) for e, page in pages.items()})
+            ref["seq"] = run.store.save_search(keyword, results, html, engine=engine, extra=extra)
+            if html:
+                ref["html_blob"] = content_hash(html)
+            print(f"搜索结果已追加到话题存储: #{ref['seq']}")
+
+        if run.manifest is not None:
+            html_hash = content_hash(html) if html else None
+            run.manifest.mark(keyword, "searched", ref=ref, hash=html_hash)
+            run.manifest.mark(keyword, "extracted", ref=ref, hash=_results_hash(results),
+                              source_hash=html_hash)
+        return results
+
+    if run.manifest is not None:
+        run.manifest.mark_failed(keyword, "searched", "未获取到搜索结果")
+    return None
+
+def dedup_results(keyword, results, run):
+    """去除与前面关键词重复的结果块
+
+    必须按关键词顺序串行调用(顺序模式下在搜索之后，流水线模式下在进入分析队列之前)，
+    每个关键词保留哪些结果块因此与线程调度无关。保留的结果块在该关键词分析成功后才确认，
+    分析失败时撤销，后面的关键词不会再把它们当作重复内容丢弃(见analyze_keyword)。
+
+    Returns:
+        list: 保留的结果块
+    """
+    if run.dedup is None:
+        return results
+    total = len(results)
+    with tracing.span("dedup", keyword=keyword, blocks=total) as span:
+        blocks = run.dedup.filter(results, owner=keyword)
+        span.set(kept=len(blocks))
+    if len(blocks) < total:
+        print(f"去除 {total - len(blocks)}/{total} 个与其他关键词重复的结果块({keyword})")
+    return blocks
+
+def analyze_results(ai, results, run, keyword=None, blocks=None):
+    """分析单个关键词的搜索结果并保存
+
+    Args:
+        results (list): 关键词的搜索结果，检查点按它判断已有的分析是否仍然有效
+        blocks (list, optional): 去重后实际交给AI的结果块，默认为results
+
+    Returns:
+        str: 分析结果，如果全部结果都是重复内容则返回None
+    """
+    manifest = run.manifest
+    results_hash = _results_hash(results)
+    if manifest is not None and keyword is not None:
+        analyzed = manifest.stage(keyword, "analyzed")
+        if analyzed and analyzed.get("source_hash") == results_hash:
+            if analyzed.get("skipped"):
+                # 上次全部结果都是重复内容；这次仍然没有保留的结果块时不必分析
+                if not blocks:
+                    print(f"跳过全部结果都是重复内容的关键词: {keyword}")
+                    tracing.current_span().set(resumed=True)
+                    return None
+            else:
+                analysis = run.load(analyzed["ref"], "analysis")
+                if analysis:
+                    print(f"跳过已完成的分析: {keyword}")
+                    tracing.current_span().set(resumed=True)
+                    return analysis
+
+    if blocks is not None:
+        results = blocks
+    if not results:
+        if manifest is not None and keyword is not None:
+            # 记为已完成，否则这个关键词一直留在待完成列表中，每次继续运行都要重新搜索和去重
+            manifest.mark(keyword, "analyzed", ref={}, hash=None, source_hash=results_hash, skipped="duplicate")
+        return None
+
+    if run.retriever is not None:
+        total = len(results)
+        results, archived = run.retriever.select(keyword or "", run.topic or "", results)
+        print(f"按相关度选出 {len(results) - archived}/{total} 个结果块"
+              + (f"，另从归档中补充 {archived} 个" if archived else ""))
+
+    print("\n正在分析搜索结果...")
+    try:
+        analysis = ai.analyze_text("\n".join(results))
+    except LLMError as e:
+        # 失败的分析不保存，检查点中记为失败，下次运行时重试
+        print(f"分析失败({keyword}): {e}")
+        if manifest is not None and keyword is not None:
+            manifest.mark_failed(keyword, "analyzed", e)
+        return None
+
+    # 保存分析结果到话题目录
+    ref = {}
+    if run.legacy:
+        analysis_path = ai.save_analysis(
+            "\n".join(results),
+            analysis,
+            topic_path=run.topic_path
+        )
+        ref["file"] = os.path.basename(analysis_path)
+        print(f"分析结果已保存到: {analysis_path}")
+    if run.store is not None:
+        ref["seq"] = run.store.save_analysis("\n".join(results), analysis, keyword=keyword)
+        print(f"分析结果已追加到话题存储: #{ref['seq']}")
+
+    if manifest is not None and keyword is not None:
+        manifest.mark(keyword, "analyzed", ref=ref, hash=content_hash(analysis),
+                      source_hash=results_hash)
+    return analysis
+
+def process_search(browser, ai, keyword, run):
     """处理单个搜索关键词
-    
+
     Returns:
         str: 分析结果，如果失败则返回None
     """
-    if browser.open_browser(keyword):
-        print(f"\n正在搜索: {keyword}")
-        print("浏览器已打开，等待页面加载...")
-        time.sleep(3)
-        
-        hwnd = browser.find_window(keyword)
-        if hwnd:
-            print("找到浏览器窗口，获取内容中...")
-            time.sleep(3)
-            
-            results, html = browser.get_page_content(hwnd)
-            if results:
-                # 保存搜索结果到话题目录
-                json_path, html_path = browser.save_results(
-                    keyword, 
-                    results, 
-                    html, 
-                    topic_path
-                )
-                if json_path:
-                    print(f"搜索结果已保存到: {json_path}")
-                
-                # 分析结果
-                print("\n正在分析搜索结果...")
-                analysis = ai.analyze_text("\n".join(results))
-                
-                # 保存分析结果到话题目录
-                analysis_path = ai.save_analysis(
-                    "\n".join(results), 
-                    analysis,
-                    topic_path=topic_path
-                )
-                print(f"分析结果已保存到: {analysis_path}")
-                return analysis
+    with tracing.span("search", keyword=keyword):
+        results = search_keyword(browser, keyword, run)
+    if results and not run.stopped.is_set():
+        return analyze_keyword(ai, keyword, results, run, blocks=dedup_results(keyword, results, run))
     return None
 
-def main():
+def analyze_keyword(ai, keyword, results, run, blocks=None):
+    """分析单个关键词的搜索结果，启用增量整合时把分析并入最终报告
+
+    Args:
+        blocks (list, optional): dedup_results保留的结果块
+    """
+    analysis = None
+    try:
+        with tracing.span("analyze", keyword=keyword):
+            analysis = analyze_results(ai, results, run, keyword=keyword, blocks=blocks)
+    finally:
+        if run.dedup is not None:
+            # 分析失败时撤销这个关键词保留的结果块，避免它们在本次运行中始终得不到分析
+            if analysis:
+                run.dedup.commit(keyword)
+            else:
+                run.dedup.release(keyword)
+    if analysis and run.synthesis is not None:
+        run.synthesis.add(keyword, analysis)
+    return analysis
+
+def save_task(run, keywords):
+    """保存话题的搜索任务: task.json、紧凑存储中的task记录和检查点清单"""
+    task_path = os.path.join(run.topic_path, "task.json")
+    with open(task_path, 'w', encoding='utf-8') as f:
+        json.dump({"topic": run.topic, "keywords": keywords}, f, ensure_ascii=False, indent=2)
+        tracing.count("bytes_written", f.tell())
+    print(f"搜索任务已保存到: {task_path}")
+    if run.store is not None:
+        run.store.append("task", {"topic": run.topic, "keywords": keywords}, key=run.topic)
+    run.manifest.set_task(run.topic, keywords)
+
+def process_keywords(browser, ai, keywords, run, workers=1):
+    """处理话题的全部关键词
+
+    Args:
+        keywords (iterable): 关键词列表，或边生成边产出关键词的KeywordStream
+        workers (int): 分析并发数。大于1时使用流水线模式，搜索与分析并发执行
+
+    Returns:
+        list: 按关键词顺序排列的有效分析结果；关键词流只保留最终关键词列表中的关键词
+    """
+    produced = []
+    streamed = isinstance(keywords, KeywordStream)
+
+    def iterate():
+        for keyword in keywords:
+            if streamed:
+                if not produced:
+                    print(f"\n首个搜索关键词已生成，用时 {keywords.first_keyword_latency:.2f}s")
+                if run.manifest is not None:
+                    run.manifest.add_keyword(keyword)
+            if run.stopped.is_set():
+                # 截止时间已过，剩余的关键词留在检查点中，下次运行时处理
+                continue
+            produced.append(keyword)
+            yield keyword
+        if streamed and keywords.keywords:
+            print(f"\n搜索关键词生成完毕，共 {len(keywords.keywords)} 个，用时 {keywords.latency:.2f}s")
+            save_task(run, keywords.keywords)
+
+    if workers <= 1:
+        analyses = []
+        for keyword in iterate():
+            print(f"\n处理关键词: {keyword}")
+            analyses.append(process_search(browser, ai, keyword, run))
+    else:
+        analyses = _pipeline_keywords(browser, ai, iterate(), run, workers)
+
+    if streamed:
+        extra = keywords.extra(produced)
+        if extra:
+            # 流式解析与完整回复的解析结果不一致时，以完整回复为准
+            print(f"忽略不在最终关键词列表中的 {len(extra)} 个关键词: {', '.join(map(str, extra))}")
+            analyses = [a for keyword, a in zip(produced, analyses) if keyword not in extra]
+    return [a for a in analyses if a]
+
+def _pipeline_keywords(browser, ai, keywords, run, workers):
+    """以流水线模式处理关键词，返回与关键词顺序一致的分析结果(失败为None)"""
+
+    # 截止时间到期后，已经排队但尚未开始的搜索和分析直接跳过，留在检查点中下次处理
+    def search_fn(keyword):
+        if run.stopped.is_set():
+            return None
+        print(f"\n处理关键词: {keyword}")
+        with tracing.span("search", keyword=keyword):
+            return search_keyword(browser, keyword, run)
+
+    def prepare_fn(keyword, results):
+        return results, dedup_results(keyword, results, run)
+
+    def analyze_fn(keyword, prepared):
+        if run.stopped.is_set():
+            return None
+        results, blocks = prepared
+        return analyze_keyword(ai, keyword, results, run, blocks=blocks)
+
+    search_workers = workers if browser.backend.concurrent else 1
+    return run_pipeline(keywords, search_fn, analyze_fn, workers=workers, search_workers=search_workers,
+                        prepare_fn=prepare_fn)
+
+def _process_until_deadline(browser, ai, keywords, run, workers):
+    """在后台线程中处理关键词，最多等到增量整合的截止时间
+
+    到期时设置run.stopped，尚未开始的搜索和分析不再进行；进行中的调用在后台继续完成并写入检查点，
+    但不再并入最终报告。
+
+    Returns:
+        tuple: (分析结果列表，到期时为None; 到期时仍在处理关键词的线程，调用方定稿后须等它结束，
+            否则run_topic返回后它还在写检查点清单)
+    """
+    done = {}
+
+    def work():
+        try:
+            done["analyses"] = process_keywords(browser, ai, keywords, run, workers=workers)
+        except BaseException as e:
+            done["error"] = e
+
+    thread = threading.Thread(target=tracing.bind(work), name="keywords", daemon=True)
+    thread.start()
+    thread.join(run.synthesis.remaining())
+    if thread.is_alive():
+        run.stopped.set()
+        return None, thread
+    if "error" in done:
+        raise done["error"]
+    return done["analyses"], None
+
+def generate_final_analysis(ai, topic, analyses, stream=False):
+    """生成最终分析报告并记录首个token用时和总用时
+
+    Args:
+        stream (bool): 是否使用流式接口，边生成边输出到控制台；流式请求失败时自动改用异步请求
+
+    Returns:
+        tuple: (最终分析, {"mode": 调用方式, "ttft": 首个token用时, "total": 总用时})
+
+    Raises:
+        LLMError: 调用失败
+    """
+    start = time.perf_counter()
+    timing = {"mode": "stream" if stream else "async", "ttft": None, "total": None}
+    on_token = None
+    if stream:
+        print("\n最终分析结果:")
+        print("="*50)
+
+        def on_token(text):
+            if timing["ttft"] is None:
+                timing["ttft"] = time.perf_counter() - start
+            print(text, end="", flush=True)
+
+    with tracing.span("final_analysis", analyses=len(analyses), mode=timing["mode"]) as span:
+        final_analysis = ai.analyze_final_results(topic, analyses, on_token=on_token)
+        timing["total"] = time.perf_counter() - start
+        if timing["ttft"] is None:
+            # 异步请求在整份报告生成后才返回，首个token用时等于总用时
+            timing["ttft"] = timing["total"]
+        timing["ttft"] = round(timing["ttft"], 4)
+        timing["total"] = round(timing["total"], 4)
+        span.set(ttft=timing["ttft"], total=timing["total"])
+    if stream:
+        print()
+        print("="*50)
+    return final_analysis, timing
+
+def run_topic(browser, ai, topic, workers=1, dedup=True, store_mode="legacy", resume=True, trace=True,
+              stream=False, evidence=None, retriever=None, fetcher=None, stream_keywords=True,
+              incremental=False, synthesis_deadline=None, on_start=None):
+    """完整分析一个话题: 生成关键词、逐个搜索分析、整合最终报告
+
+    Args:
+        browser (BrowserSearch): 搜索客户端
+        ai (AIClient): AI客户端
+        topic (str): 话题
+        workers (int): 分析并发数
+        dedup (bool): 是否启用跨关键词去重
+        store_mode (str): 结果存储格式("legacy"/"compact"/"both")
+        resume (bool): 是否从已有的检查点继续
+        trace (bool): 是否记录各阶段耗时，写入话题目录的trace.json并打印汇总表
+        stream (bool): 是否以流式方式生成最终报告，边生成边输出到控制台
+        evidence (EvidenceReuse, optional): 全文索引，提供时优先复用最近的高相关搜索结果而不是重新搜索
+        retriever (PassageRetriever, optional): 段落检索，提供时每个关键词只分析token预算内最相关的结果块
+        fetcher (PageFetcher, optional): 深度抓取，提供时下载每个关键词排名靠前的结果网页并分析其正文
+        stream_keywords (bool): 是否流式生成搜索关键词，每生成一个关键词就开始搜索，不必等全部关键词生成
+        incremental (bool): 是否增量整合最终报告，每个关键词的分析完成后立即并入并发布临时报告
+        synthesis_deadline (float, optional): 增量整合的截止时间(秒)，到期后以已到达的分析定稿
+        on_start (callable, optional): 话题目录确定后调用on_start(话题目录)，服务模式据此查询各关键词的进度
+
+    Returns:
+        dict: 运行结果，包含topic_path、keywords、final_analysis、final_path(没有生成最终分析时为None)
+            和partial(最终报告是否因截止时间到期而只包含部分关键词)
+    """
+    if not trace:
+        return _run_topic(browser, ai, topic, workers, dedup, store_mode, resume, stream, evidence,
+                          retriever, fetcher, stream_keywords, incremental, synthesis_deadline, on_start)
+
+    tracer = tracing.Tracer(topic)
+    with tracer.activate():
+        with tracer.span("topic", topic=topic, workers=workers):
+            outcome = _run_topic(browser, ai, topic, workers, dedup, store_mode, resume, stream, evidence,
+                                 retriever, fetcher, stream_keywords, incremental, synthesis_deadline, on_start)
+    trace_path = tracer.save(os.path.join(outcome["topic_path"], "trace.json"))
+    print("\n各阶段耗时:")
+    print(tracer.format_summary())
+    print(f"追踪记录已保存到: {trace_path}")
+    return outcome
+
+def _run_topic(browser, ai, topic, workers, dedup, store_mode, resume, stream, evidence, retriever, fetcher,
+               stream_keywords, incremental, synthesis_deadline, on_start):
+    """run_topic的实际流程，参数含义相同"""
+    # 1. 创建话题目录
+    topic_path = create_topic_dir(topic, resume=resume)
+    if on_start is not None:
+        on_start(topic_path)
+    manifest = TopicManifest(topic_path)
+    # 只有保存过搜索任务才算继续运行；流式生成关键词时中断的运行只留下部分关键词，
+    # 需要重新生成完整的关键词列表，已完成的关键词阶段仍按检查点跳过
+    resumed = manifest.data["topic"] == topic and bool(manifest.data["task_hash"])
+    if resumed:
+        print(f"\n继续未完成的话题: {topic_path}")
+    elif manifest.keywords:
+        print(f"\n继续未完成的话题: {topic_path}(搜索任务未保存完整，重新生成搜索关键词)")
+    else:
+        print(f"\n已创建话题目录: {topic_path}")
+    outcome = {"topic": topic, "topic_path": topic_path, "keywords": [],
+               "final_analysis": None, "final_path": None, "partial": False, "error": None}
+
+    # 2. 获取搜索任务
+    store = TopicStore.for_topic(topic_path) if store_mode != "legacy" else None
+    run = TopicRun(topic_path, topic=topic, dedup=NearDuplicateFilter() if dedup else None,
+                   store=store, legacy=store_mode != "compact", manifest=manifest, evidence=evidence,
+                   retriever=retriever, fetcher=fetcher)
+    keyword_stream = None
+    if resumed:
+        keywords = manifest.keywords
+        print(f"使用已保存的 {len(keywords)} 个搜索关键词，待完成 {len(manifest.pending())} 个")
+    elif stream_keywords:
+        # 关键词边生成边交给搜索，生成结束后再保存搜索任务
+        print("\n正在生成搜索关键词，每生成一个就开始搜索...")
+        keywords = keyword_stream = ai.stream_search_tasks(topic)
+    else:
+        print("\n正在生成搜索关键词...")
+        try:
+            with tracing.span("search_tasks"):
+                keywords = ai.get_search_tasks(topic)
+        except LLMError as e:
+            print(f"生成搜索关键词失败: {e}")
+            outcome["error"] = str(e)
+            return outcome
+
+    if keyword_stream is None:
+        if not keywords:
+            print("未能生成有效的搜索关键词")
+            return outcome
+        outcome["keywords"] = keywords
+        if not resumed:
+            save_task(run, keywords)
+
+    # 3. 执行每个关键词的搜索和分析
+    final_path = os.path.join(topic_path, "final_analysis.json")
+    if incremental and not (resumed and not manifest.pending()):
+        run.synthesis = IncrementalSynthesis(ai, topic, path=final_path, deadline=synthesis_deadline)
+        print("\n增量整合最终报告: 每完成一个关键词的分析就并入报告"
+              + (f"，{synthesis_deadline:g}s后定稿" if synthesis_deadline is not None else ""))
+    if run.synthesis is not None and run.synthesis.deadline is not None:
+        analyses, unfinished = _process_until_deadline(browser, ai, keywords, run, workers)
+        if unfinished is not None:
+            outcome["keywords"] = manifest.keywords
+            try:
+                return _finish_partial(run, outcome)
+            finally:
+                # 定稿不必等待，但话题目录要等进行中的调用都写完检查点后才能交给下一次运行
+                if unfinished.is_alive():
+                    print("\n等待进行中的关键词调用完成...")
+                unfinished.join()
+    else:
+        analyses = process_keywords(browser, ai, keywords, run, workers=workers)
+    if run.synthesis is not None and (not analyses or (keyword_stream is not None and keyword_stream.error)):
+        run.synthesis.close()
+    if keyword_stream is not None:
+        if keyword_stream.error is not None:
+            if not isinstance(keyword_stream.error, LLMError):
+                raise keyword_stream.error
+            print(f"生成搜索关键词失败: {keyword_stream.error}")
+            outcome["error"] = str(keyword_stream.error)
+            return outcome
+        if not keyword_stream.keywords:
+            print("未能生成有效的搜索关键词")
+            return outcome
+        outcome["keywords"] = keyword_stream.keywords
+    if run.dedup is not None:
+        stats = run.dedup.stats()
+        print(f"\n去重: 丢弃 {stats['blocks_dropped']}/{stats['blocks_seen']} 个重复结果块，"
+              f"节省 {stats['chars_saved']} 字符(约 {stats['tokens_saved']} tokens)")
+
+    if analyses:
+        inputs_hash = content_hash(json.dumps([topic, analyses], ensure_ascii=False))
+        shown = False
+        if manifest.final_is_current(inputs_hash):
+            # 各关键词的分析没有变化，沿用已有的最终分析
+            with open(final_path, encoding='utf-8') as f:
+                final_analysis = json.load(f)["analysis"]
+            print("\n各关键词分析未变化，沿用已有的最终分析")
+            if run.synthesis is not None:
+                run.synthesis.close()
+        elif run.synthesis is not None:
+            # 增量整合: 全部分析都已并入滚动的综述，等最后一次合并完成后定稿
+            try:
+                final_record = run.synthesis.finish()
+            except LLMError as e:
+                print(f"整合分析结果失败: {e}")
+                outcome["error"] = str(e)
+                return outcome
+            final_analysis = final_record["analysis"]
+            timing = final_record["timing"]
+            print(f"\n首份临时报告用时 {timing['ttft']:.2f}s，定稿用时 {timing['total']:.2f}s"
+                  f"(增量整合，合并 {final_record['synthesis']['folds']} 次)")
+            if store is not None:
+                store.append("final", final_record, key=topic)
+            manifest.mark_final(inputs_hash)
+        else:
+            # 4. 整合分析结果
+            print("\n正在整合所有分析结果...")
+            try:
+                final_analysis, timing = generate_final_analysis(ai, topic, analyses, stream=stream)
+            except LLMError as e:
+                print(f"整合分析结果失败: {e}")
+                outcome["error"] = str(e)
+                return outcome
+            shown = stream
+            print(f"\n首个token用时 {timing['ttft']:.2f}s，总用时 {timing['total']:.2f}s"
+                  f"({'流式' if stream else '异步'})")
+
+            # 保存最终分析，写完整个文件后再替换，中断时不会留下不完整的报告
+            final_record = {
+                "topic": topic,
+                "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+                "analysis": final_analysis,
+                "timing": timing
+            }
+            atomic_write(final_path, json.dumps(final_record, ensure_ascii=False, indent=2).encode('utf-8'))
+            if store is not None:
+                store.append("final", final_record, key=topic)
+            manifest.mark_final(inputs_hash)
+
+        # 显示最终分析
+        if not shown:
+            _print_final(final_analysis)
+        print(f"\n最终分析已保存到: {final_path}")
+        outcome.update(final_analysis=final_analysis, final_path=final_path)
+    return outcome
+
+def outcome_status(outcome):
+    """把run_topic的运行结果归类为完成状态
+
+    Returns:
+        str: "ok"、"partial"(截止时间到期时只整合了部分关键词)、"failed"、"no_keywords"或"no_results"
+    """
+    if outcome["error"]:
+        return "failed"
+    if not outcome["keywords"]:
+        return "no_keywords"
+    if outcome["final_path"] is None:
+        return "no_results"
+    if outcome["partial"]:
+        return "partial"
+    return "ok"
+
+def _print_final(final_analysis):
+    print("\n最终分析结果:")
+    print("="*50)
+    print(final_analysis)
+    print("="*50)
+
+def _finish_partial(run, outcome):
+    """增量整合的截止时间到期: 以已经到达的分析定稿
+
+    部分定稿的报告不记入检查点，继续运行同一话题时会补全剩余关键词并重新定稿。
+    """
+    print("\n综合分析截止时间已到，以已完成的关键词分析定稿...")
+    try:
+        final_record = run.synthesis.finish(partial=True)
+    except LLMError as e:
+        print(f"整合分析结果失败: {e}")
+        outcome["error"] = str(e)
+        return outcome
+    if final_record is None:
+        print("截止时间前没有完成任何关键词的分析")
+        return outcome
+
+    folded = final_record["synthesis"]["keywords"]
+    missing = [keyword for keyword in outcome["keywords"] if keyword not in folded]
+    print(f"最终报告并入 {len(folded)} 个关键词的分析，未完成 {len(missing)} 个"
+          + (f": {', '.join(missing)}" if missing else ""))
+    if run.store is not None:
+        run.store.append("final", final_record, key=run.topic)
+    _print_final(final_record["analysis"])
+    print(f"\n最终分析已保存到: {run.synthesis.path}")
+    outcome.update(final_analysis=final_record["analysis"], final_path=run.synthesis.path, partial=True)
+    return outcome
+
+def add_arguments(parser):
+    """添加话题运行和客户端相关的命令行参数，交互模式与批处理模式共用"""
+    parser.add_argument("--workers", type=int, default=1,
+                        help="分析并发数，大于1时启用搜索/分析流水线模式(默认: 1，顺序执行)")
+    parser.add_argument("--backend", choices=search_backend_names(), default="win32",
+                        help="搜索后端: win32使用浏览器窗口，http直接请求搜索页面(可跨平台、可并发)，"
+                             "snapshot读取results/中的页面快照")
+    parser.add_argument("--engines", default=None,
+                        help="同时查询的搜索引擎，逗号分隔(如bing,baidu)，结果按倒数排名融合；需要支持并发的后端")
+    parser.add_argument("--engine-timeout", type=float, default=15.0,
+                        help="多引擎模式下每个引擎的最长等待时间(秒，默认: 15)")
+    parser.add_argument("--llm-backend", choices=llm_backend_names(), default="zhipuai",
+                        help="LLM后端: zhipuai为智谱AI，fake为不调用API的离线替身")
+    parser.add_argument("--search-url", default=None,
+                        help="自定义搜索地址模板(包含{}占位符)，如本地快照服务器地址")
+    parser.add_argument("--token-budget", type=int, default=None,
+                        help="单个提示的内容token上限，超出时分块并行分析并分层合并(map-reduce)")
+    parser.add_argument("--max-llm-requests", type=int, default=8,
+                        help="同时进行的LLM请求数上限，遇到限流时自动降低、调用成功时逐步恢复")
+    parser.add_argument("--qps", type=float, default=None,
+                        help="每秒最多提交的LLM任务数(默认不限制)")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="关闭跨关键词的近似重复结果去重")
+    parser.add_argument("--store", choices=["legacy", "compact", "both"], default="legacy",
+                        help="结果存储格式: legacy为每次保存独立的json/html文件，compact为话题内只追加的压缩记录日志")
+    parser.add_argument("--fresh", action="store_true",
+                        help="不从已有的检查点继续，总是为话题创建新目录")
+    parser.add_argument("--stream", action="store_true",
+                        help="以流式方式生成最终报告，边生成边显示")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量整合最终报告: 每个关键词的分析完成后立即并入，并更新临时的final_analysis.json")
+    parser.add_argument("--synthesis-deadline", type=float, default=None, metavar="SECONDS",
+                        help="增量整合的截止时间(秒，从开始处理关键词时算起)，到期后以已完成的分析定稿；"
+                             "指定时自动启用--incremental")
+    parser.add_argument("--no-keyword-stream", action="store_true",
+                        help="等全部搜索关键词生成后再开始搜索(默认每生成一个关键词就开始搜索)")
+    parser.add_argument("--no-trace", action="store_true",
+                        help="不记录各阶段耗时(trace.json)")
+    parser.add_argument("--reuse-evidence", action="store_true",
+                        help="优先复用results/全文索引中最近的高相关搜索结果，不足时再重新搜索")
+    parser.add_argument("--reuse-max-age", type=float, default=7,
+                        help="只复用最近若干天内的搜索结果(默认: 7)")
+    parser.add_argument("--reuse-min-coverage", type=float, default=0.8,
+                        help="结果块至少包含多大比例的关键词才会被复用(默认: 0.8)")
+    parser.add_argument("--retrieve", action="store_true",
+                        help="按与关键词和话题的相关度筛选结果块，只把预算内最相关的交给AI分析(需要numpy)")
+    parser.add_argument("--retrieve-budget", type=int, default=3000,
+                        help="每个关键词选中结果块的token上限(默认: 3000)")
+    parser.add_argument("--retrieve-k", type=int, default=8,
+                        help="每个关键词最多选中的结果块数(默认: 8)")
+    parser.add_argument("--retrieve-archive", action="store_true",
+                        help="检索时加入results/归档中最相关的历史结果块")
+    parser.add_argument("--deep-fetch", type=int, default=0, metavar="N",
+                        help="下载每个关键词排名前N的结果网页并提取正文一并分析(默认: 0，不下载)")
+    parser.add_argument("--fetch-max-bytes", type=int, default=1024 * 1024,
+                        help="每个网页最多下载的字节数(默认: 1MB)")
+    parser.add_argument("--fetch-deadline", type=float, default=20.0,
+                        help="每个关键词下载网页的总截止时间(秒，默认: 20)")
+    parser.add_argument("--fetch-per-host", type=int, default=2,
+                        help="每个网站同时进行的下载数上限(默认: 2)")
+    parser.add_argument("--fetch-chars", type=int, default=4000,
+                        help="每个网页交给AI分析的正文字数上限(默认: 4000)")
+    parser.add_argument("--index-path", default=DEFAULT_INDEX_PATH,
+                        help="全文索引文件路径")
+    parser.add_argument("--cache-path", default=os.path.join(".cache", "llm_responses.sqlite"),
+                        help="LLM回复缓存文件路径")
+    parser.add_argument("--cache-mode", choices=["on", "refresh", "off"], default="on",
+                        help="缓存模式: on读写缓存，refresh忽略已有缓存并重新写入，off不使用缓存")
+    parser.add_argument("--cache-ttl", type=float, default=None,
+                        help="缓存有效期(秒)，默认永不过期")
+    return parser
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="话题分析系统")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+def build_clients(args, max_searches=None):
+    """按命令行参数创建搜索和AI客户端，同一进程中的所有话题共用
+
+    Args:
+        args: add_arguments定义的参数
+        max_searches (int, optional): 同时进行的搜索数上限
+
+    Returns:
+        tuple: (BrowserSearch, AIClient, ResponseCache或None)
+    """
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()] if args.engines else None
+    browser = BrowserSearch(backend=args.backend, search_url=args.search_url,
+                            max_concurrency=max_searches, engines=engines,
+                            engine_timeout=args.engine_timeout)
+    ai, cache = build_ai(args)
+    return browser, ai, cache
+
+def build_ai(args, limiter=None):
+    """按命令行参数创建AI客户端(LLM后端、回复缓存、限流和token预算)
+
+    同一进程中的各个话题共用返回的AIClient，也就共用它的限流器。
+
+    Args:
+        limiter (LLMRateLimiter, optional): 与其他AIClient共用的限流器，提供时忽略--qps和--max-llm-requests
+
+    Returns:
+        tuple: (AIClient, ResponseCache或None)
+    """
+    cache = None
+    if args.cache_mode != "off":
+        cache = ResponseCache(args.cache_path, ttl=args.cache_ttl)
+    if limiter is None:
+        limiter = LLMRateLimiter(qps=args.qps, max_concurrency=args.max_llm_requests)
+    ai = AIClient(cache=cache, cache_mode=args.cache_mode, token_budget=args.token_budget,
+                  limiter=limiter, backend=args.llm_backend)
+    return ai, cache
+
+def build_evidence(args, root="results"):
+    """按命令行参数打开全文索引并增量更新
+
+    Returns:
+        EvidenceReuse: 未启用--reuse-evidence时返回None
+    """
+    if not args.reuse_evidence:
+        return None
+    index = EvidenceIndex(args.index_path)
+    index.update(root)
+    return EvidenceReuse(index, max_age=args.reuse_max_age * 86400,
+                         min_coverage=args.reuse_min_coverage)
+
+def build_retriever(args, root="results"):
+    """按命令行参数创建段落检索，启用归档时先增量更新全文索引和归档向量
+
+    Returns:
+        PassageRetriever: 未启用--retrieve时返回None
+    """
+    if not args.retrieve:
+        return None
+    # numpy只在启用检索时才导入
+    from utils.retrieval import PassageArchive, PassageRetriever
+    archive = None
+    if args.retrieve_archive:
+        index = EvidenceIndex(args.index_path)
+        index.update(root)
+        archive = PassageArchive(index)
+        archive.update()
+    return PassageRetriever(token_budget=args.retrieve_budget, top_k=args.retrieve_k, archive=archive)
+
+def build_fetcher(args):
+    """按命令行参数创建深度抓取
+
+    Returns:
+        PageFetcher: 未启用--deep-fetch时返回None
+    """
+    if args.deep_fetch <= 0:
+        return None
+    from utils.deep_fetch import PageFetcher
+    return PageFetcher(top_n=args.deep_fetch, max_bytes=args.fetch_max_bytes, deadline=args.fetch_deadline,
+                       per_host=args.fetch_per_host, workers=max(4, 2 * args.deep_fetch),
+                       max_chars=args.fetch_chars)
+
+def main(argv=None):
+    args = parse_args(argv)
+
     print("话题分析系统")
     print("============")
-    
+
     # 初始化客户端
-    browser = BrowserSearch()
-    ai = AIClient()
-    
+    browser, ai, cache = build_clients(args)
+    evidence = build_evidence(args)
+    retriever = build_retriever(args)
+    fetcher = build_fetcher(args)
+
     while True:
         # 获取分析话题
         topic = input("\n请输入要分析的话题(直接回车退出): ").strip()
         if not topic:
             break
-            
-        # 1. 创建话题目录
-        topic_path = create_topic_dir(topic)
-        print(f"\n已创建话题目录: {topic_path}")
-        
-        # 2. 获取搜索任务
-        print("\n正在生成搜索关键词...")
-        keywords = ai.get_search_tasks(topic)
-        
-        if not keywords:
-            print("未能生成有效的搜索关键词")
-            continue
-            
-        # 保存搜索任务
-        task_path = os.path.join(topic_path, "task.json")
-        with open(task_path, 'w', encoding='utf-8') as f:
-            json.dump({"topic": topic, "keywords": keywords}, f, ensure_ascii=False, indent=2)
-        print(f"搜索任务已保存到: {task_path}")
-        
-        # 3. 执行每个关键词的搜索和分析
-        analyses = []
-        for keyword in keywords:
-            print(f"\n处理关键词: {keyword}")
-            analysis = process_search(browser, ai, keyword, topic_path)
-            if analysis:
-                analyses.append(analysis)
-        
-        if analyses:
-            # 4. 整合分析结果
-            print("\n正在整合所有分析结果...")
-            final_analysis = ai.analyze_final_results(topic, analyses)
-            
-            # 保存最终分析
-            final_path = os.path.join(topic_path, "final_analysis.json")
-            with open(final_path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "topic": topic,
-                    "timestamp": time.strftime("%Y%m%d_%H%M%S"),
-                    "analysis": final_analysis
-                }, f, ensure_ascii=False, indent=2)
-            
-            # 显示最终分析
-            print("\n最终分析结果:")
-            print("="*50)
-            print(final_analysis)
-            print("="*50)
-            print(f"\n最终分析已保存到: {final_path}")
-            
+
+        run_topic(browser, ai, topic, workers=args.workers, dedup=not args.no_dedup,
+                  store_mode=args.store, resume=not args.fresh, trace=not args.no_trace,
+                  stream=args.stream, evidence=evidence, retriever=retriever, fetcher=fetcher,
+                  stream_keywords=not args.no_keyword_stream,
+                  incremental=args.incremental or args.synthesis_deadline is not None,
+                  synthesis_deadline=args.synthesis_deadline)
+
+    if cache is not None:
+        print(f"\nLLM缓存命中 {ai.cache_hits} 次，未命中 {ai.cache_misses} 次")
+    if evidence is not None:
+        print(f"复用索引中的搜索结果 {evidence.reused} 次，重新搜索 {evidence.missed} 次")
+    if retriever is not None:
+        stats = retriever.stats()
+        print(f"段落检索: 送入分析 {stats['passages_out']}/{stats['passages_in']} 个结果块，"
+              f"约 {stats['tokens_out']}/{stats['tokens_in']} tokens")
+    if fetcher is not None:
+        stats = fetcher.stats()
+        print(f"深度抓取: 下载 {stats['pages']} 个网页共 {stats['bytes'] / 1024:.0f} KB，复用 {stats['cached']} 个，"
+              f"失败 {stats['failed']} 个，截断 {stats['truncated']} 个，超时 {stats['timed_out']} 个")
+        fetcher.close()
     print("\n感谢使用！")
 
 if __name__ == "__main__":
@@ -0,0 +1,426 @@
+"""
+本地服务模式: 常驻进程通过HTTP/JSON接口接收话题任务。任务保存在SQLite队列中，服务重启后继续处理；
+固定数量的工作线程共用一组启动时创建的搜索/AI客户端(连接池、限流器、回复缓存和进行中请求的合并都保持常驻)。
+
+接口:
+    POST   /jobs                 提交话题 {"topic": "...", "incremental": true, "synthesis_deadline": 60, "fresh": false}
+    GET    /jobs?status=&limit=  列出任务
+    GET    /jobs/<id>            任务状态和各关键词的进度
+    GET    /jobs/<id>/report     最终报告(增量整合的任务运行中返回临时报告)
+    DELETE /jobs/<id>            取消排队中的任务
+    GET    /metrics              队列深度、任务延迟、吞吐量和客户端状态
+    GET    /health               存活检查
+
+用法:
+    python serve.py --port 8765 --jobs 2 --backend http
+    python serve.py --backend snapshot --llm-backend fake        # 不访问网络和API的离线试跑
+    curl -X POST http://127.0.0.1:8765/jobs -d '{"topic": "机械键盘"}'
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from search_and_analyze import (add_arguments, build_clients, build_evidence, build_fetcher, build_retriever,
+                                outcome_status, run_topic)
+from utils.job_queue import DEFAULT_QUEUE_PATH, FINISHED_STATUSES, JobQueue
+from utils.manifest import STAGES, TopicManifest
+
+# 提交任务时可以覆盖的运行参数及其类型
+JOB_OPTIONS = {"incremental": bool, "synthesis_deadline": (int, float), "fresh": bool}
+
+MAX_BODY_BYTES = 64 * 1024
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) if timestamp else None
+
+def keyword_progress(topic_path):
+    """读取话题目录的检查点清单，返回各关键词完成到的阶段
+
+    Returns:
+        dict: {"total", "analyzed", "failed", "keywords": [{"keyword", "stage", "skipped", "error"}]}，
+            没有清单时返回None；全部结果都是重复内容的关键词也算作analyzed，skipped为"duplicate"
+    """
+    if not topic_path or not TopicManifest.exists(topic_path):
+        return None
+    manifest = TopicManifest(topic_path)
+    keywords = []
+    for keyword in manifest.keywords:
+        state = manifest.state(keyword)
+        stage = next((name for name in reversed(STAGES) if name in state), "pending")
+        item = {"keyword": keyword, "stage": stage}
+        if state.get("analyzed", {}).get("skipped"):
+            item["skipped"] = state["analyzed"]["skipped"]
+        if "error" in state:
+            item["error"] = state["error"]["message"]
+        keywords.append(item)
+    return {
+        "total": len(keywords),
+        "analyzed": sum(1 for item in keywords if item["stage"] == "analyzed"),
+        "failed": sum(1 for item in keywords if "error" in item),
+        "keywords": keywords,
+    }
+
+def parse_job_request(body):
+    """校验提交任务的请求体
+
+    Returns:
+        tuple: (话题, 任务选项)
+
+    Raises:
+        ValueError: 请求体不合法，消息说明原因
+    """
+    if not isinstance(body, dict):
+        raise ValueError("请求体必须是JSON对象")
+    topic = body.get("topic")
+    if not isinstance(topic, str) or not topic.strip():
+        raise ValueError("缺少topic字段")
+    unknown = sorted(set(body) - set(JOB_OPTIONS) - {"topic"})
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}(可用: topic, {', '.join(JOB_OPTIONS)})")
+    options = {}
+    for name, kind in JOB_OPTIONS.items():
+        value = body.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+            raise ValueError(f"{name}字段类型不正确")
+        if name == "synthesis_deadline" and value <= 0:
+            raise ValueError("synthesis_deadline必须大于0")
+        options[name] = value
+    return topic.strip(), options
+
+class TopicService:
+    def __init__(self, queue, browser, ai, args, evidence=None, retriever=None, fetcher=None, cache=None,
+                 log_stream=None, poll_interval=1.0):
+        """从任务队列中领取话题并用常驻的客户端处理
+
+        Args:
+            queue (JobQueue): 任务队列
+            browser (BrowserSearch): 搜索客户端，所有任务共用
+            ai (AIClient): AI客户端，所有任务共用
+            args: add_arguments定义的参数，作为任务的默认运行参数；args.jobs为工作线程数
+            evidence, retriever, fetcher: 同run_topic
+            cache (ResponseCache, optional): LLM回复缓存，用于统计命中率
+            log_stream: 服务日志输出流
+            poll_interval (float): 队列为空时检查新任务的间隔(秒)，新任务通过接口提交时立即唤醒
+        """
+        self.queue = queue
+        self.browser = browser
+        self.ai = ai
+        self.args = args
+        self.evidence = evidence
+        self.retriever = retriever
+        self.fetcher = fetcher
+        self.cache = cache
+        self.log_stream = log_stream or sys.stdout
+        self.poll_interval = poll_interval
+        self.jobs = max(1, args.jobs)
+        self.started = time.time()
+        self.busy = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def log(self, message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=self.log_stream, flush=True)
+
+    def start(self):
+        for i in range(self.jobs):
+            thread = threading.Thread(target=self._worker, args=(f"worker-{i}",), name=f"worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """不再领取新任务，等待进行中的任务完成
+
+        等待时再次按Ctrl+C立即退出，未完成的任务在下次启动时重新排队并从检查点继续。
+        """
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            busy = self.busy
+        if busy:
+            self.log(f"等待 {busy} 个进行中的任务完成，再次按Ctrl+C立即退出(未完成的任务下次启动时继续)")
+        try:
+            for thread in self._threads:
+                thread.join()
+        except KeyboardInterrupt:
+            pass
+
+    def submit(self, topic, options=None):
+        job_id = self.queue.submit(topic, options)
+        self.log(f"收到任务 #{job_id}: {topic}")
+        self._wake.set()
+        return job_id
+
+    def _worker(self, name):
+        while not self._stop.is_set():
+            job = self.queue.claim(name)
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job):
+        args, options = self.args, job["options"]
+        deadline = options.get("synthesis_deadline", args.synthesis_deadline)
+        # 重新排队的任务接着上次创建的话题目录继续，即使提交时要求新建目录
+        fresh = options.get("fresh", args.fresh) and not job["topic_path"]
+        with self._lock:
+            self.busy += 1
+        self.log(f"开始任务 #{job['id']}: {job['topic']}" + (f"(第 {job['attempts']} 次)" if job["attempts"] > 1 else ""))
+        start = time.monotonic()
+        status, error, final_path, result = "failed", None, None, None
+        try:
+            outcome = run_topic(
+                self.browser, self.ai, job["topic"], workers=args.workers, dedup=not args.no_dedup,
+                store_mode=args.store, resume=not fresh, trace=not args.no_trace, stream=args.stream,
+                evidence=self.evidence, retriever=self.retriever, fetcher=self.fetcher,
+                stream_keywords=not args.no_keyword_stream,
+                incremental=options.get("incremental", args.incremental) or deadline is not None,
+                synthesis_deadline=deadline,
+                on_start=lambda topic_path: self.queue.set_topic_path(job["id"], topic_path))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            status, error, final_path = outcome_status(outcome), outcome["error"], outcome["final_path"]
+            result = {"keywords": outcome["keywords"], "partial": outcome["partial"]}
+        self.queue.finish(job["id"], status, final_path=final_path, error=error, result=result)
+        with self._lock:
+            self.busy -= 1
+            self.completed += 1
+        self.log(f"任务 #{job['id']} {status} ({time.monotonic() - start:.1f}s): {job['topic']}"
+                 + (f"，{error}" if error else ""))
+
+    def job_view(self, job, detail=True):
+        """任务的接口表示，detail为True时包含各关键词的进度"""
+        view = {
+            "id": job["id"],
+            "topic": job["topic"],
+            "status": job["status"],
+            "options": job["options"],
+            "attempts": job["attempts"],
+            "created": _format_time(job["created"]),
+            "started": _format_time(job["started"]),
+            "finished": _format_time(job["finished"]),
+            "wait": round(job["started"] - job["created"], 3) if job["started"] else None,
+            "duration": round((job["finished"] or time.time()) - job["started"], 3) if job["started"] else None,
+            "error": job["error"],
+            "topic_path": job["topic_path"],
+            "report": f"/jobs/{job['id']}/report" if self._report_path(job) else None,
+        }
+        if detail:
+            view["result"] = job["result"]
+            view["progress"] = keyword_progress(job["topic_path"])
+        return view
+
+    def _report_path(self, job):
+        """任务可供读取的报告文件: 完成后的最终报告，或运行中增量整合发布的临时报告"""
+        if job["status"] in FINISHED_STATUSES:
+            return job["final_path"] if job["final_path"] and os.path.exists(job["final_path"]) else None
+        if job["status"] == "running" and job["topic_path"]:
+            path = os.path.join(job["topic_path"], "final_analysis.json")
+            try:
+                with open(path, encoding='utf-8') as f:
+                    # 话题目录中之前运行留下的报告不属于本次任务
+                    if json.load(f).get("provisional"):
+                        return path
+            except (OSError, ValueError):
+                pass
+        return None
+
+    def report(self, job):
+        """读取任务的报告，还没有报告时返回None"""
+        path = self._report_path(job)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def metrics(self):
+        stats = self.queue.stats()
+        uptime = time.time() - self.started
+        with self._lock:
+            busy, completed = self.busy, self.completed
+        metrics = {
+            "uptime": round(uptime, 1),
+            "queue": {"depth": stats["depth"], "running": stats["running"],
+                      "oldest_queued_age": stats["oldest_queued_age"], "by_status": stats["by_status"]},
+            "workers": {"total": self.jobs, "busy": busy},
+            "latency": stats["latency"],
+            "throughput": dict(stats["throughput"], since_start={
+                "finished": completed, "jobs_per_hour": round(completed / uptime * 3600, 1) if uptime > 0 else 0.0}),
+            "llm": {"limiter": self.ai.limiter.stats(), "retries": self.ai.retries,
+                    "coalesced": self.ai.inflight.stats()},
+            "search": {"coalesced": self.browser.inflight.stats()},
+        }
+        if self.cache is not None:
+            metrics["llm"]["cache"] = {"hits": self.ai.cache_hits, "misses": self.ai.cache_misses}
+        return metrics
+
+_JOB_PATH = re.compile(r'^/jobs/(\d+)(/report)?$')
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        try:
+            status, payload = self._route(method, path, parse_qs(url.query))
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        self._send_json(status, payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("请求体过大")
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("请求体不是合法的JSON")
+
+    def _route(self, method, path, query):
+        service = self.server.service
+        if path == "/health" and method == "GET":
+            return 200, {"status": "ok"}
+        if path == "/metrics" and method == "GET":
+            return 200, service.metrics()
+        if path == "/jobs":
+            if method == "POST":
+                try:
+                    topic, options = parse_job_request(self._read_json())
+                except ValueError as e:
+                    return 400, {"error": str(e)}
+                job_id = service.submit(topic, options)
+                return 202, {"id": job_id, "status": "queued", "url": f"/jobs/{job_id}"}
+            if method == "GET":
+                status = (query.get("status") or [None])[0]
+                try:
+                    limit = min(500, max(1, int((query.get("limit") or [50])[0])))
+                except ValueError:
+                    return 400, {"error": "limit必须是整数"}
+                return 200, {"jobs": [service.job_view(job, detail=False)
+                                      for job in service.queue.list(status=status, limit=limit)]}
+            return 405, {"error": f"不支持的方法: {method}"}
+
+        match = _JOB_PATH.match(path)
+        if match is None:
+            return 404, {"error": f"未知的路径: {path}"}
+        job = service.queue.get(int(match.group(1)))
+        if job is None:
+            return 404, {"error": f"任务不存在: {match.group(1)}"}
+        if match.group(2):
+            if method != "GET":
+                return 405, {"error": f"不支持的方法: {method}"}
+            report = service.report(job)
+            if report is None:
+                return 404, {"error": "报告尚未生成", "status": job["status"]}
+            return 200, report
+        if method == "GET":
+            return 200, service.job_view(job)
+        if method == "DELETE":
+            if not service.queue.cancel(job["id"]):
+                return 409, {"error": f"只能取消排队中的任务，当前状态: {job['status']}"}
+            service.log(f"取消任务 #{job['id']}: {job['topic']}")
+            return 200, service.job_view(service.queue.get(job["id"]))
+        return 405, {"error": f"不支持的方法: {method}"}
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            self.server.service.log(f"{self.address_string()} {format % args}")
+
+def create_server(service, host="127.0.0.1", port=8765, verbose=False):
+    """创建服务的HTTP服务器(尚未开始监听请求)"""
+    httpd = ThreadingHTTPServer((host, port), _ServiceHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    httpd.verbose = verbose
+    return httpd
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="话题分析本地服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址(默认: 127.0.0.1，只接受本机请求)")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口(默认: 8765)")
+    parser.add_argument("--jobs", type=int, default=2, help="同时处理的话题数(默认: 2)")
+    parser.add_argument("--max-searches", type=int, default=None,
+                        help="全局同时进行的搜索数上限(默认不限制；win32后端固定为1)")
+    parser.add_argument("--queue-path", default=DEFAULT_QUEUE_PATH, help="任务队列数据库文件路径")
+    parser.add_argument("--verbose", action="store_true", help="显示每个话题的详细输出和每个HTTP请求")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.queue_path)
+    recovered = queue.recover()
+    browser, ai, cache = build_clients(args, max_searches=args.max_searches)
+    evidence = build_evidence(args)
+    retriever = build_retriever(args)
+    fetcher = build_fetcher(args)
+
+    log_stream = sys.stdout
+    service = TopicService(queue, browser, ai, args, evidence=evidence, retriever=retriever, fetcher=fetcher,
+                           cache=cache, log_stream=log_stream)
+    httpd = create_server(service, args.host, args.port, verbose=args.verbose)
+    host, port = httpd.server_address[:2]
+    service.log(f"服务已启动: http://{host}:{port}，同时处理 {service.jobs} 个话题，任务队列: {args.queue_path}")
+    if recovered:
+        service.log(f"上次退出时未完成的 {recovered} 个任务已重新排队")
+    depth = queue.stats()["depth"]
+    if depth:
+        service.log(f"队列中有 {depth} 个待处理的任务")
+
+    # 按Ctrl+C或收到SIGTERM时同样停止领取任务，等待进行中的任务完成
+    signal.signal(signal.SIGTERM, _interrupt)
+    # 多个话题的流程输出会交错在一起，默认只显示服务日志
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            service.start()
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                httpd.server_close()
+                service.stop()
+    if fetcher is not None:
+        fetcher.close()
+    service.log("服务已停止")
+
+if __name__ == "__main__":
+    main()
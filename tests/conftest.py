@@ -0,0 +1,17 @@
+import os
+import shutil
+
+import pytest
+
+REPO = os.path.join(os.path.dirname(__file__), os.pardir)
+
+SNAPSHOT = os.path.join(REPO, "results", "search_bing_20250309_005124.html")
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """带有一份搜索页面快照的临时工作目录"""
+    os.makedirs(tmp_path / "results")
+    for path in (SNAPSHOT, SNAPSHOT[:-len(".html")] + ".json"):
+        shutil.copy(path, tmp_path / "results")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
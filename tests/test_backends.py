@@ -0,0 +1,71 @@
+"""后端注册表和按需导入: import utils不加载可选依赖，后端按名称在首次使用时解析"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from utils import backends
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI
+from utils.search_backends import HttpSearchBackend, SearchBackend
+
+from .conftest import REPO
+
+def _loaded_after(code):
+    """在新进程中执行code，返回执行后已导入的相关模块"""
+    script = (f"import sys\n{code}\nimport json\n"
+              "print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in "
+              "('zhipuai', 'dotenv', 'win32api', 'win32gui', 'numpy', 'utils'))))")
+    output = subprocess.run([sys.executable, "-c", script], cwd=REPO, capture_output=True, text=True,
+                            check=True).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+def test_import_utils_is_lazy():
+    loaded = _loaded_after("import utils")
+    assert loaded == {"utils"}
+
+def test_attribute_access_imports_on_demand():
+    loaded = _loaded_after("import utils\nutils.BrowserSearch")
+    assert "utils.browser_search" in loaded
+    assert not loaded & {"zhipuai", "dotenv", "win32api", "win32gui", "utils.ai_client"}
+
+def test_unknown_backends_are_rejected():
+    with pytest.raises(ValueError):
+        BrowserSearch(backend="不存在")
+    with pytest.raises(ValueError):
+        AIClient(backend="不存在")
+    with pytest.raises(AttributeError):
+        import utils
+        utils.NotThere
+
+def test_backends_are_resolved_by_name():
+    assert "http" in backends.search_backend_names() and "fake" in backends.llm_backend_names()
+    assert isinstance(BrowserSearch(backend="http").backend, HttpSearchBackend)
+    assert isinstance(AIClient(backend="fake", cache_mode="off").client, FakeZhipuAI)
+
+class _StaticBackend(SearchBackend):
+    name = "static"
+    concurrent = True
+
+    def search(self, keyword, url_template):
+        return [f"{keyword}的结果"], "<html></html>"
+
+def test_register_custom_backends(monkeypatch):
+    monkeypatch.setitem(backends._SEARCH_BACKENDS, "static", _StaticBackend)
+    monkeypatch.setitem(backends._SEARCH_BACKENDS, "static-path", "tests.test_backends:_StaticBackend")
+    assert BrowserSearch(backend="static").search("键盘") == (["键盘的结果"], "<html></html>")
+    assert BrowserSearch(backend="static-path").backend.name == "static"
+
+    created = []
+
+    def factory(api_key=None):
+        created.append(api_key)
+        return FakeZhipuAI(latency=0)
+
+    monkeypatch.setitem(backends._LLM_BACKENDS, "custom", factory)
+    ai = AIClient(api_key="密钥", backend="custom", cache_mode="off")
+    assert ai.chat("你好") == "分析结果: 你好"
+    assert created == ["密钥"]
@@ -0,0 +1,64 @@
+"""批量话题分析: 读取话题、跳过已完成的话题和合并重复话题"""
+
+import argparse
+import json
+import os
+
+from batch_analyze import group_topics, load_finished, read_topics, run_batch
+from search_and_analyze import add_arguments
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+
+def test_read_topics(tmp_path):
+    path = tmp_path / "topics.txt"
+    path.write_text("\n".join([
+        "# 注释",
+        "机械键盘",
+        "",
+        '{"topic": "显卡", "id": "gpu"}',
+        '{"id": "缺少话题"}',
+        "{不是JSON",
+    ]), encoding='utf-8')
+    assert read_topics(str(path)) == [{"topic": "机械键盘", "id": "机械键盘"}, {"topic": "显卡", "id": "gpu"}]
+
+def test_group_topics():
+    topics = [{"topic": "a", "id": "a"}, {"topic": "b", "id": "b"}, {"topic": "a", "id": "a"},
+              {"topic": "a", "id": "a2"}]
+    assert group_topics(topics) == [[{"topic": "a", "id": "a"}, {"topic": "a", "id": "a2"}],
+                                    [{"topic": "b", "id": "b"}]]
+
+def test_load_finished(tmp_path):
+    path = tmp_path / "out.jsonl"
+    assert load_finished(str(path)) == set()
+    path.write_text("\n".join([
+        json.dumps({"id": "a", "status": "ok"}),
+        json.dumps({"id": "b", "status": "failed"}),
+        "不完整的一行",
+    ]), encoding='utf-8')
+    assert load_finished(str(path)) == {"a"}
+
+def _args(output):
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args(["--no-trace", "--no-keyword-stream"])
+    args.output = str(output)
+    args.topics = 4
+    return args
+
+def test_duplicate_topics_run_once(workdir):
+    backend = SnapshotSearchBackend("results")
+    browser = BrowserSearch(backend=backend)
+    ai = AIClient(client=FakeZhipuAI(latency=0.01), cache_mode="off")
+    topics = [{"topic": "机械键盘", "id": "a"}, {"topic": "机械键盘", "id": "b"},
+              {"topic": "机械键盘", "id": "a"}, {"topic": "显卡", "id": "显卡"}]
+    records = run_batch(browser, ai, topics, _args(workdir / "out.jsonl"))
+
+    assert sorted(r["id"] for r in records) == ["a", "b", "显卡"]
+    assert all(r["status"] == "ok" for r in records)
+    with open(workdir / "out.jsonl", encoding='utf-8') as f:
+        assert sorted(json.loads(line)["id"] for line in f) == ["a", "b", "显卡"]
+    # 每个话题4个关键词，各只搜索一次，同一话题只有一个话题目录
+    assert backend.requests == 8
+    assert sorted(name for name in os.listdir("results") if os.path.isdir(os.path.join("results", name))) == \
+        ["显卡", "机械键盘"]
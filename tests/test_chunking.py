@@ -0,0 +1,70 @@
+"""按token预算分块和map-reduce分析"""
+
+import threading
+
+import pytest
+
+from utils.ai_client import CHUNK_REDUCE_TEMPLATE, AIClient
+from utils.chunking import estimate_tokens, group_by_budget, split_into_chunks
+from utils.fakes import FakeZhipuAI
+from utils.rate_limit import LLMError
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("机械键盘") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("键盘abcd") == 3
+
+def test_split_into_chunks_respects_budget():
+    blocks = [f"第{i}条结果：" + "内容" * (i % 7 + 1) for i in range(50)]
+    chunks = split_into_chunks("\n".join(blocks), budget=40)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+    # 在分隔符处断开，内容和顺序保持不变
+    assert "\n".join(chunks).split("\n") == blocks
+
+def test_oversized_block_is_split():
+    text = "长" * 100
+    chunks = split_into_chunks([text], budget=30)
+    assert "".join(chunks) == text
+    assert all(estimate_tokens(chunk) <= 30 for chunk in chunks)
+
+def test_group_by_budget():
+    items = ["一二三"] * 7
+    groups = group_by_budget(items, budget=7, fan_in=3)
+    assert [len(g) for g in groups] == [2, 2, 2, 1]
+    assert [len(g) for g in group_by_budget(items, budget=100, fan_in=3)] == [3, 3, 1]
+
+class _Recorder:
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        return f"摘要{len(prompt) % 10}"
+
+def test_large_text_is_analyzed_with_map_reduce():
+    recorder = _Recorder()
+    ai = AIClient(client=FakeZhipuAI(latency=0, responder=recorder), cache_mode="off", token_budget=60,
+                  reduce_fan_in=3)
+    text = "\n".join(f"第{i}条搜索结果，介绍机械键盘的轴体和手感" for i in range(30))
+    analysis = ai.analyze_text(text)
+    assert analysis.startswith("摘要")
+    reduces = [p for p in recorder.prompts if p.startswith(CHUNK_REDUCE_TEMPLATE.split("{")[0])]
+    chunks = len(recorder.prompts) - len(reduces)
+    assert chunks == len(split_into_chunks(text, 60)) > 1
+    assert reduces
+
+def test_small_text_is_analyzed_in_one_call():
+    recorder = _Recorder()
+    ai = AIClient(client=FakeZhipuAI(latency=0, responder=recorder), cache_mode="off", token_budget=1000)
+    ai.analyze_text("一小段文本")
+    assert len(recorder.prompts) == 1
+
+def test_map_reduce_raises_when_every_chunk_fails():
+    ai = AIClient(client=FakeZhipuAI(latency=0, failure_rate=1.0), cache_mode="off", token_budget=20,
+                  max_attempts=1)
+    with pytest.raises(LLMError):
+        ai.analyze_text("\n".join(["一段需要分块分析的比较长的文本内容"] * 5))
@@ -0,0 +1,107 @@
+"""跨关键词的近似重复过滤，以及流水线中按关键词顺序去重"""
+
+import hashlib
+import random
+import threading
+import time
+
+from search_and_analyze import TopicRun, process_keywords
+from utils.dedup import NearDuplicateFilter, normalize_text
+from utils.pipeline import run_pipeline
+from utils.rate_limit import LLMError
+
+def _jitter(limit=0.02):
+    time.sleep(random.uniform(0, limit))
+
+def test_normalize_text():
+    assert normalize_text("机械键盘，https://example.com/a 红轴 Cherry!") == "机械键盘红轴cherry"
+
+def test_drops_near_duplicates():
+    dedup = NearDuplicateFilter()
+    news = "机械键盘市场在2024年继续增长，国产轴体厂商的出货量首次超过了进口品牌，价格也明显下降。"
+    blocks = [news, news.replace("明显", "大幅"), "显卡价格在新一代产品发布后回落，二手市场的交易量随之上升。", news + " "]
+    assert dedup.filter(blocks) == [blocks[0], blocks[2]]
+    stats = dedup.stats()
+    assert stats["blocks_seen"] == 4 and stats["blocks_dropped"] == 2
+    assert stats["chars_saved"] == len(blocks[1]) + len(blocks[3])
+
+def test_short_blocks_are_kept():
+    dedup = NearDuplicateFilter()
+    assert dedup.filter(["更多", "更多"]) == ["更多", "更多"]
+
+def test_prepare_fn_runs_in_keyword_order():
+    calls = []
+
+    def search_fn(keyword):
+        # 后面的关键词先完成搜索
+        time.sleep(0.01 * (10 - int(keyword)))
+        return keyword
+
+    def prepare_fn(keyword, result):
+        calls.append(keyword)
+        return result + "!"
+
+    keywords = [str(i) for i in range(10)]
+    results = run_pipeline(keywords, search_fn, lambda k, r: r, workers=3, search_workers=5,
+                           prepare_fn=prepare_fn)
+    assert calls == keywords
+    assert results == [k + "!" for k in keywords]
+
+def _block(*parts):
+    return hashlib.sha256("-".join(map(str, parts)).encode()).hexdigest() * 2
+
+SHARED = [_block("shared", i) for i in range(6)]
+
+class _Backend:
+    concurrent = True
+
+class _Browser:
+    backend = _Backend()
+    multi_engine = False
+    search_engine = "bing"
+
+    def search(self, keyword):
+        _jitter()
+        k = int(keyword[1:])
+        return [_block(keyword, j) for j in range(3)] + SHARED[k % 3:k % 3 + 3], None
+
+class _AI:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def analyze_text(self, text):
+        _jitter()
+        if any(_block(keyword, 0) in text for keyword in self.fail):
+            raise LLMError("分析失败")
+        with self._lock:
+            self.prompts.append(text)
+        return "分析: " + text
+
+def _process(workers, fail=()):
+    ai = _AI(fail)
+    run = TopicRun("unused", topic="t", dedup=NearDuplicateFilter(), legacy=False)
+    analyses = process_keywords(_Browser(), ai, [f"k{i}" for i in range(8)], run, workers=workers)
+    return analyses, ai
+
+def test_dedup_is_independent_of_thread_timing():
+    expected, _ = _process(workers=1)
+    for _ in range(5):
+        assert _process(workers=4)[0] == expected
+
+def test_failed_analysis_releases_its_blocks():
+    _, ai = _process(workers=1, fail={"k0"})
+    # k0的分析失败后，它独占的共享结果块仍由后面的关键词送去分析
+    for block in SHARED[:3]:
+        assert any(block in prompt for prompt in ai.prompts)
+
+def test_filter_release_and_commit():
+    dedup = NearDuplicateFilter()
+    blocks = [_block("x", i) for i in range(3)]
+    assert dedup.filter(blocks, owner="a") == blocks
+    dedup.release("a")
+    assert dedup.filter(blocks, owner="b") == blocks
+    dedup.commit("b")
+    dedup.release("b")
+    assert dedup.filter(blocks) == []
@@ -0,0 +1,90 @@
+"""深度抓取: 正文提取、每页字节上限、整批截止时间、每主机连接数和已下载网页的复用"""
+
+import os
+import time
+
+import pytest
+
+from utils.deep_fetch import PageFetcher, page_blocks, result_urls
+from utils.fakes import ARTICLE_PARAGRAPHS, PageServer
+
+@pytest.fixture
+def server():
+    with PageServer(slow_interval=0.2, stall=0.5, huge_chunks=2000) as server:
+        yield server
+
+def _fetch(fetcher, urls, tmp_path):
+    try:
+        return fetcher.fetch(urls, str(tmp_path / "pages"))
+    finally:
+        fetcher.close()
+
+def test_main_text_is_extracted(server, tmp_path):
+    kinds = ["article", "gzip", "gbk", "redirect"]
+    pages = _fetch(PageFetcher(deadline=5), [server.url(kind, 1) for kind in kinds], tmp_path)
+    expected = [p.format(n=1) for p in ARTICLE_PARAGRAPHS]
+    for page in pages:
+        assert page["status"] == "ok" and page["title"] == "测试文章 1"
+        # 导航、侧边栏、评论和页脚都不属于正文
+        assert page["paragraphs"] == ["测试文章 1"] + expected
+    assert pages[3]["final_url"] == server.url("article", 1)
+
+def test_malformed_and_binary_pages(server, tmp_path):
+    malformed, binary = _fetch(PageFetcher(deadline=5), [server.url("malformed"), server.url("binary")], tmp_path)
+    assert malformed["status"] == "ok"
+    assert any("解析器也应该提取出这段文字" in p for p in malformed["paragraphs"])
+    assert binary["status"] == "error" and "application/pdf" in binary["error"]
+
+def test_pages_are_capped_at_max_bytes(server, tmp_path):
+    page, = _fetch(PageFetcher(max_bytes=50000, deadline=5), [server.url("huge")], tmp_path)
+    assert page["truncated"] and page["bytes"] == 50000
+    assert page["status"] == "ok" and page["paragraphs"]
+    assert os.path.getsize(tmp_path / "pages" / [n for n in os.listdir(tmp_path / "pages")
+                                                  if n.endswith(".html")][0]) == 50000
+
+def test_deadline_bounds_slow_pages(server, tmp_path):
+    fetcher = PageFetcher(deadline=0.3, timeout=5, per_host=3)
+    start = time.perf_counter()
+    slow, stalled, fast = _fetch(fetcher, [server.url("slow"), server.url("stall"), server.url("article")],
+                                 tmp_path)
+    assert time.perf_counter() - start < 2
+    # 慢速网页保留截止前已下载的部分，但不保存正文，下次运行时重新下载
+    assert slow["timed_out"] and 0 < slow["bytes"]
+    assert stalled["status"] == "error"
+    assert fast["status"] == "ok"
+    assert fetcher.stats()["timed_out"] == 1 and fetcher.stats()["failed"] == 1
+    names = os.listdir(tmp_path / "pages")
+    assert not [n for n in names if n.startswith(".tmp-")]
+    assert len([n for n in names if n.endswith(".json")]) == 1
+
+def test_per_host_connection_limit(server, tmp_path):
+    urls = [server.url("stall", i) for i in range(6)]
+    start = time.perf_counter()
+    pages = _fetch(PageFetcher(per_host=2, workers=6, deadline=10), urls, tmp_path / "a")
+    # 每个主机同时最多2个连接，6个需要0.5秒的网页至少要分三轮
+    assert time.perf_counter() - start >= 1.4
+    assert all(page["status"] == "ok" for page in pages)
+
+    start = time.perf_counter()
+    _fetch(PageFetcher(per_host=6, workers=6, deadline=10), urls, tmp_path / "b")
+    assert time.perf_counter() - start < 1.2
+
+def test_downloaded_pages_are_reused(server, tmp_path):
+    urls = [server.url("article", i) for i in range(3)]
+    _fetch(PageFetcher(deadline=5), urls, tmp_path)
+    requests = server.requests
+    fetcher = PageFetcher(deadline=5)
+    pages = _fetch(fetcher, urls, tmp_path)
+    assert server.requests == requests
+    assert all(page["cached"] for page in pages)
+    assert fetcher.stats()["cached"] == 3 and fetcher.stats()["pages"] == 0
+
+def test_result_urls_and_page_blocks():
+    results = ["标题一\nhttps://a.com/1\n摘要", "没有链接的结果块", "标题二\nhttps://a.com/1\n重复链接",
+               "标题三\nhttps://b.com/2"]
+    assert result_urls(results) == ["https://a.com/1", "https://b.com/2"]
+
+    page = {"url": "https://a.com/1", "title": "标题", "paragraphs": ["甲" * 500, "乙" * 500, "丙" * 500]}
+    blocks = page_blocks(page, max_chars=1200, block_chars=800)
+    assert len(blocks) == 2 and all(block.startswith("标题\nhttps://a.com/1\n") for block in blocks)
+    assert blocks[1].endswith("丙" * 200)
@@ -0,0 +1,99 @@
+"""results/归档的全文索引: 中文分词、增量更新、检索和复用已有的搜索结果"""
+
+import json
+import os
+import time
+
+from search_and_analyze import run_topic
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.evidence_index import EvidenceIndex, EvidenceReuse, classify_file, tokenize
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def _archive(root, timestamp=None):
+    timestamp = timestamp or time.strftime("%Y%m%d_%H%M%S")
+    _write(os.path.join(root, "机械键盘", "search_bing_1.json"), {
+        "keyword": "机械键盘轴体", "timestamp": timestamp,
+        "results": ["机械键盘的红轴手感轻柔", "机械键盘的青轴段落感明显", "机械键盘的红轴手感轻柔", ""]})
+    _write(os.path.join(root, "机械键盘", "analysis_1.json"), {
+        "keyword": "机械键盘轴体", "timestamp": timestamp, "analysis": "红轴适合打字，青轴适合游戏"})
+    _write(os.path.join(root, "机械键盘", "final_analysis.json"), {
+        "topic": "机械键盘", "timestamp": timestamp, "analysis": "机械键盘的轴体决定手感"})
+    _write(os.path.join(root, "机械键盘", "task.json"), {"topic": "机械键盘", "keywords": []})
+
+def test_tokenize_uses_bigrams_for_chinese():
+    assert tokenize("机械键盘 RGB灯") == ["机械", "械键", "键盘", "rgb", "灯"]
+    assert tokenize("，。") == []
+
+def test_classify_file():
+    assert classify_file("search_bing_20250309_005124.json") == "result"
+    assert classify_file("analysis_20250309_005124.json") == "analysis"
+    assert classify_file("final_analysis.json") == "final"
+    assert classify_file("task.json") is None
+    assert classify_file("search_bing_20250309_005124.html") is None
+
+def test_update_is_incremental(tmp_path):
+    root = str(tmp_path / "results")
+    _archive(root)
+    index = EvidenceIndex(str(tmp_path / "index.sqlite"))
+    assert index.update(root, verbose=False) == {"files": 3, "docs": 5, "removed": 0}
+    assert index.stats() == {"files": 3, "result": 3, "analysis": 1, "final": 1}
+    assert index.update(root, verbose=False) == {"files": 0, "docs": 0, "removed": 0}
+
+    os.remove(os.path.join(root, "机械键盘", "analysis_1.json"))
+    assert index.update(root, verbose=False)["removed"] == 1
+    assert index.stats()["analysis"] == 0
+
+def test_search_ranks_and_filters(tmp_path):
+    root = str(tmp_path / "results")
+    _archive(root)
+    index = EvidenceIndex(str(tmp_path / "index.sqlite"))
+    index.update(root, verbose=False)
+
+    hits = index.search("红轴手感", kinds=("result",))
+    # 内容相同的结果块只返回一次
+    assert [hit["text"] for hit in hits] == ["机械键盘的红轴手感轻柔"]
+    assert hits[0]["coverage"] == 1.0 and hits[0]["topic"] == "机械键盘"
+    assert {hit["kind"] for hit in index.search("红轴 轴体")} == {"result", "analysis", "final"}
+    assert index.search("，") == []
+
+def test_old_evidence_is_not_reused(tmp_path):
+    root = str(tmp_path / "results")
+    _archive(root, timestamp="20200101_000000")
+    index = EvidenceIndex(str(tmp_path / "index.sqlite"))
+    index.update(root, verbose=False)
+    assert index.search("机械键盘", max_age=86400) == []
+    reuse = EvidenceReuse(index, min_coverage=0.5, min_results=1)
+    assert reuse.lookup("机械键盘") is None and reuse.missed == 1
+
+def test_lookup_requires_enough_relevant_results(tmp_path):
+    root = str(tmp_path / "results")
+    _archive(root)
+    index = EvidenceIndex(str(tmp_path / "index.sqlite"))
+    index.update(root, verbose=False)
+    assert EvidenceReuse(index, min_results=3).lookup("机械键盘") is None
+    reused = EvidenceReuse(index, min_results=2).lookup("机械键盘")
+    assert sorted(reused["results"]) == ["机械键盘的红轴手感轻柔", "机械键盘的青轴段落感明显"]
+    assert reused["sources"] == [os.path.abspath(os.path.join(root, "机械键盘", "search_bing_1.json"))]
+
+def test_run_topic_reuses_indexed_results(workdir):
+    index = EvidenceIndex(".cache/evidence.sqlite")
+    index.update("results", verbose=False)
+    backend = SnapshotSearchBackend("results")
+    browser = BrowserSearch(backend=backend)
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off")
+    evidence = EvidenceReuse(index, max_age=None, min_coverage=0, min_results=1)
+    outcome = run_topic(browser, ai, "键盘轴体", workers=2, evidence=evidence, trace=False, stream_keywords=False)
+    assert backend.requests == 0
+    assert evidence.reused == len(outcome["keywords"])
+
+    saved = [name for name in os.listdir(outcome["topic_path"]) if name.startswith("search_")]
+    with open(os.path.join(outcome["topic_path"], saved[0]), encoding='utf-8') as f:
+        record = json.load(f)
+    # 复用的结果沿用来源的生成时间，重新索引后不会显得更新
+    assert record["reused"]["created"] == "20250309_005124"
@@ -0,0 +1,56 @@
+"""在保存的搜索页面快照上提取搜索结果"""
+
+import pytest
+
+from utils.extractor import ResultExtractor, extract_results, format_record, iter_results
+
+from .conftest import SNAPSHOT
+
+def test_extracts_bing_results():
+    records = extract_results(SNAPSHOT)
+    assert len(records) == 10
+    assert [r["rank"] for r in records] == list(range(1, 11))
+    assert all(r["title"] and r["url"].startswith("http") for r in records)
+    first = records[0]
+    assert first["title"].startswith("机械键盘轴大解析")
+    assert first["url"] == "https://zhuanlan.zhihu.com/p/618528924"
+    assert "机械键盘轴" in first["snippet"]
+
+def test_streaming_matches_whole_document():
+    with open(SNAPSHOT, encoding='utf-8') as f:
+        html = f.read()
+    assert list(iter_results(SNAPSHOT, chunk_size=97)) == extract_results(html, "bing")
+
+def test_records_are_available_while_feeding():
+    with open(SNAPSHOT, encoding='utf-8') as f:
+        html = f.read()
+    parser = ResultExtractor("bing")
+    parser.feed(html[:len(html) // 2])
+    early = len(parser.records)
+    parser.feed(html[len(html) // 2:])
+    parser.close()
+    assert 0 < early < len(parser.records) == 10
+
+def test_truncated_page_keeps_complete_results():
+    with open(SNAPSHOT, encoding='utf-8') as f:
+        html = f.read()
+    records = extract_results(html[:len(html) // 2], "bing")
+    assert records == extract_results(html, "bing")[:len(records)]
+
+def test_format_record():
+    text = format_record({"title": "标题", "url": "https://example.com", "snippet": "摘要", "rank": 1})
+    assert text.split("\n") == ["标题", "https://example.com", "摘要"]
+
+def test_baidu_results():
+    html = ('<div class="result c-container"><h3><a href="https://www.baidu.com/link?url=1">'
+            '百度<em>结果</em></a></h3><div class="c-abstract">摘要&amp;内容</div></div>'
+            '<div class="result"><h3><a href="https://example.com/2">第二条</a></h3></div>')
+    records = extract_results(html, "baidu")
+    assert [(r["title"], r["url"], r["snippet"], r["rank"]) for r in records] == [
+        ("百度结果", "https://www.baidu.com/link?url=1", "摘要&内容", 1),
+        ("第二条", "https://example.com/2", "", 2),
+    ]
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        ResultExtractor("yahoo")
@@ -0,0 +1,95 @@
+"""服务模式的持久化任务队列"""
+
+import threading
+
+import pytest
+
+from utils.job_queue import JobQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite"))
+
+def test_claims_in_submission_order(queue):
+    first = queue.submit("a", {"incremental": True})
+    second = queue.submit("b")
+    job = queue.claim("w1")
+    assert job["id"] == first
+    assert job["status"] == "running" and job["worker"] == "w1" and job["attempts"] == 1
+    assert job["options"] == {"incremental": True}
+    assert queue.claim("w2")["id"] == second
+    assert queue.claim("w3") is None
+
+def test_same_topic_runs_one_at_a_time(queue):
+    first = queue.submit("a")
+    second = queue.submit("a")
+    other = queue.submit("b")
+    assert queue.claim("w1")["id"] == first
+    assert queue.claim("w2")["id"] == other
+    assert queue.claim("w3") is None
+    queue.finish(first, "ok")
+    assert queue.claim("w3")["id"] == second
+
+def test_concurrent_claims_never_share_a_job(queue):
+    ids = {queue.submit(f"topic-{i}") for i in range(40)}
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(name):
+        while True:
+            job = queue.claim(name)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(ids)
+
+def test_recover_requeues_running_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    job_id = queue.submit("a")
+    queue.claim("w1")
+    queue.set_topic_path(job_id, "results/a")
+
+    # 服务重启
+    restarted = JobQueue(path)
+    assert restarted.recover() == 1
+    job = restarted.get(job_id)
+    assert job["status"] == "queued" and job["worker"] is None
+    assert job["topic_path"] == "results/a"
+    job = restarted.claim("w2")
+    assert job["id"] == job_id and job["attempts"] == 2
+    assert restarted.recover() == 1
+    assert JobQueue(path).recover() == 0
+
+def test_finish_and_cancel(queue):
+    running = queue.submit("a")
+    queued = queue.submit("b")
+    queue.claim("w1")
+    assert not queue.cancel(running)
+    assert queue.cancel(queued)
+    queue.finish(running, "partial", final_path="results/a/final_analysis.json", result={"keywords": ["x"]})
+    job = queue.get(running)
+    assert job["status"] == "partial" and job["result"] == {"keywords": ["x"]}
+    assert queue.get(queued)["status"] == "cancelled"
+    assert [job["id"] for job in queue.list(status="cancelled")] == [queued]
+    with pytest.raises(ValueError):
+        queue.finish(running, "unknown")
+
+def test_stats(queue):
+    for topic in ("a", "b", "c"):
+        queue.submit(topic)
+    job = queue.claim("w1")
+    queue.finish(job["id"], "ok")
+    stats = queue.stats()
+    assert stats["depth"] == 2 and stats["running"] == 0
+    assert stats["by_status"] == {"queued": 2, "ok": 1}
+    assert stats["latency"]["total"]["count"] == 1
+    assert stats["throughput"]["finished"] == 1
+    assert stats["oldest_queued_age"] >= 0
@@ -0,0 +1,71 @@
+"""流式生成搜索关键词: 增量解析、边生成边搜索和中断后的继续运行"""
+
+import json
+import os
+
+import pytest
+
+from search_and_analyze import run_topic
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+from utils.keyword_stream import KeywordArrayParser, KeywordStream
+from utils.manifest import TopicManifest
+
+def test_parser_yields_each_keyword_once_complete():
+    reply = json.dumps({"keywords": ["机械键盘", "轴体 \"红轴\"", "价格\\区间"]}, ensure_ascii=False)
+    parser = KeywordArrayParser()
+    found = []
+    for i in range(0, len(reply), 3):
+        found.extend(parser.feed(reply[i:i + 3]))
+    assert found == json.loads(reply)["keywords"]
+    assert parser.done
+
+def test_parser_stops_at_non_string_items():
+    parser = KeywordArrayParser()
+    assert parser.feed('{"keywords": ["a", 1, "b"]}') == ["a"]
+    assert parser.done
+
+def test_stream_yields_before_generation_finishes():
+    def produce(on_token):
+        for piece in ('{"keywords": ["a", ', '"b"', ', "c"]}'):
+            on_token(piece)
+        return '{"keywords": ["a", "b", "c", "d"]}'
+
+    stream = KeywordStream(produce, lambda reply: json.loads(reply)["keywords"])
+    # 完整回复中有、流式解析没有得到的关键词在最后产出
+    assert list(stream) == ["a", "b", "c", "d"]
+    assert stream.error is None and stream.extra(["a", "x"]) == ["x"]
+
+class _CrashingBackend(SnapshotSearchBackend):
+    """搜索第二个关键词时进程"崩溃"的快照后端"""
+
+    def search(self, keyword, url_template):
+        if keyword.endswith("现状"):
+            raise KeyboardInterrupt
+        return super().search(keyword, url_template)
+
+def test_resumes_streamed_run_interrupted_before_task_was_saved(workdir):
+    fake = FakeZhipuAI(latency=0)
+    browser = BrowserSearch(backend=_CrashingBackend("results"))
+    with pytest.raises(KeyboardInterrupt):
+        run_topic(browser, AIClient(client=fake, cache_mode="off"), "机械键盘", dedup=False, trace=False)
+    manifest = TopicManifest(os.path.join("results", "机械键盘"))
+    assert manifest.data["task_hash"] is None
+    assert not os.path.exists(os.path.join(manifest.topic_path, "task.json"))
+    analyzed = [k for k in manifest.keywords if k not in manifest.pending()]
+    assert analyzed == ["机械键盘"]
+
+    fake = FakeZhipuAI(latency=0)
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    outcome = run_topic(browser, AIClient(client=fake, cache_mode="off"), "机械键盘", dedup=False, trace=False)
+    expected = ["机械键盘", "机械键盘 现状", "机械键盘 原因", "机械键盘 影响"]
+    assert outcome["topic_path"] == manifest.topic_path
+    assert outcome["keywords"] == expected
+    with open(os.path.join(manifest.topic_path, "task.json"), encoding='utf-8') as f:
+        assert json.load(f) == {"topic": "机械键盘", "keywords": expected}
+    manifest = TopicManifest(manifest.topic_path)
+    assert manifest.keywords == expected and manifest.data["task_hash"] is not None
+    assert manifest.pending() == []
+    # 重新生成关键词1次，分析未完成的3个关键词，整合1次；第一个关键词的分析沿用检查点
+    assert fake.created == 5
@@ -0,0 +1,74 @@
+"""LLM回复缓存: 读写、过期、按最近访问时间淘汰以及AIClient的缓存模式"""
+
+import time
+
+import pytest
+
+from utils.ai_client import AIClient
+from utils.fakes import FakeZhipuAI
+from utils.llm_cache import ResponseCache, make_cache_key
+from utils.rate_limit import LLMError
+
+def test_key_depends_on_model_template_and_prompt():
+    key = make_cache_key("glm-4-flash", "analyze", "提示")
+    assert key == make_cache_key("glm-4-flash", "analyze", "提示")
+    assert key != make_cache_key("glm-4", "analyze", "提示")
+    assert key != make_cache_key("glm-4-flash", "final", "提示")
+    assert key != make_cache_key("glm-4-flash", "analyze", "提示2")
+
+def test_get_put(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get("k") is None
+    cache.put("k", "回复", model="glm-4-flash")
+    assert cache.get("k") == "回复"
+    cache.put("k", "新回复")
+    assert cache.get("k") == "新回复"
+    assert cache.stats()["entries"] == 1
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(path).put("k", "回复")
+    assert ResponseCache(path).get("k") == "回复"
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=0.05)
+    cache.put("k", "回复")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.put(key, key * 100)
+        time.sleep(0.01)
+    # 超出容量时淘汰最久未访问的a
+    assert cache.get("a") is None
+    assert cache.get("c") == "c" * 100
+    time.sleep(0.01)
+    # 访问过的c比b更新，写入d时淘汰b
+    cache.put("d", "d" * 100)
+    assert cache.get("b") is None
+    assert cache.get("c") == "c" * 100
+    assert cache.stats()["bytes"] <= 250
+
+def test_client_reads_and_refreshes_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    fake = FakeZhipuAI(latency=0)
+    ai = AIClient(client=fake, cache=cache)
+    assert ai.analyze_text("文本") == ai.analyze_text("文本")
+    assert fake.created == 1 and ai.cache_hits == 1 and ai.cache_misses == 1
+
+    # refresh跳过读取但写入新结果，off完全绕过缓存
+    refresh = AIClient(client=fake, cache=cache, cache_mode="refresh")
+    refresh.analyze_text("文本")
+    assert fake.created == 2
+    AIClient(client=fake, cache=cache, cache_mode="off").analyze_text("文本")
+    assert fake.created == 3 and cache.stats()["entries"] == 1
+
+def test_failed_calls_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    ai = AIClient(client=FakeZhipuAI(latency=0, failure_rate=1.0), cache=cache, max_attempts=1)
+    with pytest.raises(LLMError):
+        ai.analyze_text("文本")
+    assert cache.stats()["entries"] == 0
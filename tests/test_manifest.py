@@ -0,0 +1,115 @@
+"""检查点清单和话题目录的断点续跑"""
+
+import os
+
+from search_and_analyze import create_topic_dir, find_topic_dir, run_topic
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+from utils.manifest import TopicManifest
+
+def test_mark_and_pending(tmp_path):
+    manifest = TopicManifest(str(tmp_path))
+    manifest.set_task("话题", ["a", "b"])
+    manifest.mark("a", "searched", hash="h1")
+    manifest.mark("a", "extracted", hash="r1", source_hash="h1")
+    manifest.mark("a", "analyzed", hash="x1", source_hash="r1")
+    assert manifest.pending() == ["b"]
+
+    manifest.mark_failed("b", "analyzed", "限流")
+    reloaded = TopicManifest(str(tmp_path))
+    assert reloaded.pending() == ["b"]
+    assert reloaded.state("b")["error"]["message"] == "限流"
+
+def test_changed_upstream_invalidates_later_stages(tmp_path):
+    manifest = TopicManifest(str(tmp_path))
+    manifest.set_task("话题", ["a"])
+    manifest.mark("a", "extracted", hash="r1")
+    manifest.mark("a", "analyzed", hash="x1", source_hash="r1")
+    manifest.mark("a", "extracted", hash="r1")
+    assert "analyzed" in manifest.state("a")
+    manifest.mark("a", "extracted", hash="r2")
+    assert "analyzed" not in manifest.state("a")
+    assert manifest.pending() == ["a"]
+
+def test_new_topic_dir_is_resumable_immediately(workdir):
+    path = create_topic_dir("话题")
+    assert TopicManifest(path).data["topic"] == "话题"
+    assert create_topic_dir("话题") == path
+
+def test_resumes_newest_timestamped_dir(workdir):
+    # 早于检查点的旧目录没有清单，不能继续使用
+    os.makedirs(os.path.join("results", "话题"))
+    first = create_topic_dir("话题")
+    assert first != os.path.join("results", "话题")
+    assert create_topic_dir("话题") == first
+    os.rename(first, os.path.join("results", "话题_20000101_000000"))
+    newest = create_topic_dir("话题", resume=False)
+    assert find_topic_dir("话题") == newest
+    assert create_topic_dir("话题") == newest
+
+def test_find_ignores_other_topics(workdir):
+    path = create_topic_dir("a/b")
+    assert find_topic_dir("a/b") == path
+    # "a_b"与"a/b"的目录名相同，但清单属于另一个话题
+    assert find_topic_dir("a_b") is None
+
+def _clients():
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    fake = FakeZhipuAI(latency=0)
+    return browser, AIClient(client=fake, cache_mode="off"), fake
+
+def test_run_topic_resumes_from_checkpoint(workdir):
+    browser, ai, fake = _clients()
+    first = run_topic(browser, ai, "机械键盘", trace=False, stream_keywords=False)
+    assert first["final_path"] is not None
+    calls = fake.created
+
+    browser, ai, fake = _clients()
+    second = run_topic(browser, ai, "机械键盘", trace=False, stream_keywords=False)
+    assert second["topic_path"] == first["topic_path"]
+    assert second["final_analysis"] == first["final_analysis"]
+    assert calls > 0 and fake.created == 0
+
+def test_run_topic_retries_failed_keywords(workdir):
+    # 快照后端对每个关键词返回同一个页面，关闭去重让每个关键词都有分析
+    browser, ai, fake = _clients()
+    first = run_topic(browser, ai, "机械键盘", dedup=False, trace=False, stream_keywords=False)
+    assert TopicManifest(first["topic_path"]).pending() == []
+    manifest = TopicManifest(first["topic_path"])
+    keyword = manifest.keywords[1]
+    manifest.mark_failed(keyword, "analyzed", "限流")
+
+    browser, ai, fake = _clients()
+    second = run_topic(browser, ai, "机械键盘", dedup=False, trace=False, stream_keywords=False)
+    assert second["topic_path"] == first["topic_path"]
+    assert TopicManifest(first["topic_path"]).pending() == []
+    # 只重新分析失败的关键词；替身的分析内容与上次相同，最终报告的输入没有变化，直接沿用
+    assert fake.created == 1
+
+def test_all_duplicate_keywords_complete_the_checkpoint(workdir):
+    # 快照后端对每个关键词返回同一个页面，除第一个关键词外的结果都是重复内容
+    browser, ai, fake = _clients()
+    first = run_topic(browser, ai, "机械键盘", trace=False, stream_keywords=False)
+    manifest = TopicManifest(first["topic_path"])
+    assert manifest.pending() == []
+    skipped = [k for k in manifest.keywords if manifest.stage(k, "analyzed").get("skipped")]
+    assert skipped == manifest.keywords[1:]
+
+    browser, ai, fake = _clients()
+    run_topic(browser, ai, "机械键盘", trace=False, stream_keywords=False)
+    # 检查点已经完整，不再搜索或调用AI
+    assert browser.backend.requests == 0 and fake.created == 0
+
+def test_reextracts_from_saved_page_when_results_are_missing(workdir):
+    browser, ai, fake = _clients()
+    first = run_topic(browser, ai, "机械键盘", dedup=False, trace=False, stream_keywords=False)
+    manifest = TopicManifest(first["topic_path"])
+    keyword = manifest.keywords[0]
+    os.remove(os.path.join(first["topic_path"], manifest.stage(keyword, "extracted")["ref"]["file"]))
+
+    browser, ai, fake = _clients()
+    second = run_topic(browser, ai, "机械键盘", dedup=False, trace=False, stream_keywords=False)
+    # 从保存的HTML重新提取，不重新搜索；提取结果不变，已有的分析仍然有效
+    assert browser.backend.requests == 0 and fake.created == 0
+    assert second["final_analysis"] == first["final_analysis"]
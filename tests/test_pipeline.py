@@ -0,0 +1,65 @@
+"""搜索/分析流水线: 结果顺序、失败隔离以及与顺序模式相同的输出"""
+
+import json
+import os
+import random
+import time
+
+from search_and_analyze import run_topic
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend, default_responder
+from utils.pipeline import run_pipeline
+from utils.result_store import content_hash
+
+def _jitter(limit=0.02):
+    time.sleep(random.uniform(0, limit))
+
+def test_results_follow_keyword_order():
+    keywords = [f"k{i}" for i in range(12)]
+
+    def search_fn(keyword):
+        _jitter()
+        return keyword.upper()
+
+    def analyze_fn(keyword, result):
+        _jitter()
+        return f"{keyword}:{result}"
+
+    results = run_pipeline(iter(keywords), search_fn, analyze_fn, workers=4, search_workers=3)
+    assert results == [f"{k}:{k.upper()}" for k in keywords]
+
+def test_failures_are_isolated():
+    def search_fn(keyword):
+        if keyword == "no-results":
+            return None
+        if keyword == "search-error":
+            raise RuntimeError("搜索出错")
+        return keyword
+
+    def analyze_fn(keyword, result):
+        if keyword == "analyze-error":
+            raise RuntimeError("分析出错")
+        return result
+
+    keywords = ["a", "no-results", "b", "search-error", "analyze-error", "c"]
+    results = run_pipeline(keywords, search_fn, analyze_fn, workers=2, search_workers=2)
+    assert results == ["a", None, "b", None, None, "c"]
+
+def _responder(prompt):
+    # 回复由完整提示决定，最终报告因此取决于各关键词分析的内容和顺序
+    if "keywords" in prompt:
+        return default_responder(prompt)
+    return "分析: " + content_hash(prompt)[:16]
+
+def _run(workers):
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results", latency=(0, 0.02)))
+    ai = AIClient(client=FakeZhipuAI(latency=(0, 0.02), responder=_responder), cache_mode="off")
+    outcome = run_topic(browser, ai, "机械键盘", workers=workers, dedup=False, resume=False, trace=False,
+                        stream_keywords=False)
+    with open(os.path.join(outcome["topic_path"], "task.json"), encoding='utf-8') as f:
+        task = json.load(f)
+    return task, outcome["final_analysis"]
+
+def test_pipeline_output_matches_sequential(workdir):
+    assert _run(workers=4) == _run(workers=1)
@@ -0,0 +1,73 @@
+"""共享的异步任务轮询器"""
+
+import asyncio
+import time
+
+import pytest
+
+from utils.ai_client import AIClient
+from utils.fakes import FakeZhipuAI
+from utils.poller import CompletionFailed, CompletionPoller, CompletionTimeout
+
+def _submit(fake, poller, prompt, timeout=None):
+    response = fake.chat.asyncCompletions.create(model="glm-4-flash", messages=[{"role": "user", "content": prompt}])
+    return poller.submit(response.id, timeout=timeout)
+
+def test_one_thread_polls_many_tasks():
+    fake = FakeZhipuAI(latency=lambda prompt: 0.05 * int(prompt))
+    poller = CompletionPoller(fake, min_interval=0.01, max_interval=0.05)
+    futures = [_submit(fake, poller, str(i)) for i in range(20)]
+    assert [f.result(timeout=5) for f in futures] == [f"分析结果: {i}" for i in range(20)]
+    assert poller.pending() == 0
+    # 只有一个后台轮询线程，轮询次数随间隔退避增长而不是随任务数×等待时间增长
+    assert poller.polls == fake.retrieves == sum(f.polls for f in futures)
+    poller.close()
+
+def test_poll_interval_backs_off():
+    fake = FakeZhipuAI(latency=0.5)
+    poller = CompletionPoller(fake, min_interval=0.01, max_interval=0.08, backoff=2)
+    future = _submit(fake, poller, "慢任务")
+    future.result(timeout=5)
+    # 固定0.01s间隔需要约50次轮询
+    assert future.polls < 15
+    poller.close()
+
+def test_failed_and_timed_out_tasks():
+    fake = FakeZhipuAI(latency=0, failure_rate=1.0)
+    poller = CompletionPoller(fake, min_interval=0.01)
+    with pytest.raises(CompletionFailed):
+        _submit(fake, poller, "失败").result(timeout=5)
+    poller.close()
+
+    fake = FakeZhipuAI(latency=10)
+    poller = CompletionPoller(fake, min_interval=0.01)
+    with pytest.raises(CompletionTimeout):
+        _submit(fake, poller, "超时", timeout=0.05).result(timeout=5)
+    poller.close()
+
+def test_close_fails_pending_tasks():
+    fake = FakeZhipuAI(latency=10)
+    poller = CompletionPoller(fake, min_interval=0.01)
+    future = _submit(fake, poller, "进行中")
+    poller.close()
+    with pytest.raises(RuntimeError):
+        future.result(timeout=1)
+    with pytest.raises(RuntimeError):
+        _submit(fake, poller, "关闭后")
+
+def test_client_shares_one_poller():
+    fake = FakeZhipuAI(latency=(0.01, 0.05), seed=1)
+    ai = AIClient(client=fake, cache_mode="off")
+    start = time.monotonic()
+    futures = [ai.submit_chat(f"提示{i}") for i in range(10)]
+    assert [f.result(timeout=5) for f in futures] == [f"分析结果: 提示{i}" for i in range(10)]
+    assert time.monotonic() - start < 2
+    assert ai.poller.pending() == 0
+
+def test_achat():
+    ai = AIClient(client=FakeZhipuAI(latency=0.01), cache_mode="off")
+
+    async def gather():
+        return await asyncio.gather(*(ai.achat(f"提示{i}") for i in range(5)))
+
+    assert asyncio.run(gather()) == [f"分析结果: 提示{i}" for i in range(5)]
@@ -0,0 +1,98 @@
+"""多引擎并发搜索: 倒数排名融合、链接/摘要去重和单个引擎超时或失败时的隔离"""
+
+import time
+
+import pytest
+
+from utils.browser_search import BrowserSearch
+from utils.rank_fusion import RRF_K, normalize_url, reciprocal_rank_fusion
+from utils.search_backends import SearchBackend
+
+def test_normalize_url():
+    assert normalize_url("https://www.Example.com/a/?utm_source=x&id=3#top") == "example.com/a?id=3"
+    assert normalize_url("http://example.com/a") == normalize_url("https://example.com/a/")
+    assert normalize_url(None) == ""
+
+def _record(title, url="", snippet=""):
+    return {"title": title, "url": url, "snippet": snippet}
+
+def test_results_found_by_both_engines_rank_first():
+    merged = reciprocal_rank_fusion({
+        "bing": [_record("只在必应出现的结果标题", "https://a.com/1"),
+                 _record("两个引擎都有的结果标题", "https://www.b.com/2", "短摘要")],
+        "baidu": [_record("两个引擎都有的结果标题", "https://b.com/2?utm_medium=x", "更长一些的摘要内容"),
+                  _record("只在百度出现的结果标题", "https://c.com/3")],
+    })
+    assert [item["title"] for item in merged][0] == "两个引擎都有的结果标题"
+    assert len(merged) == 3
+    top = merged[0]
+    assert top["engines"] == ["bing", "baidu"] and top["ranks"] == {"bing": 2, "baidu": 1}
+    assert top["score"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert top["snippet"] == "更长一些的摘要内容"
+
+def test_same_page_with_different_links_is_merged_by_title():
+    merged = reciprocal_rank_fusion({
+        "bing": [_record("机械键盘轴体选购完全指南", "https://zhuanlan.zhihu.com/p/1")],
+        "baidu": [_record("机械键盘轴体选购完全指南", "https://www.baidu.com/link?url=abc")],
+    })
+    assert len(merged) == 1 and merged[0]["engines"] == ["bing", "baidu"]
+
+def test_duplicates_within_one_engine_count_once():
+    merged = reciprocal_rank_fusion({"bing": [_record("同一个结果的标题文本", "https://a.com"),
+                                              _record("同一个结果的标题文本", "https://a.com/")]})
+    assert len(merged) == 1 and merged[0]["ranks"] == {"bing": 1}
+
+class _EngineBackend(SearchBackend):
+    """按搜索地址中的引擎名返回固定结果，可以让某个引擎变慢或失败"""
+    name = "engines"
+    concurrent = True
+
+    def __init__(self, results, slow=(), failing=(), delay=1.0):
+        self.results = results
+        self.slow = slow
+        self.failing = failing
+        self.delay = delay
+
+    def search(self, keyword, url_template):
+        engine = url_template.split("/")[3]
+        if engine in self.failing:
+            raise RuntimeError("引擎不可用")
+        if engine in self.slow:
+            time.sleep(self.delay)
+        return list(self.results[engine]), None
+
+RESULTS = {
+    "bing": ["必应的第一条结果内容", "两个引擎共有的结果内容"],
+    "baidu": ["两个引擎共有的结果内容", "百度的独有结果内容"],
+    "google": ["谷歌的独有结果内容"],
+}
+
+def _browser(backend, engines, timeout=5.0):
+    return BrowserSearch(backend=backend, engines=engines, search_url="http://local/{engine}/search?q={}",
+                         engine_timeout=timeout)
+
+def test_search_engines_fuses_results():
+    merged = _browser(_EngineBackend(RESULTS), ["bing", "baidu"]).search_engines("键盘")
+    assert merged["results"][0].startswith("两个引擎共有的结果内容")
+    assert len(merged["results"]) == 3
+    assert merged["engines"]["bing"]["status"] == "ok"
+    assert merged["engines"]["bing"]["merged"] == 2 and merged["engines"]["bing"]["unique"] == 1
+    assert merged["pages"] == {}
+
+def test_slow_and_failing_engines_do_not_stall_the_keyword():
+    backend = _EngineBackend(RESULTS, slow=("baidu",), failing=("google",), delay=2.0)
+    start = time.perf_counter()
+    merged = _browser(backend, ["bing", "baidu", "google"], timeout=0.3).search_engines("键盘")
+    assert time.perf_counter() - start < 1.5
+    assert merged["engines"]["baidu"]["status"] == "timeout"
+    assert merged["engines"]["google"]["status"] == "error"
+    assert [r.split("\n")[0] for r in merged["results"]] == RESULTS["bing"]
+
+def test_multi_engine_needs_concurrent_backend():
+    class Serial(_EngineBackend):
+        concurrent = False
+
+    with pytest.raises(ValueError):
+        _browser(Serial(RESULTS), ["bing", "baidu"])
+    with pytest.raises(ValueError):
+        _browser(_EngineBackend(RESULTS), ["bing", "yahoo"])
@@ -0,0 +1,131 @@
+"""LLM错误分类、重试和限流"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.ai_client import AIClient
+from utils.fakes import FakeRateLimitError, FakeServerError, FakeZhipuAI
+from utils.poller import CompletionFailed, CompletionTimeout
+from utils.rate_limit import (AdaptiveConcurrency, AuthenticationError, LLMError, LLMRateLimiter, LLMTimeoutError,
+                              OverloadedError, RateLimitError, RequestError, TaskFailedError, TokenBucket,
+                              TransientError, classify_error)
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class APIReachLimitError(Exception):
+    pass
+
+class APIInternalError(Exception):
+    pass
+
+@pytest.mark.parametrize("exc, expected", [
+    (FakeRateLimitError("限流"), RateLimitError),
+    (APIReachLimitError("限流"), RateLimitError),
+    (FakeServerError("出错"), OverloadedError),
+    (APIInternalError("出错"), OverloadedError),
+    (_StatusError(401), AuthenticationError),
+    (_StatusError(400), RequestError),
+    (ConnectionResetError("连接断开"), TransientError),
+    (CompletionTimeout("超时"), LLMTimeoutError),
+    (CompletionFailed("失败"), TaskFailedError),
+    (ValueError("其他"), LLMError),
+])
+def test_classify_error(exc, expected):
+    error = classify_error(exc)
+    assert type(error) is expected
+    assert error.__cause__ is exc
+
+def test_classify_error_keeps_llm_errors():
+    error = RateLimitError("限流")
+    assert classify_error(error) is error
+
+def test_retryable_and_overload_flags():
+    assert RateLimitError.retryable and RateLimitError.overload
+    assert TransientError.retryable and not TransientError.overload
+    assert not RequestError.retryable
+    assert not AuthenticationError.retryable
+
+class _FlakyClient:
+    """提交前几次任务时抛出指定异常的FakeZhipuAI"""
+
+    def __init__(self, errors):
+        self.fake = FakeZhipuAI(latency=0)
+        self.errors = list(errors)
+        self.chat = self
+        self.asyncCompletions = self
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.fake.chat.asyncCompletions.create(**kwargs)
+
+    def retrieve_completion_result(self, id):
+        return self.fake.chat.asyncCompletions.retrieve_completion_result(id=id)
+
+def _client(errors, max_attempts=4):
+    client = _FlakyClient(errors)
+    ai = AIClient(client=client, cache_mode="off", limiter=LLMRateLimiter(max_concurrency=4),
+                  max_attempts=max_attempts, retry_base=0.001, retry_cap=0.01)
+    return ai, client
+
+def test_retries_transient_errors():
+    ai, client = _client([FakeRateLimitError("限流"), FakeServerError("出错")])
+    assert ai.chat("你好").startswith("分析结果")
+    assert client.calls == 3
+    assert ai.retries == 2
+    stats = ai.limiter.stats()
+    assert stats["throttled"] == 2 and stats["successes"] == 1 and stats["inflight"] == 0
+
+def test_does_not_retry_request_errors():
+    ai, client = _client([_StatusError(400)])
+    with pytest.raises(RequestError):
+        ai.chat("你好")
+    assert client.calls == 1
+    assert ai.retries == 0
+
+def test_gives_up_after_max_attempts():
+    ai, client = _client([FakeRateLimitError("限流")] * 5, max_attempts=3)
+    with pytest.raises(RateLimitError):
+        ai.chat("你好")
+    assert client.calls == 3
+
+def test_overload_shrinks_concurrency():
+    limiter = LLMRateLimiter(max_concurrency=8)
+    limiter.acquire()
+    limiter.release(FakeRateLimitError("限流"))
+    assert limiter.stats()["concurrency_limit"] == 4
+
+def test_concurrency_recovers_after_successes():
+    limiter = AdaptiveConcurrency(initial=2, max_limit=4, cooldown=0)
+    limiter.acquire()
+    limiter.release(overload=True)
+    assert limiter.limit == 1
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release()
+    assert 3 < limiter.limit <= 4
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+def test_client_stays_within_server_quota():
+    # 服务端只允许4个并发任务，限流器从8开始，遇到限流后收缩并重试，所有调用最终成功
+    fake = FakeZhipuAI(latency=0.05, max_concurrency=4)
+    ai = AIClient(client=fake, cache_mode="off", limiter=LLMRateLimiter(max_concurrency=8),
+                  retry_base=0.01, retry_cap=0.05, max_attempts=8)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        replies = list(executor.map(ai.chat, [f"提示{i}" for i in range(16)]))
+    assert replies == [f"分析结果: 提示{i}" for i in range(16)]
+    assert fake.throttled > 0
+    assert ai.limiter.stats()["concurrency_limit"] < 8
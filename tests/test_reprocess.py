@@ -0,0 +1,98 @@
+"""离线重新处理results/归档: 内存映射提取、多进程、版本化输出、跳过未变化的文件和重新分析"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from reprocess import Reprocessor, find_snapshots, read_snapshot
+from utils.ai_client import AIClient
+from utils.extractor import extract_results
+from utils.fakes import FakeZhipuAI
+
+from .conftest import SNAPSHOT
+
+def _topic(root, name, copies=2):
+    """建立一个带task.json和若干份快照的话题目录"""
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, "task.json"), 'w', encoding='utf-8') as f:
+        json.dump({"topic": name, "keywords": []}, f, ensure_ascii=False)
+    for i in range(copies):
+        shutil.copy(SNAPSHOT, os.path.join(path, f"search_bing_20250309_00512{i}.html"))
+    return path
+
+def test_read_snapshot_matches_extractor():
+    with open(SNAPSHOT, 'rb') as f:
+        html = f.read().decode('utf-8')
+    records = read_snapshot(SNAPSHOT)
+    assert len(records) == 10
+    assert records == extract_results(html, "bing")
+
+def test_extract_writes_versioned_files(workdir):
+    with open(SNAPSHOT[:-len(".html")] + ".json", encoding='utf-8') as f:
+        original = json.load(f)
+    counts = Reprocessor(version="v2", workers=1).run("results")
+    assert counts["ok"] == 1 and counts["records"] == 10
+
+    with open("results/search_bing_20250309_005124.v2.json", encoding='utf-8') as f:
+        output = json.load(f)
+    assert output["keyword"] == original["keyword"] and output["version"] == "v2"
+    assert len(output["results"]) == 10
+    # 原文件保持不变，版本化文件不会被当作新的快照
+    with open("results/search_bing_20250309_005124.json", encoding='utf-8') as f:
+        assert json.load(f) == original
+    assert find_snapshots("results") == [os.path.join("results", "search_bing_20250309_005124.html")]
+
+    assert Reprocessor(version="v2", workers=1).run("results")["skipped"] == 1
+    assert Reprocessor(version="v2", workers=1, force=True).run("results")["ok"] == 1
+
+def test_process_pool_matches_single_process(tmp_path):
+    for root in ("a", "b"):
+        for topic in ("话题一", "话题二"):
+            _topic(str(tmp_path / root), topic, copies=3)
+    Reprocessor(workers=1).run(str(tmp_path / "a"))
+    counts = Reprocessor(workers=2).run(str(tmp_path / "b"))
+    assert counts["ok"] == 6
+    for topic in ("话题一", "话题二"):
+        for name in os.listdir(tmp_path / "a" / topic):
+            if name.endswith(".v2.json"):
+                with open(tmp_path / "a" / topic / name, encoding='utf-8') as a, \
+                        open(tmp_path / "b" / topic / name, encoding='utf-8') as b:
+                    assert json.load(a)["results"] == json.load(b)["results"]
+
+def test_broken_snapshots_do_not_stop_the_run(tmp_path):
+    path = _topic(str(tmp_path), "话题", copies=1)
+    open(os.path.join(path, "search_bing_empty.html"), 'wb').close()
+    with open(os.path.join(path, "search_bing_garbage.html"), 'wb') as f:
+        f.write(b"\xff\xfe<div <p" * 1000)
+    counts = Reprocessor(workers=1).run(str(tmp_path))
+    assert counts["ok"] == 1 and counts["empty"] == 2
+
+def test_reanalysis_and_final_report(tmp_path):
+    path = _topic(str(tmp_path), "机械键盘")
+    fake = FakeZhipuAI(latency=0)
+    ai = AIClient(client=fake, cache_mode="off")
+    counts = Reprocessor(workers=1, ai=ai, final=True).run(str(tmp_path))
+    assert counts["analyzed"] == 2 and counts["finals"] == 1
+    with open(os.path.join(path, "final_analysis.v2.json"), encoding='utf-8') as f:
+        assert json.load(f)["topic"] == "机械键盘"
+    assert os.path.exists(os.path.join(path, "search_bing_20250309_005120.v2.analysis.json"))
+
+    # 输入没有变化时不再调用LLM
+    created = fake.created
+    counts = Reprocessor(workers=1, ai=ai, final=True).run(str(tmp_path))
+    assert counts["analysis_skipped"] == 2 and counts["finals_skipped"] == 1
+    assert fake.created == created
+
+def test_failed_analysis_skips_final_report(tmp_path):
+    path = _topic(str(tmp_path), "机械键盘")
+    ai = AIClient(client=FakeZhipuAI(latency=0, failure_rate=1.0), cache_mode="off", max_attempts=1)
+    counts = Reprocessor(workers=1, ai=ai, final=True).run(str(tmp_path))
+    assert counts["analysis_failed"] == 2 and counts["finals_failed"] == 1
+    assert not os.path.exists(os.path.join(path, "final_analysis.v2.json"))
+
+def test_invalid_version_label():
+    with pytest.raises(ValueError):
+        Reprocessor(version="v2.1")
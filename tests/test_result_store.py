@@ -0,0 +1,64 @@
+"""话题紧凑存储: 追加、按序号读取、数据块去重、旧格式迁移和原子写入"""
+
+import json
+import os
+import stat
+
+from utils.result_store import TopicStore, atomic_write, migrate_topic
+
+def test_append_and_get(tmp_path):
+    store = TopicStore(str(tmp_path / "store"))
+    seqs = [store.append("search", {"n": i}, key=f"k{i % 2}") for i in range(5)]
+    assert seqs == list(range(5))
+    assert store.get(3) == {"n": 3}
+    assert store.get(5) is None and store.get(-1) is None
+    assert [e["seq"] for e in store.index(key="k1")] == [1, 3]
+    assert list(store.records("search", key="k0")) == [{"n": 0}, {"n": 2}, {"n": 4}]
+    assert store.latest("search") == {"n": 4}
+
+def test_sequence_continues_across_instances(tmp_path):
+    path = str(tmp_path / "store")
+    first, second = TopicStore(path), TopicStore(path)
+    assert first.append("a", {"n": 0}) == 0
+    # 另一个实例(或进程)追加的记录也计入序号
+    assert second.append("a", {"n": 1}) == 1
+    assert first.append("a", {"n": 2}) == 2
+    assert first.get(1) == {"n": 1} and second.get(2) == {"n": 2}
+    assert TopicStore(path).append("a", {"n": 3}) == 3
+
+def test_blobs_are_stored_once(tmp_path):
+    store = TopicStore(str(tmp_path / "store"))
+    digest = store.put_blob("<html>页面</html>")
+    assert store.put_blob("<html>页面</html>".encode('utf-8')) == digest
+    assert store.get_blob(digest) == "<html>页面</html>"
+    assert store.get_blob("0" * 64) is None
+    seq = store.save_search("关键词", ["结果"], "<html>页面</html>")
+    assert store.get(seq)["html"] == digest
+
+def test_migrate_topic_is_idempotent(tmp_path):
+    topic = tmp_path / "话题"
+    topic.mkdir()
+    (topic / "task.json").write_text(json.dumps({"topic": "话题", "keywords": ["a"]}), encoding='utf-8')
+    (topic / "search_bing_20250309_005124.json").write_text(
+        json.dumps({"keyword": "a", "results": ["结果"]}), encoding='utf-8')
+    (topic / "search_bing_20250309_005124.html").write_text("<html></html>", encoding='utf-8')
+    assert migrate_topic(str(topic), verbose=False) == 2
+    assert migrate_topic(str(topic), verbose=False) == 0
+    store = TopicStore.for_topic(str(topic))
+    assert store.latest("task") == {"topic": "话题", "keywords": ["a"]}
+    assert store.latest("search")["keyword"] == "a"
+    assert os.path.exists(topic / "task.json")
+
+def test_atomic_write_uses_regular_file_permissions(tmp_path):
+    reference = tmp_path / "reference.json"
+    with open(reference, 'w') as f:
+        f.write("{}")
+    path = tmp_path / "final_analysis.json"
+    atomic_write(str(path), b"{}")
+    assert stat.S_IMODE(os.stat(path).st_mode) == stat.S_IMODE(os.stat(reference).st_mode)
+    # 覆盖已有文件时保留它原来的权限
+    os.chmod(path, 0o640)
+    atomic_write(str(path), b"{\"a\": 1}")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert path.read_bytes() == b"{\"a\": 1}"
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".tmp-")] == []
@@ -0,0 +1,95 @@
+"""本地段落检索: 哈希向量、按相关度和token预算选取结果块、归档向量的增量追加"""
+
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from search_and_analyze import run_topic
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.chunking import estimate_tokens
+from utils.evidence_index import EvidenceIndex
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+from utils.retrieval import HashingVectorizer, PassageArchive, PassageRetriever
+
+PASSAGES = [
+    "机械键盘的红轴手感轻柔，适合长时间打字",
+    "今日天气晴朗，适合外出郊游",
+    "青轴机械键盘有明显的段落感和清脆的声音",
+    "股市行情分析与投资建议",
+    "茶轴介于红轴和青轴之间，是机械键盘入门的常见选择",
+]
+
+def test_vectors_are_normalized_and_deterministic():
+    vectorizer = HashingVectorizer(dim=256)
+    matrix = vectorizer.transform(PASSAGES + [""])
+    assert matrix.shape == (6, 256)
+    assert np.allclose(np.linalg.norm(matrix[:5], axis=1), 1)
+    assert not matrix[5].any()
+    assert np.array_equal(matrix, HashingVectorizer(dim=256).transform(PASSAGES + [""]))
+    with pytest.raises(ValueError):
+        HashingVectorizer(dim=1000)
+
+def test_select_prefers_relevant_passages():
+    retriever = PassageRetriever(top_k=3, min_score=0.01)
+    selected, archived = retriever.select("机械键盘轴体", "机械键盘", PASSAGES)
+    assert archived == 0
+    assert set(selected) == {PASSAGES[0], PASSAGES[2], PASSAGES[4]}
+    assert retriever.stats()["passages_in"] == 5 and retriever.stats()["passages_out"] == 3
+
+def test_select_respects_token_budget():
+    budget = estimate_tokens(PASSAGES[2]) + 1
+    retriever = PassageRetriever(token_budget=budget, top_k=10, min_score=0.01)
+    selected, _ = retriever.select("机械键盘", "机械键盘", PASSAGES)
+    assert selected and sum(estimate_tokens(text) for text in selected) <= budget
+
+def test_select_never_returns_nothing():
+    retriever = PassageRetriever(top_k=2, min_score=0.99)
+    selected, _ = retriever.select("完全无关的查询", "话题", PASSAGES)
+    assert len(selected) == 2 and set(selected) <= set(PASSAGES)
+
+def _archive(tmp_path, results):
+    os.makedirs(tmp_path / "results" / "旧话题", exist_ok=True)
+    with open(tmp_path / "results" / "旧话题" / "search_bing_1.json", 'w', encoding='utf-8') as f:
+        json.dump({"keyword": "旧关键词", "results": results}, f, ensure_ascii=False)
+    index = EvidenceIndex(str(tmp_path / "index.sqlite"))
+    index.update(str(tmp_path / "results"), verbose=False)
+    return index
+
+def test_archive_is_appended_incrementally(tmp_path):
+    index = _archive(tmp_path, PASSAGES)
+    vectorizer = HashingVectorizer(dim=256)
+    archive = PassageArchive(index, str(tmp_path / "vectors"), vectorizer)
+    assert archive.update(verbose=False) == 5
+    assert archive.update(verbose=False) == 0
+
+    # 重新打开后从磁盘映射已有的向量
+    reopened = PassageArchive(index, str(tmp_path / "vectors"), HashingVectorizer(dim=256))
+    assert reopened.rows == 5 and np.array_equal(np.asarray(reopened.vectors), vectorizer.transform(PASSAGES))
+    hits = reopened.search(vectorizer.query([("青轴声音", 1.0)]), k=1)
+    assert hits[0][1]["text"] == PASSAGES[2]
+
+    # 维度改变时重建
+    assert PassageArchive(index, str(tmp_path / "vectors"), HashingVectorizer(dim=512)).rows == 0
+
+def test_select_adds_archived_passages(tmp_path):
+    index = _archive(tmp_path, ["矮轴机械键盘更薄，适合笔记本用户", PASSAGES[1]])
+    archive = PassageArchive(index, str(tmp_path / "vectors"), HashingVectorizer(dim=512))
+    archive.update(verbose=False)
+    retriever = PassageRetriever(top_k=10, min_score=0.01, archive=archive, archive_k=2)
+    selected, archived = retriever.select("机械键盘", "机械键盘", PASSAGES[:1])
+    assert archived == 1
+    assert "矮轴机械键盘更薄，适合笔记本用户" in selected
+
+def test_run_topic_analyzes_only_selected_passages(workdir):
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off")
+    retriever = PassageRetriever(top_k=3, token_budget=2000)
+    run_topic(browser, ai, "键盘轴体", workers=1, dedup=False, retriever=retriever, trace=False,
+              stream_keywords=False)
+    stats = retriever.stats()
+    assert stats["passages_in"] == 40 and stats["passages_out"] == 12
+    assert stats["tokens_out"] < stats["tokens_in"]
@@ -0,0 +1,64 @@
+"""无界面HTTP搜索后端: 对本地快照服务器搜索、并发搜索和保存结果"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.browser_search import BrowserSearch
+from utils.fakes import SnapshotSearchBackend, SnapshotServer
+from utils.search_backends import HttpSearchBackend, html_to_text, split_result_blocks
+
+from .conftest import SNAPSHOT
+
+@pytest.fixture
+def server(workdir):
+    with SnapshotServer("results") as server:
+        yield server
+
+def test_http_backend_searches_snapshot_server(server):
+    browser = BrowserSearch(backend="http", search_url=server.url_template())
+    results, html = browser.search("键盘轴体有哪些？")
+    with open(SNAPSHOT, 'rb') as f:
+        assert html == f.read().decode('utf-8')
+    # 能解析出结构化结果时，每条结果是"标题/链接/摘要"文本块
+    assert len(results) == 10
+    assert results[0].split("\n")[1] == "https://zhuanlan.zhihu.com/p/618528924"
+    assert server.requests == 1
+
+def test_concurrent_searches(server):
+    browser = BrowserSearch(backend="http", search_url=server.url_template(), max_concurrency=4)
+    keywords = [f"关键词{i}" for i in range(12)]
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        pages = list(executor.map(browser.search, keywords))
+    assert all(len(results) == 10 and html for results, html in pages)
+    assert server.requests == len(keywords)
+
+def test_unreachable_server_returns_no_results(server):
+    url = server.url_template()
+    server.stop()
+    backend = HttpSearchBackend(timeout=1, retries=0)
+    assert backend.search("机械键盘", url) == ([], None)
+
+def test_snapshot_backend_matches_server(server):
+    http = BrowserSearch(backend="http", search_url=server.url_template())
+    snapshot = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    assert snapshot.search("任意关键词")[0] == http.search("任意关键词")[0]
+
+def test_save_results_never_overwrites(tmp_path):
+    browser = BrowserSearch(backend=SnapshotSearchBackend(str(tmp_path)))
+    paths = [browser.save_results("关键词", ["结果"], "<html></html>", str(tmp_path)) for _ in range(3)]
+    assert len({json_path for json_path, _ in paths}) == 3
+    for json_path, html_path in paths:
+        with open(json_path, encoding='utf-8') as f:
+            assert json.load(f)["results"] == ["结果"]
+        assert os.path.exists(html_path)
+
+def test_html_to_text_and_blocks():
+    html = ("<html><head><title>标题</title><script>var x = 1;</script></head><body>"
+            "<div>第一段内容，长度足够超过结果块的最小长度限制。</div><p>短</p>"
+            "<div>Copyright 2024 某网站 保留所有权利，这一段会被当作无关内容过滤。</div></body></html>")
+    text = html_to_text(html)
+    assert "var x" not in text and "标题" not in text
+    assert split_result_blocks(text, min_length=10) == ["第一段内容，长度足够超过结果块的最小长度限制。"]
@@ -0,0 +1,108 @@
+"""服务模式的HTTP接口: 提交话题、查询进度、读取报告、取消任务和运行指标"""
+
+import argparse
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from search_and_analyze import add_arguments
+from serve import TopicService, create_server, parse_job_request
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+from utils.job_queue import JobQueue
+from utils.rate_limit import LLMRateLimiter
+
+def _args(*argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=1)
+    add_arguments(parser)
+    return parser.parse_args(list(argv))
+
+@pytest.fixture
+def service(workdir):
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off", limiter=LLMRateLimiter())
+    service = TopicService(JobQueue(str(workdir / "jobs.sqlite")), browser, ai, _args("--no-trace"),
+                           log_stream=io.StringIO(), poll_interval=0.05)
+    httpd = create_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    host, port = httpd.server_address[:2]
+    service.url = f"http://{host}:{port}"
+    yield service
+    httpd.shutdown()
+    httpd.server_close()
+    service.stop()
+
+def _request(service, method, path, body=None):
+    data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(service.url + path, data=data, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def _wait_until_finished(service, job_id, timeout=20):
+    end = time.monotonic() + timeout
+    while True:
+        status, job = _request(service, "GET", f"/jobs/{job_id}")
+        if job["status"] not in ("queued", "running"):
+            return job
+        assert time.monotonic() < end, "任务没有在规定时间内完成"
+        time.sleep(0.05)
+
+def test_parse_job_request():
+    assert parse_job_request({"topic": " 机械键盘 ", "incremental": True}) == ("机械键盘", {"incremental": True})
+    for body in ([], {}, {"topic": ""}, {"topic": "a", "workers": 4}, {"topic": "a", "fresh": 1},
+                 {"topic": "a", "synthesis_deadline": 0}, {"topic": "a", "synthesis_deadline": True}):
+        with pytest.raises(ValueError):
+            parse_job_request(body)
+
+def test_submit_and_fetch_report(service):
+    assert _request(service, "GET", "/health") == (200, {"status": "ok"})
+    assert _request(service, "POST", "/jobs", {"topic": ""})[0] == 400
+    service.start()
+    status, created = _request(service, "POST", "/jobs", {"topic": "机械键盘", "incremental": True})
+    assert status == 202 and created["url"] == f"/jobs/{created['id']}"
+
+    job = _wait_until_finished(service, created["id"])
+    assert job["status"] == "ok" and job["options"] == {"incremental": True}
+    assert job["report"] == f"/jobs/{created['id']}/report"
+    # 全部结果都与其他关键词重复的关键词也计为完成
+    assert job["progress"]["total"] == job["progress"]["analyzed"] == len(job["result"]["keywords"])
+
+    status, report = _request(service, "GET", job["report"])
+    assert status == 200 and report["topic"] == "机械键盘" and report["provisional"] is False
+    status, listing = _request(service, "GET", "/jobs?status=ok")
+    assert status == 200 and [j["id"] for j in listing["jobs"]] == [created["id"]]
+    assert "progress" not in listing["jobs"][0]
+
+def test_cancel_queued_job(service):
+    # 工作线程尚未启动，任务停留在队列中
+    job_id = _request(service, "POST", "/jobs", {"topic": "机械键盘"})[1]["id"]
+    assert _request(service, "GET", f"/jobs/{job_id}/report")[0] == 404
+    status, job = _request(service, "DELETE", f"/jobs/{job_id}")
+    assert status == 200 and job["status"] == "cancelled"
+    assert _request(service, "DELETE", f"/jobs/{job_id}")[0] == 409
+    assert _request(service, "GET", "/jobs/999")[0] == 404
+    assert _request(service, "POST", f"/jobs/{job_id}/report")[0] == 405
+    assert _request(service, "GET", "/unknown")[0] == 404
+
+def test_metrics(service):
+    service.start()
+    job_id = _request(service, "POST", "/jobs", {"topic": "机械键盘"})[1]["id"]
+    _wait_until_finished(service, job_id)
+    status, metrics = _request(service, "GET", "/metrics")
+    assert status == 200
+    assert metrics["queue"]["depth"] == 0 and metrics["queue"]["by_status"] == {"ok": 1}
+    assert metrics["workers"] == {"total": 1, "busy": 0}
+    assert metrics["throughput"]["since_start"]["finished"] == 1
+    assert metrics["latency"]["total"]["count"] == 1
+    assert metrics["llm"]["coalesced"]["calls"] > 0
@@ -0,0 +1,81 @@
+"""合并同时进行中的相同请求: 搜索和LLM调用只发起一次，失败传给所有等待者且不被缓存"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+from utils.rate_limit import LLMError
+from utils.singleflight import SingleFlight
+
+def _concurrently(fn, n):
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        return list(executor.map(call, range(n)))
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight("test")
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results = _concurrently(lambda i: flight.do("键", slow), 8)
+    assert len(calls) == 1 and all(r is results[0] for r in results)
+    assert flight.stats() == {"calls": 1, "coalesced": 7, "failures": 0, "in_flight": 0}
+
+    # 结果不缓存，之后的调用重新执行
+    flight.do("键", slow)
+    assert len(calls) == 2
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight("test")
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError("请求失败")
+
+    def call(i):
+        with pytest.raises(RuntimeError):
+            flight.do("键", fail)
+
+    _concurrently(call, 4)
+    assert flight.stats()["failures"] == 1 and flight.stats()["coalesced"] == 3
+    assert flight.do("键", lambda: "成功") == "成功"
+
+def test_identical_prompts_are_submitted_once():
+    fake = FakeZhipuAI(latency=0.2)
+    ai = AIClient(client=fake, cache_mode="off")
+    results = _concurrently(lambda i: ai.chat("相同的提示"), 6)
+    assert results == ["分析结果: 相同的提示"] * 6
+    assert fake.created == 1 and ai.inflight.coalesced == 5
+
+    _concurrently(lambda i: ai.chat(f"提示{i % 2}"), 6)
+    assert fake.created == 3
+
+def test_failed_prompt_is_retried_by_later_callers():
+    fake = FakeZhipuAI(latency=0.1, failure_rate=1.0)
+    ai = AIClient(client=fake, cache_mode="off", max_attempts=1)
+    with pytest.raises(LLMError):
+        ai.chat("提示")
+    fake.failure_rate = 0.0
+    assert ai.chat("提示") == "分析结果: 提示"
+
+def test_identical_searches_are_coalesced(workdir):
+    backend = SnapshotSearchBackend("results", latency=0.2)
+    browser = BrowserSearch(backend=backend)
+    pages = _concurrently(lambda i: browser.search("键盘轴体有哪些？" if i % 2 else "  键盘轴体有哪些？ "), 6)
+    assert backend.requests == 1 and browser.inflight.coalesced == 5
+    # 合并的调用者各自得到结果列表的副本
+    assert all(results == pages[0][0] and results is not pages[0][0] for results, _ in pages[1:])
@@ -0,0 +1,73 @@
+"""流式生成最终报告: 逐段输出、首个token用时和失败时回退到异步请求"""
+
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from search_and_analyze import generate_final_analysis, run_topic
+from utils import tracing
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeServerError, FakeZhipuAI, SnapshotSearchBackend
+from utils.rate_limit import LLMError
+
+def _long_reply(prompt):
+    return "最终报告" * 40
+
+def test_stream_chat_yields_tokens():
+    fake = FakeZhipuAI(latency=0.05, responder=_long_reply)
+    ai = AIClient(client=fake, cache_mode="off")
+    tokens = []
+    assert ai.stream_chat("提示", on_token=tokens.append) == _long_reply("提示")
+    assert len(tokens) > 1 and "".join(tokens) == _long_reply("提示")
+    assert fake.streams == 1 and fake.retrieves == 0
+
+def test_streamed_report_reports_ttft(capsys):
+    fake = FakeZhipuAI(latency=0.4, responder=_long_reply, first_token_ratio=0.1)
+    ai = AIClient(client=fake, cache_mode="off")
+    report, timing = generate_final_analysis(ai, "机械键盘", ["分析一", "分析二"], stream=True)
+    assert report == _long_reply("")
+    assert timing["mode"] == "stream"
+    assert timing["ttft"] < 0.2 < timing["total"]
+    # 报告边生成边输出到控制台
+    assert report in capsys.readouterr().out
+
+def test_async_report_ttft_equals_total():
+    ai = AIClient(client=FakeZhipuAI(latency=0.05), cache_mode="off")
+    _, timing = generate_final_analysis(ai, "机械键盘", ["分析一"], stream=False)
+    assert timing["mode"] == "async" and timing["ttft"] == timing["total"]
+
+def _without_streaming(fake):
+    def create(**kwargs):
+        raise FakeServerError("流式接口不可用")
+    fake.chat = SimpleNamespace(asyncCompletions=fake.chat.asyncCompletions,
+                                completions=SimpleNamespace(create=create))
+    return fake
+
+def test_stream_failure_falls_back_to_async():
+    fake = _without_streaming(FakeZhipuAI(latency=0.01))
+    ai = AIClient(client=fake, cache_mode="off", max_attempts=1)
+    tokens = []
+    tracer = tracing.Tracer()
+    with tracer.activate():
+        report = ai.analyze_final_results("机械键盘", ["分析一"], on_token=tokens.append)
+    assert report.startswith("分析结果: ")
+    assert tokens == [report]
+    assert tracer.counters["llm_stream_fallbacks"] == 1
+
+def test_stream_and_fallback_both_failing_raise():
+    ai = AIClient(client=FakeZhipuAI(latency=0, failure_rate=1.0), cache_mode="off", max_attempts=1)
+    with pytest.raises(LLMError):
+        generate_final_analysis(ai, "机械键盘", ["分析一"], stream=True)
+
+def test_run_topic_saves_streamed_report(workdir):
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off")
+    outcome = run_topic(browser, ai, "机械键盘", workers=2, stream=True, trace=False, stream_keywords=False)
+    with open(os.path.join(outcome["topic_path"], "final_analysis.json"), encoding='utf-8') as f:
+        record = json.load(f)
+    assert record["analysis"] == outcome["final_analysis"]
+    assert record["timing"]["mode"] == "stream"
+    assert record["timing"]["ttft"] <= record["timing"]["total"]
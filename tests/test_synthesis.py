@@ -0,0 +1,88 @@
+"""增量整合最终报告: 逐批合并、临时报告、合并失败后重试和截止时间到期时的部分定稿"""
+
+import json
+import os
+import time
+
+import pytest
+
+from search_and_analyze import run_topic
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+from utils.rate_limit import LLMError
+from utils.synthesis import IncrementalSynthesis
+
+def _wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "等待超时"
+        time.sleep(0.01)
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def test_analyses_are_folded_as_they_arrive(tmp_path):
+    path = str(tmp_path / "final_analysis.json")
+    synthesis = IncrementalSynthesis(AIClient(client=FakeZhipuAI(latency=0.01), cache_mode="off"), "机械键盘",
+                                     path=path)
+    assert synthesis.add("红轴", "红轴的分析")
+    # 第一批合并后立即发布临时报告
+    _wait_for(lambda: os.path.exists(path))
+    assert _read(path)["provisional"] is True and _read(path)["synthesis"]["keywords"] == ["红轴"]
+
+    synthesis.add("青轴", "青轴的分析")
+    synthesis.add("茶轴", "茶轴的分析")
+    record = synthesis.finish()
+    assert record["provisional"] is False and record["timing"]["mode"] == "incremental"
+    assert record["synthesis"]["keywords"] == ["红轴", "青轴", "茶轴"]
+    assert 2 <= record["synthesis"]["folds"] <= 3
+    assert _read(path) == record
+    assert not synthesis.add("矮轴", "截止后的分析")
+
+def test_failed_fold_is_retried_with_the_next_batch():
+    fake = FakeZhipuAI(latency=0, failure_rate=1.0)
+    synthesis = IncrementalSynthesis(AIClient(client=fake, cache_mode="off", max_attempts=1), "机械键盘")
+    synthesis.add("红轴", "红轴的分析")
+    _wait_for(lambda: synthesis.failures == 1)
+    assert synthesis.summary is None
+    fake.failure_rate = 0.0
+    synthesis.add("青轴", "青轴的分析")
+    record = synthesis.finish()
+    assert record["synthesis"]["keywords"] == ["红轴", "青轴"]
+
+def test_finish_raises_when_analyses_cannot_be_merged():
+    ai = AIClient(client=FakeZhipuAI(latency=0, failure_rate=1.0), cache_mode="off", max_attempts=1)
+    synthesis = IncrementalSynthesis(ai, "机械键盘")
+    synthesis.add("红轴", "红轴的分析")
+    with pytest.raises(LLMError):
+        synthesis.finish()
+
+def test_finish_without_analyses():
+    synthesis = IncrementalSynthesis(AIClient(client=FakeZhipuAI(latency=0), cache_mode="off"), "机械键盘")
+    assert synthesis.finish() is None
+
+def test_run_topic_incremental(workdir):
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off")
+    outcome = run_topic(browser, ai, "机械键盘", workers=2, dedup=False, incremental=True, trace=False,
+                        stream_keywords=False)
+    record = _read(os.path.join(outcome["topic_path"], "final_analysis.json"))
+    assert record["provisional"] is False and record["analysis"] == outcome["final_analysis"]
+    assert sorted(record["synthesis"]["keywords"]) == sorted(outcome["keywords"])
+
+def test_deadline_finalizes_with_the_analyses_that_arrived(workdir):
+    backend = SnapshotSearchBackend("results", latency=lambda keyword: 1.5 if "影响" in keyword else 0)
+    browser = BrowserSearch(backend=backend)
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off")
+    start = time.perf_counter()
+    outcome = run_topic(browser, ai, "机械键盘", workers=1, dedup=False, incremental=True, synthesis_deadline=0.8,
+                        trace=False, stream_keywords=False)
+    assert outcome["partial"]
+    record = _read(outcome["final_path"])
+    assert record["synthesis"]["partial"] is True
+    assert "机械键盘 影响" not in record["synthesis"]["keywords"]
+    assert len(record["synthesis"]["keywords"]) == 3
+    # 定稿后等待进行中的关键词写完检查点才返回
+    assert time.perf_counter() - start >= 1.5
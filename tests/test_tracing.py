@@ -0,0 +1,63 @@
+"""阶段计时: span嵌套、跨线程传递和trace.json"""
+
+import json
+import os
+import threading
+
+from search_and_analyze import run_topic
+from utils import tracing
+from utils.ai_client import AIClient
+from utils.browser_search import BrowserSearch
+from utils.fakes import FakeZhipuAI, SnapshotSearchBackend
+
+def test_spans_are_noops_without_tracer():
+    assert tracing.span("search") is tracing.NOOP_SPAN
+    assert tracing.current_span() is tracing.NOOP_SPAN
+    tracing.count("bytes_written", 10)
+    assert tracing.bind(len) is len
+
+def test_nested_spans_and_counters():
+    tracer = tracing.Tracer("话题")
+    with tracer.activate():
+        with tracing.span("topic") as topic:
+            with tracing.span("search", keyword="a") as search:
+                tracing.count("bytes_written", 5)
+                tracing.current_span().set(results=3)
+            try:
+                with tracing.span("analyze"):
+                    raise ValueError("失败")
+            except ValueError:
+                pass
+    spans = {s.name: s for s in tracer.spans}
+    assert spans["search"].parent == topic.id and spans["topic"].parent is None
+    assert search.attrs == {"keyword": "a", "bytes_written": 5, "results": 3}
+    assert spans["analyze"].attrs["error"] == "ValueError: 失败"
+    assert tracer.counters == {"bytes_written": 5}
+    assert [row[0] for row in tracer.summary()][0] == "topic"
+
+def test_bind_carries_context_to_threads():
+    tracer = tracing.Tracer()
+    with tracer.activate():
+        with tracing.span("parent") as parent:
+            def work():
+                with tracing.span("child"):
+                    pass
+            threads = [threading.Thread(target=tracing.bind(work)) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+    children = [s for s in tracer.spans if s.name == "child"]
+    assert len(children) == 3 and all(s.parent == parent.id for s in children)
+
+def test_run_topic_writes_trace(workdir):
+    browser = BrowserSearch(backend=SnapshotSearchBackend("results"))
+    ai = AIClient(client=FakeZhipuAI(latency=0), cache_mode="off")
+    outcome = run_topic(browser, ai, "机械键盘", workers=2, stream_keywords=False)
+    with open(os.path.join(outcome["topic_path"], "trace.json"), encoding='utf-8') as f:
+        trace = json.load(f)
+    names = {s["name"] for s in trace["spans"]}
+    assert {"topic", "search_tasks", "search", "analyze", "final_analysis", "llm.chat"} <= names
+    searches = [s for s in trace["spans"] if s["name"] == "search"]
+    assert sorted(s["attrs"]["keyword"] for s in searches) == sorted(outcome["keywords"])
+    assert trace["counters"]["bytes_written"] > 0
@@ -2,9 +2,27 @@
 通用工具模块包含:
 - ai_client: 智谱AI调用工具
 - browser_search: 浏览器搜索工具
+- backends: 搜索后端和LLM后端注册表
+
+AIClient和BrowserSearch在第一次访问时才导入，import utils不会加载zhipuai、pywin32等依赖。
 """
 
-from .ai_client import AIClient
-from .browser_search import BrowserSearch
+import importlib
+
+_LAZY = {
+    'AIClient': '.ai_client',
+    'BrowserSearch': '.browser_search',
+}
 
 __all__ = ['AIClient', 'BrowserSearch']
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
@@ -1,18 +1,107 @@
 import os
 import json
-from zhipuai import ZhipuAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import time
 from pathlib import Path
-from dotenv import load_dotenv
+from .backends import create_llm_client
+from .poller import CompletionPoller
+from .rate_limit import LLMError, LLMTimeoutError, LLMRateLimiter, backoff_delay, classify_error
+from .llm_cache import make_cache_key
+from .chunking import estimate_tokens, split_into_chunks, group_by_budget
+from .keyword_stream import KeywordStream
+from .singleflight import SingleFlight
+from . import tracing
 
+ANALYZE_TEMPLATE = """请对以下内容进行分析总结，包括以下几个方面：
+1. 主要话题和关键信息概述
+2. 相关新闻和动态（如果有）
+3. 重要观点或争议（如果有）
+4. 总体趋势和结论
+
+内容：
+{text}"""
+
+SEARCH_TASKS_TEMPLATE = """作为一个专业的研究分析师，请帮我分析以下话题，需要从哪些方面进行信息收集？
+请列出5-8个具体的搜索关键词。每个关键词都应该针对话题的一个重要方面。
+格式要求：必须输出JSON格式，包含keywords数组字段。
+
+话题：{topic}"""
+
+FINAL_ANALYSIS_TEMPLATE = """请基于以下搜集到的分析信息，对这个话题进行深入剖析和回答。
+你的分析应该：
+1. 开门见山，直接针对话题提出的问题给出分析
+2. 从多个角度解释这种现象背后的原因
+3. 评估这种做法的利弊
+4. 对未来发展趋势和可能的改进方向提出建议
+
+请记住始终围绕原话题展开分析，确保回答切中要害。
+
+话题：{topic}
+
+分析信息：
+{text}"""
+
+SYNTHESIS_FOLD_TEMPLATE = """话题：{topic}
+
+以下是目前对这个话题的综合分析，以及新完成的若干方面分析结果。请把新的分析并入综合分析，
+输出更新后的完整综合分析：保留原有的结论和依据，补充新的事实、数据和观点，修正与新信息矛盾的地方，去除重复内容。
+综合分析应该：
+1. 开门见山，直接针对话题提出的问题给出分析
+2. 从多个角度解释这种现象背后的原因
+3. 评估这种做法的利弊
+4. 对未来发展趋势和可能的改进方向提出建议
+
+当前综合分析：
+{summary}
+
+新的分析结果：
+{text}"""
+
+CHUNK_REDUCE_TEMPLATE = """以下是同一批搜索结果分段分析得到的多份分析总结，请将它们合并为一份完整的分析总结。
+要求保留所有关键信息和数据，去除重复内容，并保持以下结构：
+1. 主要话题和关键信息概述
+2. 相关新闻和动态（如果有）
+3. 重要观点或争议（如果有）
+4. 总体趋势和结论
+
+分段分析：
+{text}"""
+
+PARTIAL_SYNTHESIS_TEMPLATE = """话题：{topic}
+
+以下是围绕该话题的若干方面分析结果，请把它们整合为一份精炼的中间综述，
+保留关键事实、数据、观点和分歧，去除重复内容，供后续最终分析使用。
+
+分析结果：
+{text}"""
+
+def parse_search_tasks(response):
+    """从生成搜索任务的回复中提取keywords列表，无法解析时返回空列表"""
+    try:
+        # 尝试从回复中提取JSON部分
+        start = response.find('{')
+        end = response.rfind('}') + 1
+        if start >= 0 and end > start:
+            json_str = response[start:end]
+            data = json.loads(json_str)
+            return data.get('keywords', [])
+        return []
+    except:
+        return []
+
+@lru_cache(maxsize=None)
 def load_api_key():
-    """从环境文件加载API密钥
+    """从环境文件加载API密钥，只在第一次调用时读取文件
     
     优先从.env_local加载，如果不存在则从.env_online加载
     
     Returns:
         str: API密钥
     """
+    from dotenv import load_dotenv
+    
     # 获取项目根目录
     root_dir = Path(__file__).parent.parent
     
@@ -30,31 +119,91 @@ def load_api_key():
     
     raise ValueError("未找到API密钥配置文件(.env_local或.env_online)")
 
+def create_zhipuai_client(api_key=None):
+    """创建智谱AI客户端，zhipuai在这里才导入
+
+    Args:
+        api_key (str, optional): API密钥。如果为None则从环境文件加载
+    """
+    from zhipuai import ZhipuAI
+    return ZhipuAI(api_key=api_key if api_key is not None else load_api_key())
+
 class AIClient:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, client=None, cache=None, cache_mode="on",
+                 token_budget=None, map_workers=4, reduce_fan_in=4, max_concurrency=None,
+                 limiter=None, max_attempts=4, retry_base=1.0, retry_cap=30.0, backend="zhipuai"):
         """初始化AI客户端
         
         Args:
             api_key (str, optional): API密钥。如果为None则从环境文件加载
+            client (optional): 已构造的客户端(如测试用的FakeZhipuAI)。提供时忽略api_key
+            cache (ResponseCache, optional): 回复缓存。如果为None则不使用缓存
+            cache_mode (str): "on"读写缓存，"refresh"跳过读取但写入新结果，"off"完全绕过缓存
+            token_budget (int, optional): 单个提示中待分析内容的token上限。超出时自动切换为
+                map-reduce分析；如果为None则不做限制
+            map_workers (int): map阶段并发分析的分块数
+            reduce_fan_in (int): reduce阶段每次合并的最多结果数
+            max_concurrency (int, optional): 同时进行中的请求数上限，多个话题共用同一客户端时
+                用于控制全局并发；如果为None则不限制
+            limiter (LLMRateLimiter, optional): 限流器，提供时忽略max_concurrency。
+                多个客户端共用一个限流器即可在进程范围内限制QPS和并发
+            max_attempts (int): 可重试错误(限流、过载、网络错误)的最多尝试次数
+            retry_base (float): 重试等待的基准时间(秒)，按指数增长并随机抖动
+            retry_cap (float): 单次重试等待的最长时间(秒)
+            backend (str): 未提供client时使用的LLM后端名称，见utils.backends
         """
-        if api_key is None:
-            api_key = load_api_key()
-        self.client = ZhipuAI(api_key=api_key)
+        if cache_mode not in ("on", "refresh", "off"):
+            raise ValueError(f"Unsupported cache mode: {cache_mode}")
+        if client is None:
+            client = create_llm_client(backend, api_key=api_key)
+        self.client = client
+        self._poller = None
+        self._poller_lock = threading.Lock()
+        self.cache = cache
+        self.cache_mode = cache_mode
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
+        self.token_budget = token_budget
+        self.map_workers = map_workers
+        self.reduce_fan_in = reduce_fan_in
+        if limiter is None and max_concurrency:
+            limiter = LLMRateLimiter(max_concurrency=max_concurrency)
+        self.limiter = limiter
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.retries = 0
+        # 同时进行中的相同请求只提交一次
+        self.inflight = SingleFlight("llm")
 
-    def async_chat(self, prompt, model="glm-4-flash", max_retries=40, retry_interval=2):
-        """异步调用AI进行对话
+    @property
+    def poller(self):
+        """所有请求共享的异步任务轮询器"""
+        with self._poller_lock:
+            if self._poller is None:
+                self._poller = CompletionPoller(self.client)
+            return self._poller
+
+    def submit_chat(self, prompt, model="glm-4-flash", timeout=None):
+        """提交异步对话任务，不阻塞等待结果
         
         Args:
             prompt (str): 输入的提示文本
             model (str): 使用的模型名称
-            max_retries (int): 最大重试次数
-            retry_interval (int): 重试间隔(秒)
+            timeout (float, optional): 任务超时时间(秒)
             
         Returns:
-            str: AI的回复内容
+            Future: 结果为AI的回复内容
+            
+        Raises:
+            LLMError: 任务提交失败(如触发限流)
         """
+        limiter = self.limiter
+        if limiter is not None:
+            # 等待令牌和并发名额
+            limiter.acquire()
         try:
-            # 异步调用
             response = self.client.chat.asyncCompletions.create(
                 model=model,
                 messages=[{
@@ -62,24 +211,192 @@ class AIClient:
                     "content": prompt
                 }]
             )
-            
-            task_id = response.id
-            task_status = response.task_status
+            future = self.poller.submit(response.id, timeout=timeout)
+        except Exception as e:
+            error = classify_error(e)
+            if limiter is not None:
+                limiter.release(error)
+            raise error from e
+        if limiter is not None:
+            future.add_done_callback(lambda f: limiter.release(None if f.cancelled() else f.exception()))
+        return future
 
-            # 轮询等待结果
-            retries = 0
-            while task_status not in ["SUCCESS", "FAILED"] and retries <= max_retries:
-                result_response = self.client.chat.asyncCompletions.retrieve_completion_result(id=task_id)
-                task_status = result_response.task_status
-                if task_status == "SUCCESS":
-                    return result_response.choices[0].message.content
-                time.sleep(retry_interval)
-                retries += 1
+    async def achat(self, prompt, model="glm-4-flash", timeout=None):
+        """submit_chat的asyncio版本，可在单个事件循环中并发等待大量请求
+        
+        Returns:
+            str: AI的回复内容
+        """
+        import asyncio
+        return await asyncio.wrap_future(self.submit_chat(prompt, model=model, timeout=timeout))
+
+    def chat(self, prompt, model="glm-4-flash", timeout=80):
+        """调用AI进行对话，限流、过载和网络错误按指数退避加随机抖动重试
+        
+        模型和提示都相同的请求正在进行时不再重复提交，而是等待该请求(包括其重试)的结果；
+        请求失败时所有等待者都收到同一个错误，失败不会被记住，之后的调用会重新提交。
+        
+        Args:
+            prompt (str): 输入的提示文本
+            model (str): 使用的模型名称
+            timeout (float): 单次任务的超时时间(秒)
+            
+        Returns:
+            str: AI的回复内容
+            
+        Raises:
+            LLMError: 不可重试的错误，或重试次数用尽
+        """
+        return self.inflight.do((model, prompt), lambda: self._chat(prompt, model, timeout))
 
+    def _chat(self, prompt, model, timeout):
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                with self._stats_lock:
+                    self.retries += 1
+                tracing.count("llm_retries")
+                time.sleep(backoff_delay(attempt - 1, self.retry_base, self.retry_cap))
+            with tracing.span("llm.chat", model=model, prompt_chars=len(prompt), attempt=attempt) as span:
+                future = None
+                try:
+                    future = self.submit_chat(prompt, model=model, timeout=timeout)
+                    span.set(task_id=future.task_id)
+                    response = future.result()
+                    span.set(polls=future.polls, response_chars=len(response))
+                    return response
+                except Exception as e:
+                    error = classify_error(e)
+                    span.set(status=type(error).__name__)
+                    if future is not None:
+                        span.set(polls=future.polls)
+            if not error.retryable or attempt == self.max_attempts:
+                raise error
+    
+    def stream_chat(self, prompt, model="glm-4-flash", on_token=None):
+        """使用流式接口调用AI，边生成边返回文本
+        
+        Args:
+            prompt (str): 输入的提示文本
+            model (str): 使用的模型名称
+            on_token (callable, optional): 每收到一段文本时调用on_token(文本)
+            
+        Returns:
+            str: 完整的回复内容
+            
+        Raises:
+            LLMError: 请求失败或流在中途断开
+        """
+        limiter = self.limiter
+        if limiter is not None:
+            limiter.acquire()
+        error = None
+        with tracing.span("llm.stream", model=model, prompt_chars=len(prompt)) as span:
+            start = time.perf_counter()
+            first_token = None
+            parts = []
+            try:
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=[{
+                        "role": "user",
+                        "content": prompt
+                    }],
+                    stream=True
+                )
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    parts.append(delta)
+                    if on_token is not None:
+                        on_token(delta)
+            except Exception as e:
+                error = classify_error(e)
+                span.set(status=type(error).__name__)
+                raise error from e
+            finally:
+                if limiter is not None:
+                    limiter.release(error)
+            content = "".join(parts)
+            span.set(ttft=round(first_token, 4) if first_token is not None else None,
+                     chunks=len(parts), response_chars=len(content))
+        if not content:
+            raise LLMError("流式回复为空")
+        return content
+    
+    def async_chat(self, prompt, model="glm-4-flash", max_retries=40, retry_interval=2):
+        """异步调用AI进行对话
+        
+        Args:
+            prompt (str): 输入的提示文本
+            model (str): 使用的模型名称
+            max_retries (int): 最大重试次数
+            retry_interval (int): 重试间隔(秒)，与max_retries共同决定超时时间
+            
+        Returns:
+            str: AI的回复内容；失败时为"Request Timeout"或"Error: ..."
+        """
+        try:
+            return self.chat(prompt, model=model, timeout=max_retries * retry_interval)
+        except LLMTimeoutError:
             return "Request Timeout"
-        except Exception as e:
+        except LLMError as e:
             return f"Error: {str(e)}"
 
+    def _complete(self, prompt, model, on_token=None):
+        """按是否需要流式输出选择调用方式，流式请求失败时回退到异步请求"""
+        if on_token is None:
+            return self.chat(prompt, model=model)
+        try:
+            return self.stream_chat(prompt, model=model, on_token=on_token)
+        except LLMError as e:
+            print(f"\n流式请求失败({e})，改用异步请求...")
+            tracing.count("llm_stream_fallbacks")
+        response = self.chat(prompt, model=model)
+        on_token(response)
+        return response
+    
+    def cached_chat(self, prompt, template=None, model="glm-4-flash", on_token=None):
+        """带缓存的对话调用，失败时抛出异常，不会写入缓存
+        
+        Args:
+            prompt (str): 输入的提示文本
+            template (str, optional): 生成该提示所用的模板，参与缓存键计算
+            model (str): 使用的模型名称
+            on_token (callable, optional): 提供时使用流式输出，每收到一段文本调用on_token(文本)；
+                命中缓存或回退到异步请求时，完整回复一次性传给on_token
+            
+        Returns:
+            str: AI的回复内容
+            
+        Raises:
+            LLMError: 调用失败
+        """
+        if self.cache is None or self.cache_mode == "off":
+            return self._complete(prompt, model, on_token)
+        
+        key = make_cache_key(model, template, prompt)
+        if self.cache_mode == "on":
+            cached = self.cache.get(key)
+            with self._stats_lock:
+                if cached is not None:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if cached is not None:
+                tracing.count("llm_cache_hits")
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+        
+        response = self._complete(prompt, model, on_token)
+        self.cache.put(key, response, model=model)
+        return response
+
     def analyze_text(self, text, template=None):
         """分析文本内容
         
@@ -89,19 +406,103 @@ class AIClient:
             
         Returns:
             str: 分析结果
+            
+        Raises:
+            LLMError: 调用失败
         """
         if template is None:
-            template = """请对以下内容进行分析总结，包括以下几个方面：
-1. 主要话题和关键信息概述
-2. 相关新闻和动态（如果有）
-3. 重要观点或争议（如果有）
-4. 总体趋势和结论
-
-内容：
-{text}"""
+            template = ANALYZE_TEMPLATE
+        
+        if self.token_budget and estimate_tokens(text) > self.token_budget:
+            return self.map_reduce_text(text, template=template)
         
         prompt = template.format(text=text)
-        return self.async_chat(prompt)
+        return self.cached_chat(prompt, template=template)
+
+    def _map_prompts(self, prompts_and_templates):
+        """并发执行多个带缓存的对话调用
+        
+        Args:
+            prompts_and_templates (list): (提示文本, 模板)列表
+            
+        Returns:
+            list: 与输入顺序一致的回复列表，失败的调用对应LLMError异常对象
+        """
+        def call(prompt_and_template):
+            try:
+                return self.cached_chat(prompt_and_template[0], template=prompt_and_template[1])
+            except LLMError as e:
+                return e
+        
+        if len(prompts_and_templates) == 1:
+            return [call(prompts_and_templates[0])]
+        with ThreadPoolExecutor(max_workers=max(1, self.map_workers)) as executor:
+            return list(executor.map(tracing.bind(call), prompts_and_templates))
+
+    def _tree_reduce(self, items, template, budget, stop_when_fits=False, **fields):
+        """分层合并分析结果，每层把若干结果合并为一个，直到只剩一个
+        
+        Args:
+            items (list): 待合并的分析结果
+            template (str): 合并提示模板，包含{text}以及fields中的占位符
+            budget (int): 每次合并输入的token上限
+            stop_when_fits (bool): 为True时，全部结果的总长度不超过budget即停止合并
+            
+        Returns:
+            list: 合并后的结果列表
+        """
+        fan_in = max(2, self.reduce_fan_in)
+        while len(items) > 1:
+            if stop_when_fits and estimate_tokens("\n\n".join(items)) <= budget:
+                break
+            groups = group_by_budget(items, budget, fan_in)
+            if len(groups) == len(items):
+                # 单个结果已经占满预算，强制两两合并，保证每层数量减少
+                groups = [items[i:i + 2] for i in range(0, len(items), 2)]
+            prompts = []
+            for group in groups:
+                if len(group) > 1:
+                    prompts.append((template.format(text="\n\n".join(group), **fields), template))
+            merged = iter(self._map_prompts(prompts))
+            next_items = []
+            for group in groups:
+                if len(group) == 1:
+                    next_items.append(group[0])
+                    continue
+                result = next(merged)
+                # 合并失败时保留原始结果，不让错误信息进入下一层
+                next_items.extend([result] if not isinstance(result, LLMError) else group)
+            if len(next_items) >= len(items):
+                break
+            items = next_items
+        return items
+
+    def map_reduce_text(self, text, template=None, token_budget=None):
+        """按token预算分块并行分析文本，再分层合并为一份分析
+        
+        Args:
+            text (str): 要分析的文本内容
+            template (str, optional): 分块分析的提示模板。如果为None则使用默认模板
+            token_budget (int, optional): 每块的token上限。如果为None则使用实例配置
+            
+        Returns:
+            str: 合并后的分析结果
+            
+        Raises:
+            LLMError: 所有分块的分析都失败
+        """
+        template = template or ANALYZE_TEMPLATE
+        budget = token_budget or self.token_budget or 4000
+        chunks = split_into_chunks(text, budget)
+        print(f"内容约 {estimate_tokens(text)} tokens，拆分为 {len(chunks)} 块并行分析...")
+        
+        with tracing.span("llm.map_reduce", chunks=len(chunks)):
+            partials = self._map_prompts([(template.format(text=chunk), template) for chunk in chunks])
+            valid = [p for p in partials if not isinstance(p, LLMError)]
+            if not valid:
+                raise partials[0]
+            
+            return self._tree_reduce(valid, CHUNK_REDUCE_TEMPLATE, budget)[0]
 
     def get_search_tasks(self, topic):
         """为给定话题生成搜索任务
@@ -112,52 +513,74 @@ class AIClient:
         Returns:
             list: 搜索关键词列表和建议
         """
-        prompt = f"""作为一个专业的研究分析师，请帮我分析以下话题，需要从哪些方面进行信息收集？
-请列出5-8个具体的搜索关键词。每个关键词都应该针对话题的一个重要方面。
-格式要求：必须输出JSON格式，包含keywords数组字段。
+        prompt = SEARCH_TASKS_TEMPLATE.format(topic=topic)
+        response = self.cached_chat(prompt, template=SEARCH_TASKS_TEMPLATE)
+        return parse_search_tasks(response)
 
-话题：{topic}"""
-        
-        response = self.async_chat(prompt)
-        try:
-            # 尝试从回复中提取JSON部分
-            start = response.find('{')
-            end = response.rfind('}') + 1
-            if start >= 0 and end > start:
-                json_str = response[start:end]
-                data = json.loads(json_str)
-                return data.get('keywords', [])
-            return []
-        except:
-            return []
-
-    def analyze_final_results(self, topic, analysis_results):
+    def stream_search_tasks(self, topic):
+        """以流式方式为给定话题生成搜索任务，关键词在回复生成过程中逐个产出
+
+        与get_search_tasks使用相同的提示和缓存，生成结束后的最终关键词列表也相同。
+
+        Args:
+            topic (str): 要分析的话题
+
+        Returns:
+            KeywordStream: 可迭代的关键词流，生成结束后keywords为最终关键词列表，
+                error为生成失败时的LLMError
+        """
+        prompt = SEARCH_TASKS_TEMPLATE.format(topic=topic)
+        return KeywordStream(
+            lambda on_token: self.cached_chat(prompt, template=SEARCH_TASKS_TEMPLATE, on_token=on_token),
+            parse_search_tasks)
+
+    def analyze_final_results(self, topic, analysis_results, on_token=None):
         """整合分析多个搜索结果
         
         Args:
             topic (str): 原始话题
             analysis_results (list): 各个关键词的分析结果列表
+            on_token (callable, optional): 提供时以流式方式生成报告，每收到一段文本调用on_token(文本)
             
         Returns:
             str: 整合后的分析报告
+            
+        Raises:
+            LLMError: 调用失败
         """
+        if self.token_budget:
+            total = estimate_tokens("\n\n".join(analysis_results))
+            if total > self.token_budget:
+                print(f"分析结果约 {total} tokens，分层合并后再整合...")
+                analysis_results = self._tree_reduce(
+                    list(analysis_results), PARTIAL_SYNTHESIS_TEMPLATE, self.token_budget,
+                    stop_when_fits=True, topic=topic)
+        
         combined_text = f"话题：{topic}\n\n各方面分析结果：\n" + "\n\n".join(analysis_results)
         
-        prompt = """请基于以下搜集到的分析信息，对这个话题进行深入剖析和回答。
-你的分析应该：
-1. 开门见山，直接针对话题提出的问题给出分析
-2. 从多个角度解释这种现象背后的原因
-3. 评估这种做法的利弊
-4. 对未来发展趋势和可能的改进方向提出建议
+        prompt = FINAL_ANALYSIS_TEMPLATE.format(topic=topic, text=combined_text)
+        return self.cached_chat(prompt, template=FINAL_ANALYSIS_TEMPLATE, on_token=on_token)
 
-请记住始终围绕原话题展开分析，确保回答切中要害。
+    def fold_final_analysis(self, topic, summary, new_analyses):
+        """把新完成的关键词分析并入已有的综合分析(增量整合)
 
-话题：{topic}
+        提示中只包含当前的综合分析和新的分析结果，不重新发送已经并入的内容。
 
-分析信息：
-{text}"""
-        
-        return self.async_chat(prompt.format(topic=topic, text=combined_text))
+        Args:
+            topic (str): 原始话题
+            summary (str): 当前的综合分析。如果为None则直接整合new_analyses
+            new_analyses (list): 新完成的关键词分析结果
+
+        Returns:
+            str: 更新后的综合分析
+
+        Raises:
+            LLMError: 调用失败
+        """
+        if summary is None:
+            return self.analyze_final_results(topic, new_analyses)
+        prompt = SYNTHESIS_FOLD_TEMPLATE.format(topic=topic, summary=summary, text="\n\n".join(new_analyses))
+        return self.cached_chat(prompt, template=SYNTHESIS_FOLD_TEMPLATE)
 
     def save_analysis(self, text, analysis, output_dir="results", timestamp=None, topic_path=None):
         """保存分析结果
@@ -196,11 +619,20 @@ class AIClient:
             "analysis": analysis
         }
         
-        output_path = os.path.join(output_dir, f"analysis_{timestamp}.json")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-            
-        return output_path
+        # 并发写入时同一秒内可能生成相同文件名，使用独占创建避免互相覆盖
+        suffix = 0
+        while True:
+            name = f"analysis_{timestamp}.json" if suffix == 0 else f"analysis_{timestamp}_{suffix}.json"
+            output_path = os.path.join(output_dir, name)
+            try:
+                f = open(output_path, 'x', encoding='utf-8')
+            except FileExistsError:
+                suffix += 1
+                continue
+            with f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+                tracing.count("bytes_written", f.tell())
+            return output_path
 
 def main():
     # 使用示例
@@ -213,7 +645,11 @@ def main():
         
     # 分析文本
     print("\n正在分析文本...")
-    analysis = client.analyze_text(text)
+    try:
+        analysis = client.analyze_text(text)
+    except LLMError as e:
+        print(f"分析失败: {e}")
+        return
     
     # 保存结果
     output_path = client.save_analysis(text, analysis)
@@ -0,0 +1,93 @@
+"""
+搜索后端和LLM后端的注册表
+
+后端按名称登记为"模块:对象"形式的导入路径，只有第一次用到时才导入对应模块，
+因此win32、zhipuai等依赖只在选用相应后端时才需要安装，也不会拖慢其他入口的启动。
+
+用法:
+    register_search_backend("mine", "my_package.search:MyBackend")
+    browser = BrowserSearch(backend="mine")
+"""
+
+import importlib
+import threading
+
+_SEARCH_BACKENDS = {
+    "win32": "utils.browser_search:Win32SearchBackend",
+    "http": "utils.search_backends:HttpSearchBackend",
+    "snapshot": "utils.fakes:SnapshotSearchBackend",
+}
+
+_LLM_BACKENDS = {
+    "zhipuai": "utils.ai_client:create_zhipuai_client",
+    "fake": "utils.fakes:FakeZhipuAI",
+}
+
+_resolved = {}
+_lock = threading.Lock()
+
+def _resolve(target):
+    """导入"模块:对象"路径指向的对象，结果按路径缓存"""
+    with _lock:
+        obj = _resolved.get(target)
+        if obj is None:
+            module_name, _, attr = target.partition(":")
+            obj = getattr(importlib.import_module(module_name), attr)
+            _resolved[target] = obj
+        return obj
+
+def register_search_backend(name, target):
+    """登记搜索后端
+
+    Args:
+        name (str): 后端名称
+        target (str|type): "模块:类名"导入路径或SearchBackend子类
+    """
+    _SEARCH_BACKENDS[name] = target
+
+def register_llm_backend(name, target):
+    """登记LLM后端
+
+    Args:
+        name (str): 后端名称
+        target (str|callable): "模块:对象"导入路径或工厂，factory(api_key=...)返回与ZhipuAI接口兼容的客户端
+    """
+    _LLM_BACKENDS[name] = target
+
+def search_backend_names():
+    return sorted(_SEARCH_BACKENDS)
+
+def llm_backend_names():
+    return sorted(_LLM_BACKENDS)
+
+def get_search_backend(name):
+    """按名称取得搜索后端类，首次调用时导入所在模块
+
+    Raises:
+        ValueError: 未登记的后端名称
+    """
+    target = _SEARCH_BACKENDS.get(name)
+    if target is None:
+        raise ValueError(f"Unsupported search backend: {name}")
+    return _resolve(target) if isinstance(target, str) else target
+
+def create_search_backend(name, browser):
+    """按名称创建搜索后端实例
+
+    Args:
+        name (str): 后端名称
+        browser (BrowserSearch): 使用该后端的BrowserSearch，需要操作浏览器窗口的后端会用到
+    """
+    return get_search_backend(name).from_browser(browser)
+
+def create_llm_client(name, api_key=None):
+    """按名称创建LLM客户端，首次调用时导入所在模块
+
+    Raises:
+        ValueError: 未登记的后端名称
+    """
+    target = _LLM_BACKENDS.get(name)
+    if target is None:
+        raise ValueError(f"Unsupported LLM backend: {name}")
+    factory = _resolve(target) if isinstance(target, str) else target
+    return factory(api_key=api_key)
@@ -1,19 +1,95 @@
-import win32api
-import win32con
-import win32gui
-import win32com.client
-import win32clipboard
 import json
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
+from . import tracing
+from .backends import create_search_backend
+from .search_backends import SearchBackend, split_result_blocks
+from .extractor import extract_results, format_record
+from .rank_fusion import reciprocal_rank_fusion
+from .singleflight import SingleFlight
+
+_save_lock = threading.Lock()
+
+# pywin32模块在第一次创建win32后端时才导入，其他后端和非Windows平台不需要它们
+win32api = win32con = win32gui = win32com = win32clipboard = None
+
+def _load_win32():
+    """导入pywin32模块
+
+    Returns:
+        bool: 是否导入成功
+    """
+    global win32api, win32con, win32gui, win32com, win32clipboard
+    if win32api is None:
+        try:
+            import win32api as api
+            import win32con as con
+            import win32gui as gui
+            import win32clipboard as clipboard
+            import win32com.client
+        except ImportError:
+            return False
+        win32con, win32gui, win32clipboard = con, gui, clipboard
+        # win32api最后赋值，作为已导入的标志
+        win32api = api
+    return True
+
+class Win32SearchBackend(SearchBackend):
+    name = "win32"
+
+    def __init__(self, browser):
+        """通过ShellExecute打开浏览器、SendKeys+剪贴板抓取页面的搜索后端(仅限Windows)
+        
+        浏览器窗口和剪贴板是全局资源，同一时间只能进行一次搜索。
+        
+        Args:
+            browser (BrowserSearch): 提供窗口操作方法的BrowserSearch实例
+        """
+        if not _load_win32():
+            raise RuntimeError("win32搜索后端需要在Windows上安装pywin32")
+        self.browser = browser
+
+    @classmethod
+    def from_browser(cls, browser):
+        return cls(browser)
+
+    def search(self, keyword, url_template):
+        browser = self.browser
+        with tracing.span("win32.open_browser"):
+            opened = browser.open_browser(keyword)
+        if opened:
+            print(f"\n正在搜索: {keyword}")
+            print("浏览器已打开，等待页面加载...")
+            with tracing.span("win32.wait_load", seconds=3):
+                time.sleep(3)
+            
+            hwnd = browser.find_window(keyword)
+            if hwnd:
+                print("找到浏览器窗口，获取内容中...")
+                with tracing.span("win32.wait_render", seconds=3):
+                    time.sleep(3)
+                return browser.get_page_content(hwnd)
+        return [], None
+
 class BrowserSearch:
-    def __init__(self, search_engine="bing"):
+    def __init__(self, search_engine="bing", backend="win32", search_url=None, max_concurrency=None,
+                 engines=None, engine_timeout=15.0):
         """初始化浏览器搜索
         
         Args:
             search_engine (str): 搜索引擎("bing"/"google"/"baidu")
+            backend (str|SearchBackend): 搜索后端名称，如"win32"(浏览器窗口)、"http"(无界面请求)、
+                "snapshot"(本地快照，见utils.backends)，或后端实例
+            search_url (str, optional): 自定义搜索地址模板，如指向本地快照服务器的地址。
+                多引擎模式下模板中的{engine}会替换为各引擎名称
+            max_concurrency (int, optional): 同时进行的搜索数上限。不支持并发的后端固定为1
+            engines (list, optional): 多引擎模式同时查询的搜索引擎，如["bing", "baidu"]。
+                需要支持并发的后端；如果为None则只使用search_engine
+            engine_timeout (float): 多引擎模式下等待每个引擎的最长时间(秒)，超时的引擎不参与融合
         """
         self.search_urls = {
             "bing": "https://www.bing.com/search?q={}",
@@ -21,8 +97,142 @@ class BrowserSearch:
             "baidu": "https://www.baidu.com/s?wd={}"
         }
         self.search_engine = search_engine.lower()
-        if self.search_engine not in self.search_urls:
-            raise ValueError(f"Unsupported search engine: {search_engine}")
+        self.engines = [e.lower() for e in engines] if engines else [self.search_engine]
+        for engine in [self.search_engine] + self.engines:
+            if engine not in self.search_urls:
+                raise ValueError(f"Unsupported search engine: {engine}")
+        if search_url is not None:
+            for engine in self.engines:
+                self.search_urls[engine] = search_url.replace("{engine}", engine)
+        self.engine_timeout = engine_timeout
+        
+        if isinstance(backend, SearchBackend):
+            self.backend = backend
+        else:
+            self.backend = create_search_backend(backend, self)
+        
+        if not self.backend.concurrent:
+            if self.multi_engine:
+                raise ValueError("多引擎模式需要支持并发的搜索后端")
+            # 浏览器窗口和剪贴板是独占资源，多个话题同时运行时也只能逐个搜索
+            max_concurrency = 1
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # 多个话题同时搜索同一引擎的同一关键词时只搜索一次
+        self.inflight = SingleFlight("search")
+
+    @property
+    def multi_engine(self):
+        """是否同时查询多个搜索引擎"""
+        return len(self.engines) > 1
+
+    def _fetch(self, engine, keyword):
+        """用当前后端搜索一个引擎并解析结构化结果
+
+        同一引擎的同一关键词(忽略大小写和多余空白)正在搜索时，等待该次搜索的结果而不是重复搜索；
+        搜索失败时所有等待者都收到同一个异常。
+
+        Returns:
+            tuple: (结构化结果列表, 页面文本块列表, HTML源码)
+        """
+        key = (engine, " ".join(keyword.split()).casefold())
+        records, results, html = self.inflight.do(key, lambda: self._fetch_once(engine, keyword))
+        # 合并的调用者共享同一次搜索的结果，返回副本以免互相修改
+        return list(records), list(results), html
+
+    def _fetch_once(self, engine, keyword):
+        with tracing.span("browser.search", backend=self.backend.name, engine=engine) as span:
+            if self._slots is not None:
+                with self._slots:
+                    results, html = self.backend.search(keyword, self.search_urls[engine])
+            else:
+                results, html = self.backend.search(keyword, self.search_urls[engine])
+            records = []
+            if html:
+                with tracing.span("extract", html_chars=len(html)) as extract_span:
+                    records = extract_results(html, engine)
+                    extract_span.set(records=len(records))
+            span.set(results=len(records) or len(results))
+        return records, results, html
+
+    def search(self, keyword):
+        """使用当前后端搜索关键词
+        
+        能从HTML源码中解析出结构化结果时，用"标题/链接/摘要"文本块代替按空行切分的页面文本
+        
+        Args:
+            keyword (str): 搜索关键词
+            
+        Returns:
+            tuple: (搜索结果列表, HTML源码)
+        """
+        records, results, html = self._fetch(self.search_engine, keyword)
+        if records:
+            results = [format_record(r) for r in records]
+        return results, html
+
+    def search_engines(self, keyword):
+        """同时查询所有配置的搜索引擎，按倒数排名融合为一个结果列表
+        
+        每个引擎最多等待engine_timeout秒，超时或失败的引擎不参与融合，不会拖住整个关键词。
+        不同引擎返回的同一网页(链接、标题或摘要开头相同)只保留一条。
+        
+        Args:
+            keyword (str): 搜索关键词
+            
+        Returns:
+            dict: {"results": 融合后的搜索结果列表, "pages": {引擎: HTML源码},
+                   "engines": {引擎: {"status", "latency", "results", "merged", "unique", "top"}}}
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4 * len(self.engines),
+                                                    thread_name_prefix="engine")
+        with tracing.span("browser.multi_search", engines=len(self.engines)) as span:
+            start = time.perf_counter()
+            finished = {}
+
+            def fetch(engine):
+                try:
+                    return self._fetch(engine, keyword)
+                finally:
+                    finished[engine] = time.perf_counter() - start
+
+            futures = {engine: self._executor.submit(tracing.bind(fetch), engine) for engine in self.engines}
+            wait(futures.values(), timeout=self.engine_timeout)
+
+            ranked, pages, stats = {}, {}, {}
+            for engine, future in futures.items():
+                if not future.done():
+                    # 线程无法强制结束，超时的请求在后台完成后被丢弃
+                    stats[engine] = {"status": "timeout", "latency": round(self.engine_timeout, 3), "results": 0}
+                    continue
+                latency = round(finished.get(engine, time.perf_counter() - start), 3)
+                try:
+                    records, blocks, html = future.result()
+                except Exception as e:
+                    print(f"{engine} 搜索失败: {e}")
+                    stats[engine] = {"status": "error", "latency": latency, "results": 0, "error": str(e)}
+                    continue
+                if not records:
+                    # 无法解析结构化结果时，按页面文本块的顺序参与排名
+                    records = [{"title": block, "url": "", "snippet": ""} for block in blocks]
+                ranked[engine] = records
+                if html:
+                    pages[engine] = html
+                stats[engine] = {"status": "ok" if records else "empty", "latency": latency,
+                                 "results": len(records)}
+
+            merged = reciprocal_rank_fusion(ranked)
+            top = merged[:10]
+            for engine, engine_stats in stats.items():
+                engine_stats["merged"] = sum(1 for item in merged if engine in item["ranks"])
+                engine_stats["unique"] = sum(1 for item in merged if item["engines"] == [engine])
+                engine_stats["top"] = sum(1 for item in top if engine in item["ranks"])
+            span.set(results=len(merged),
+                     timeouts=sum(1 for s in stats.values() if s["status"] == "timeout"))
+        return {"results": [format_record(item) for item in merged], "pages": pages, "engines": stats}
 
     def open_browser(self, keyword):
         """打开浏览器并搜索
@@ -60,15 +270,17 @@ class BrowserSearch:
                     any(x in window_text.lower() for x in ['edge', 'chrome', 'firefox', self.search_engine])):
                     windows.append(hwnd)
 
-        for attempt in range(max_retries):
-            windows = []
-            win32gui.EnumWindows(callback, windows)
-            
-            if windows:
-                return windows[0]
-            
-            if attempt < max_retries - 1:
-                time.sleep(retry_interval)
+        with tracing.span("win32.find_window") as span:
+            for attempt in range(max_retries):
+                span.set(attempts=attempt + 1)
+                windows = []
+                win32gui.EnumWindows(callback, windows)
+                
+                if windows:
+                    return windows[0]
+                
+                if attempt < max_retries - 1:
+                    time.sleep(retry_interval)
         
         return 0
 
@@ -99,49 +311,40 @@ class BrowserSearch:
         
         try:
             # 激活窗口
-            win32gui.SetForegroundWindow(hwnd)
-            time.sleep(2)
+            with tracing.span("win32.activate"):
+                win32gui.SetForegroundWindow(hwnd)
+                time.sleep(2)
 
             shell = win32com.client.Dispatch("WScript.Shell")
             
             # 获取搜索结果
-            shell.SendKeys("{ESC}")
-            time.sleep(0.5)
-            for _ in range(3):
-                shell.SendKeys("{TAB}")
-                time.sleep(0.3)
-            shell.SendKeys("^a")
-            time.sleep(1)
-            shell.SendKeys("^c")
-            time.sleep(1)
-
-            content = self.get_clipboard_content()
+            with tracing.span("win32.copy_text") as span:
+                shell.SendKeys("{ESC}")
+                time.sleep(0.5)
+                for _ in range(3):
+                    shell.SendKeys("{TAB}")
+                    time.sleep(0.3)
+                shell.SendKeys("^a")
+                time.sleep(1)
+                shell.SendKeys("^c")
+                time.sleep(1)
+
+                content = self.get_clipboard_content()
+                span.set(chars=len(content))
             if content:
-                # 处理搜索结果
-                current_result = []
-                for line in content.split('\n'):
-                    line = line.strip()
-                    if line:
-                        current_result.append(line)
-                    elif current_result:
-                        results.append('\n'.join(current_result))
-                        current_result = []
-                
-                if current_result:
-                    results.append('\n'.join(current_result))
-                
-                # 过滤无关内容
-                results = [r for r in results if len(r) > 30 and 
-                         not any(x in r.lower() for x in ['copyright', 'cookies', 'privacy', 'terms'])]
+                # 处理搜索结果并过滤无关内容
+                results = split_result_blocks(content)
 
             # 获取HTML源码
-            shell.SendKeys("^u")
-            time.sleep(2)
-            shell.SendKeys("^a")
-            time.sleep(0.5)
-            shell.SendKeys("^c")
-            time.sleep(0.5)
-            html_content = self.get_clipboard_content()
+            with tracing.span("win32.copy_html") as span:
+                shell.SendKeys("^u")
+                time.sleep(2)
+                shell.SendKeys("^a")
+                time.sleep(0.5)
+                shell.SendKeys("^c")
+                time.sleep(0.5)
+                html_content = self.get_clipboard_content()
+                span.set(chars=len(html_content))
             shell.SendKeys("%{F4}")
 
         except Exception as e:
@@ -149,7 +352,30 @@ class BrowserSearch:
         
         return results, html_content
 
-    def save_results(self, keyword, results, html_content=None, output_dir="results"):
+    def _reserve_paths(self, output_dir, stem, need_json, need_html):
+        """为一次保存选择不冲突的文件名
+        
+        并发搜索时同一秒内可能生成相同的时间戳，冲突时在文件名后追加序号，
+        并以独占方式预先创建文件，避免互相覆盖。
+        
+        Returns:
+            tuple: (json文件路径, html文件路径)，不需要的文件对应None
+        """
+        with _save_lock:
+            suffix = 0
+            while True:
+                name = stem if suffix == 0 else f"{stem}_{suffix}"
+                json_path = os.path.join(output_dir, f"{name}.json")
+                html_path = os.path.join(output_dir, f"{name}.html")
+                if not os.path.exists(json_path) and not os.path.exists(html_path):
+                    break
+                suffix += 1
+            for path, needed in ((json_path, need_json), (html_path, need_html)):
+                if needed:
+                    open(path, 'x').close()
+        return (json_path if need_json else None), (html_path if need_html else None)
+
+    def save_results(self, keyword, results, html_content=None, output_dir="results", engine=None, extra=None):
         """保存搜索结果
         
         Args:
@@ -157,6 +383,8 @@ class BrowserSearch:
             results (list): 搜索结果列表
             html_content (str, optional): HTML源码
             output_dir (str): 输出目录
+            engine (str, optional): 写入文件名的引擎名称，默认为search_engine；多引擎融合结果为"multi"
+            extra (dict, optional): 写入搜索记录的附加字段，如各引擎的耗时和贡献统计
             
         Returns:
             tuple: (json文件路径, html文件路径)或者(None, None)
@@ -168,29 +396,32 @@ class BrowserSearch:
             os.makedirs(output_dir)
         
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        json_path = None
-        html_path = None
+        json_path, html_path = self._reserve_paths(
+            output_dir, f"search_{engine or self.search_engine}_{timestamp}", bool(results), bool(html_content))
         
         # 保存搜索结果
         if results:
-            json_path = os.path.join(output_dir, f"search_{self.search_engine}_{timestamp}.json")
             try:
+                record = {
+                    'keyword': keyword,
+                    'timestamp': timestamp,
+                    'results': results
+                }
+                if extra:
+                    record.update(extra)
                 with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'keyword': keyword,
-                        'timestamp': timestamp,
-                        'results': results
-                    }, f, ensure_ascii=False, indent=2)
+                    json.dump(record, f, ensure_ascii=False, indent=2)
+                    tracing.count("bytes_written", f.tell())
             except Exception as e:
                 print(f"保存JSON结果失败: {e}")
                 json_path = None
         
         # 保存HTML源码
         if html_content:
-            html_path = os.path.join(output_dir, f"search_{self.search_engine}_{timestamp}.html")
             try:
                 with open(html_path, 'w', encoding='utf-8') as f:
                     f.write(html_content)
+                    tracing.count("bytes_written", f.tell())
             except Exception as e:
                 print(f"保存HTML源码失败: {e}")
                 html_path = None
@@ -0,0 +1,93 @@
+import math
+import re
+
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+def estimate_tokens(text):
+    """快速估算文本的token数，不依赖分词器
+
+    中文字符和全角标点按每字1个token计算，其余字符按每4个字符1个token计算，
+    对GLM系列模型略微偏高，适合用于预算控制。
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def _split_oversized(text, budget):
+    """把超出预算的单个文本块按字符切开"""
+    pieces = []
+    start = 0
+    step = max(1, budget // 4)
+    while start < len(text):
+        # 按最坏情况(每字符1个token)确定切分长度，再按估算结果向后扩展
+        end = min(len(text), start + budget)
+        while end < len(text) and estimate_tokens(text[start:end + step]) <= budget:
+            end += step
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+def split_into_chunks(text, budget, separator="\n"):
+    """把文本按token预算切分为若干块，尽量在分隔符处断开
+
+    Args:
+        text (str|list): 文本，或已切分好的文本块列表
+        budget (int): 每块的token上限
+        separator (str): 块内连接符
+
+    Returns:
+        list: 文本块列表，每块的估算token数不超过budget
+    """
+    blocks = text.split(separator) if isinstance(text, str) else list(text)
+    sep_tokens = estimate_tokens(separator)
+    chunks = []
+    current = []
+    current_tokens = 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if tokens > budget:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(block, budget))
+            continue
+        if current and current_tokens + sep_tokens + tokens > budget:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += tokens + (sep_tokens if len(current) > 1 else 0)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def group_by_budget(items, budget, fan_in):
+    """把文本按顺序分组，每组不超过fan_in项且总token数不超过budget
+
+    Args:
+        items (list): 文本列表
+        budget (int): 每组的token上限
+        fan_in (int): 每组最多包含的项数
+
+    Returns:
+        list: 分组列表，每组为文本列表
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for item in items:
+        tokens = estimate_tokens(item)
+        if current and (len(current) >= fan_in or current_tokens + tokens > budget):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,174 @@
+import hashlib
+import random
+import re
+import struct
+import threading
+
+from .chunking import estimate_tokens
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NORMALIZE = re.compile(r'[\s\W_]+', re.UNICODE)
+_URL = re.compile(r'https?://\S+')
+
+def normalize_text(text):
+    """去掉链接、空白和标点并转为小写，用于指纹计算"""
+    return _NORMALIZE.sub('', _URL.sub('', text)).lower()
+
+def shingles(text, n=3):
+    """生成字符n-gram集合，对中文等没有空格分词的文本同样有效
+
+    Args:
+        text (str): 规范化后的文本
+        n (int): n-gram长度
+
+    Returns:
+        set: 32位shingle哈希集合
+    """
+    if len(text) <= n:
+        return {_hash32(text)} if text else set()
+    return {_hash32(text[i:i + n]) for i in range(len(text) - n + 1)}
+
+def _hash32(s):
+    return struct.unpack('<I', hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest())[0]
+
+class MinHasher:
+    def __init__(self, num_perm=64, seed=1):
+        """MinHash签名生成器
+
+        Args:
+            num_perm (int): 置换(哈希函数)个数，即签名长度
+            seed (int): 随机种子，同一种子生成的签名可以相互比较
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+                        for _ in range(num_perm)]
+
+    def signature(self, shingle_set):
+        """计算shingle集合的MinHash签名"""
+        if not shingle_set:
+            return (_MAX_HASH,) * self.num_perm
+        p = _MERSENNE_PRIME
+        return tuple(min(((a * x + b) % p) & _MAX_HASH for x in shingle_set) for a, b in self._params)
+
+class NearDuplicateFilter:
+    def __init__(self, threshold=0.7, num_perm=64, bands=16, ngram=3, min_length=10):
+        """基于MinHash/LSH的近似重复文本块过滤器
+
+        同一话题的不同关键词往往返回大量重复的新闻摘要。过滤器记住已见过的文本块，
+        新文本块与任何已见块的估计Jaccard相似度达到threshold时被丢弃。
+        LSH把签名分为bands段，只有至少一段完全相同的块才会被比较。
+        过滤时可以指定来源(owner)，该来源保留的块先作为暂定记录，来源的处理成功后commit确认，
+        失败时release撤销，之后过滤的块不会再因为与它们重复而被丢弃。
+
+        Args:
+            threshold (float): 判定为重复的相似度阈值
+            num_perm (int): MinHash签名长度
+            bands (int): LSH分段数，num_perm必须能被其整除
+            ngram (int): 字符shingle长度
+            min_length (int): 规范化后短于此长度的块不参与去重
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm必须能被bands整除")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.min_length = min_length
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        # 来源 -> 其暂定记录的签名编号
+        self._reserved = {}
+        self._lock = threading.Lock()
+        self.blocks_seen = 0
+        self.blocks_dropped = 0
+        self.chars_saved = 0
+        self.tokens_saved = 0
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[i * rows:(i + 1) * rows] for i in range(self.bands)]
+
+    def _similarity(self, a, b):
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    def is_duplicate(self, text, owner=None):
+        """判断文本块是否与已见过的块近似重复，不重复时将其记录下来
+
+        Args:
+            text (str): 文本块
+            owner (hashable, optional): 来源，提供时记录为该来源的暂定记录
+
+        Returns:
+            bool: 是否重复
+        """
+        normalized = normalize_text(text)
+        if len(normalized) < self.min_length:
+            return False
+        signature = self.hasher.signature(shingles(normalized, self.ngram))
+        keys = self._band_keys(signature)
+        with self._lock:
+            candidates = set()
+            for bucket, key in zip(self._buckets, keys):
+                candidates.update(bucket.get(key, ()))
+            for index in candidates:
+                if self._similarity(signature, self._signatures[index]) >= self.threshold:
+                    return True
+            index = len(self._signatures)
+            self._signatures.append(signature)
+            for bucket, key in zip(self._buckets, keys):
+                bucket.setdefault(key, []).append(index)
+            if owner is not None:
+                self._reserved.setdefault(owner, []).append(index)
+        return False
+
+    def filter(self, blocks, owner=None):
+        """过滤一组文本块中与之前(包括本组前面)内容近似重复的块
+
+        Args:
+            blocks (list): 文本块列表
+            owner (hashable, optional): 来源，提供时保留的块在commit(owner)之前都是暂定记录
+
+        Returns:
+            list: 保留的文本块
+        """
+        kept = []
+        for block in blocks:
+            duplicate = self.is_duplicate(block, owner)
+            with self._lock:
+                self.blocks_seen += 1
+                if duplicate:
+                    self.blocks_dropped += 1
+                    self.chars_saved += len(block)
+                    self.tokens_saved += estimate_tokens(block)
+            if not duplicate:
+                kept.append(block)
+        return kept
+
+    def commit(self, owner):
+        """确认来源的暂定记录"""
+        with self._lock:
+            self._reserved.pop(owner, None)
+
+    def release(self, owner):
+        """撤销来源的暂定记录，之后与这些块重复的内容不再被丢弃"""
+        with self._lock:
+            indexes = self._reserved.pop(owner, [])
+            for index in indexes:
+                keys = self._band_keys(self._signatures[index])
+                for bucket, key in zip(self._buckets, keys):
+                    bucket[key].remove(index)
+                    if not bucket[key]:
+                        del bucket[key]
+
+    def stats(self):
+        """返回去重统计"""
+        with self._lock:
+            return {
+                "blocks_seen": self.blocks_seen,
+                "blocks_dropped": self.blocks_dropped,
+                "chars_saved": self.chars_saved,
+                "tokens_saved": self.tokens_saved,
+            }
@@ -0,0 +1,408 @@
+"""
+搜索结果网页的深度抓取和正文提取
+
+搜索结果页上只有两三行摘要。启用深度抓取后，取每个关键词排名靠前的若干个结果链接并行下载原网页，
+响应体边下载边写入话题目录的pages/，再用去除导航、页脚、链接列表等模板内容的正文提取器
+得到正文，切分为结果块交给AI分析。
+
+下载有三重限制: 每个主机同时进行的连接数、每个网页的字节数上限和整批网页的截止时间，
+慢速、超大或格式错误的网页只会影响自己，不会拖住整个关键词。
+
+用法:
+    python -m utils.deep_fetch https://example.com/a https://example.com/b --output-dir pages_test
+"""
+
+import argparse
+import codecs
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+
+from . import tracing
+from .extractor import SKIP_TAGS, VOID_TAGS
+from .http_client import HttpClient, HttpError
+from .result_store import atomic_write
+
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+# 出现在这些标签内的文字不属于正文
+BOILERPLATE_TAGS = SKIP_TAGS | {'nav', 'header', 'footer', 'aside', 'form', 'button', 'select',
+                                'iframe', 'menu', 'object'}
+
+# class或id命中这些词的元素视为模板内容
+BOILERPLATE_NAMES = re.compile(
+    r'(^|[-_\s])(nav|navbar|menu|footer|sidebar|breadcrumbs?|comments?|share|social|related|'
+    r'recommend|advert|ads?|banner|popup|modal|cookie|copyright|login|subscribe|toolbar|pager)($|[-_\s])',
+    re.IGNORECASE)
+
+# 这些标签的开始和结束处切分文本段落
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'dl', 'dd', 'dt', 'table',
+              'tr', 'td', 'th', 'blockquote', 'pre', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'hr',
+              'figure', 'figcaption', 'body'}
+
+HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+_URL = re.compile(r'^https?://\S+$')
+_SENTENCE_END = re.compile(r'[。！？!?；;.]')
+_MAX_DEPTH = 256
+
+class MainTextExtractor(HTMLParser):
+    def __init__(self):
+        """单遍扫描的正文提取器，不构建DOM
+
+        按块级标签把页面切成文本段落，记录每段的字数和其中链接文字的比例，
+        跳过导航、页脚等模板区域。格式错误的页面(标签不闭合、嵌套错乱)按最近的同名标签闭合处理。
+        """
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.blocks = []
+        self._stack = []
+        self._skip = 0
+        self._link = 0
+        self._in_title = False
+        self._parts = []
+        self._link_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title':
+            self._in_title = True
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        boilerplate = tag in BOILERPLATE_TAGS
+        if not boilerplate:
+            for name, value in attrs:
+                if name in ('class', 'id', 'role') and value and BOILERPLATE_NAMES.search(value):
+                    boilerplate = True
+                    break
+        if len(self._stack) >= _MAX_DEPTH:
+            # 大量不闭合的标签不再入栈，避免病态页面的栈无限增长
+            return
+        self._stack.append((tag, boilerplate))
+        if boilerplate:
+            self._skip += 1
+        if tag == 'a':
+            self._link += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                # 一并闭合其间未闭合的标签
+                for open_tag, boilerplate in self._stack[i:]:
+                    if boilerplate:
+                        self._skip -= 1
+                    if open_tag == 'a':
+                        self._link -= 1
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data):
+        if self._in_title:
+            if len(self.title) < 200:
+                self.title += data
+            return
+        if self._skip:
+            return
+        self._parts.append(data)
+        if self._link:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+        self.title = re.sub(r'\s+', ' ', self.title).strip()
+
+    def _flush(self):
+        if not self._parts:
+            return
+        text = re.sub(r'\s+', ' ', ''.join(self._parts)).strip()
+        if text:
+            self.blocks.append((text, self._link_chars / len(text)))
+        self._parts = []
+        self._link_chars = 0
+
+def select_main_text(blocks, min_chars=40, max_link_density=0.3):
+    """从文本段落中挑出正文
+
+    足够长、链接文字少的段落是正文；较短的段落只有紧挨着正文段落且不是链接列表时才保留(如小标题)。
+
+    Args:
+        blocks (list): [(段落文本, 链接文字比例)]
+        min_chars (int): 正文段落的最少字数，以句号结尾的段落要求减半
+
+    Returns:
+        list: 正文段落
+    """
+    def is_good(text, density):
+        if density > max_link_density:
+            return False
+        needed = min_chars // 2 if _SENTENCE_END.search(text[-1:]) else min_chars
+        return len(text) >= needed
+
+    good = [is_good(text, density) for text, density in blocks]
+    kept = []
+    for i, (text, density) in enumerate(blocks):
+        if good[i]:
+            kept.append(text)
+        elif (density < 0.5 and len(text) >= 4
+              and ((i > 0 and good[i - 1]) or (i + 1 < len(blocks) and good[i + 1]))):
+            kept.append(text)
+    return kept
+
+def detect_charset(headers, head):
+    """按Content-Type或页面开头的meta声明判断编码，默认utf-8"""
+    match = re.search(r'charset=([\w-]+)', (headers or {}).get('content-type', ''), re.I)
+    if not match:
+        match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', head, re.I)
+        if match:
+            return match.group(1).decode('ascii')
+        return 'utf-8'
+    return match.group(1)
+
+def extract_main_text(path, headers=None, chunk_size=64 * 1024):
+    """流式读取已保存的网页文件并提取正文
+
+    Args:
+        path (str): 网页文件
+        headers (dict, optional): 响应头，用于判断编码
+
+    Returns:
+        dict: {"title": 网页标题, "paragraphs": 正文段落列表}
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+        charset = detect_charset(headers, head)
+        try:
+            decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        parser = MainTextExtractor()
+        chunk = head
+        while chunk:
+            parser.feed(decoder.decode(chunk))
+            chunk = f.read(chunk_size)
+        parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    return {"title": parser.title, "paragraphs": select_main_text(parser.blocks)}
+
+def result_urls(results):
+    """从"标题/链接/摘要"格式的结果块中按顺序取出链接，重复的只保留第一个"""
+    urls = []
+    for block in results:
+        for line in block.splitlines()[1:3]:
+            line = line.strip()
+            if _URL.match(line):
+                if line not in urls:
+                    urls.append(line)
+                break
+    return urls
+
+def page_blocks(page, max_chars=4000, block_chars=800):
+    """把网页正文切分为结果块，每块以标题和链接开头，整页不超过max_chars字
+
+    Returns:
+        list: 文本块
+    """
+    header = f"{page.get('title') or page['url']}\n{page['url']}"
+    blocks, current, total = [], [], 0
+    for paragraph in page.get("paragraphs") or []:
+        if total >= max_chars:
+            break
+        paragraph = paragraph[:max_chars - total]
+        total += len(paragraph)
+        if current and sum(len(p) for p in current) + len(paragraph) > block_chars:
+            blocks.append(header + "\n" + "\n".join(current))
+            current = []
+        current.append(paragraph)
+    if current:
+        blocks.append(header + "\n" + "\n".join(current))
+    return blocks
+
+class PageFetcher:
+    def __init__(self, top_n=5, max_bytes=DEFAULT_MAX_BYTES, deadline=20.0, per_host=2, workers=8,
+                 timeout=10.0, max_chars=4000, client=None):
+        """并行下载搜索结果网页并提取正文
+
+        Args:
+            top_n (int): 每个关键词最多抓取的结果链接数
+            max_bytes (int): 每个网页最多下载的字节数(解压后)，超出部分丢弃
+            deadline (float): 每批网页的总截止时间(秒)，到时未完成的网页只保留已下载的部分
+            per_host (int): 每个主机同时进行的连接数上限
+            workers (int): 下载线程数
+            timeout (float): 单次连接/读取超时(秒)
+            max_chars (int): 每个网页交给AI分析的正文字数上限
+            client (HttpClient, optional): 使用的HTTP客户端，默认新建一个带连接池的客户端
+        """
+        if client is None:
+            client = HttpClient(timeout=timeout, retries=0, max_per_host=per_host)
+        self.client = client
+        self.top_n = top_n
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self.max_chars = max_chars
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.failed = 0
+        self.truncated = 0
+        self.timed_out = 0
+        self.cached = 0
+        self.bytes = 0
+
+    def _fetch_one(self, url, output_dir, deadline):
+        """下载单个网页到output_dir并提取正文，已下载过的网页直接读取保存的正文
+
+        Returns:
+            dict: {"url", "final_url", "status", "title", "paragraphs", "bytes", "truncated", "timed_out",
+                   "error", "latency"}
+        """
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        text_path = os.path.join(output_dir, f"{name}.json")
+        if os.path.exists(text_path):
+            try:
+                with open(text_path, encoding='utf-8') as f:
+                    page = json.load(f)
+                page["cached"] = True
+                return page
+            except (OSError, ValueError):
+                pass
+
+        html_path = os.path.join(output_dir, f"{name}.html")
+        page = {"url": url, "final_url": url, "status": "error", "title": "", "paragraphs": [],
+                "bytes": 0, "truncated": False, "timed_out": False, "error": None}
+        start = time.perf_counter()
+        with tracing.span("fetch_page") as span:
+            # 每次下载使用独立的临时文件，多个关键词同时抓取同一网页时互不干扰
+            fd, part_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-", suffix=".part")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    info = self.client.stream(url, f.write, max_bytes=self.max_bytes, deadline=deadline,
+                                              accept=lambda h: h.get('content-type', 'text/html')
+                                              .split(';')[0].strip().lower() in HTML_TYPES)
+                page.update(final_url=info["url"], bytes=info["bytes"], truncated=info["truncated"],
+                            timed_out=info["timed_out"])
+                page.update(extract_main_text(part_path, info["headers"]))
+                os.replace(part_path, html_path)
+                page["status"] = "ok" if page["paragraphs"] else "empty"
+            except (HttpError, OSError) as e:
+                page["error"] = str(e)
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            page["latency"] = round(time.perf_counter() - start, 3)
+            span.set(bytes=page["bytes"], status=page["status"], truncated=page["truncated"])
+        tracing.count("page_bytes", page["bytes"])
+
+        if page["status"] != "error" and not page["timed_out"]:
+            # 只保存完整处理过的网页，超时或失败的网页下次运行时重新下载
+            atomic_write(text_path, json.dumps(page, ensure_ascii=False).encode('utf-8'))
+        return page
+
+    def fetch(self, urls, output_dir):
+        """并行下载一批网页
+
+        Args:
+            urls (list): 网页地址
+            output_dir (str): 保存网页和正文的目录
+
+        Returns:
+            list: 与urls顺序一致的网页信息，见_fetch_one；截止时间内没有完成的网页status为"timeout"
+        """
+        if not urls:
+            return []
+        os.makedirs(output_dir, exist_ok=True)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fetch")
+        deadline = time.monotonic() + self.deadline
+        with tracing.span("deep_fetch", pages=len(urls)) as span:
+            futures = [self._executor.submit(tracing.bind(self._fetch_one), url, output_dir, deadline)
+                       for url in urls]
+            # 读取循环自己会在截止时间停止，这里多等一会儿让它们写完已下载的部分
+            wait(futures, timeout=self.deadline + 1.0)
+            pages = []
+            for url, future in zip(urls, futures):
+                if future.done():
+                    pages.append(future.result())
+                else:
+                    pages.append({"url": url, "final_url": url, "status": "timeout", "title": "",
+                                  "paragraphs": [], "bytes": 0, "truncated": False, "timed_out": True,
+                                  "error": "超过截止时间"})
+            with self._lock:
+                for page in pages:
+                    if page.get("cached"):
+                        self.cached += 1
+                        continue
+                    self.pages += 1
+                    self.bytes += page["bytes"]
+                    self.failed += page["status"] in ("error", "timeout")
+                    self.truncated += page["truncated"]
+                    self.timed_out += page["timed_out"]
+            span.set(ok=sum(1 for p in pages if p["status"] == "ok"))
+        return pages
+
+    def fetch_results(self, results, output_dir):
+        """下载结果块中排名前top_n的链接，返回正文切分成的结果块
+
+        Returns:
+            tuple: (正文结果块列表, 网页信息列表)
+        """
+        pages = self.fetch(result_urls(results)[:self.top_n], output_dir)
+        blocks = []
+        for page in pages:
+            blocks.extend(page_blocks(page, max_chars=self.max_chars))
+        return blocks, pages
+
+    def stats(self):
+        with self._lock:
+            return {"pages": self.pages, "cached": self.cached, "failed": self.failed,
+                    "truncated": self.truncated, "timed_out": self.timed_out, "bytes": self.bytes}
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        self.client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="下载网页并提取正文")
+    parser.add_argument("urls", nargs="+", help="网页地址")
+    parser.add_argument("--output-dir", default=os.path.join(".cache", "pages"), help="保存网页的目录")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="每个网页最多下载的字节数")
+    parser.add_argument("--deadline", type=float, default=20.0, help="总截止时间(秒)")
+    parser.add_argument("--per-host", type=int, default=2, help="每个主机同时进行的连接数")
+    args = parser.parse_args()
+
+    fetcher = PageFetcher(top_n=len(args.urls), max_bytes=args.max_bytes, deadline=args.deadline,
+                          per_host=args.per_host)
+    try:
+        for page in fetcher.fetch(args.urls, args.output_dir):
+            flags = "，已截断" if page["truncated"] else ""
+            flags += "，超时" if page["timed_out"] else ""
+            print(f"\n{page['url']}: {page['status']} {page['bytes']} 字节{flags}")
+            if page.get("error"):
+                print(f"    {page['error']}")
+            if page["title"]:
+                print(f"    标题: {page['title']}")
+            text = "\n".join(page["paragraphs"])
+            if text:
+                print(f"    正文 {len(text)} 字: {text[:200]}")
+    finally:
+        fetcher.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+results/归档的全文索引，用于复用已有的搜索结果和分析:
+- 索引每个search_*.json中的结果块、analysis_*.json中的分析和final_analysis.json中的最终报告
+- 基于SQLite FTS5；中文按相邻两字(bigram)切分，英文和数字按单词切分，写入前在Python中完成分词
+- 增量维护: 按文件的修改时间和大小判断是否需要重新索引，已删除的文件从索引中移除
+
+用法:
+    python -m utils.evidence_index update results              # 增量更新索引
+    python -m utils.evidence_index query "机械键盘 轴体" --kind result --limit 5
+    python -m utils.evidence_index stats
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from . import tracing
+from .result_store import STORE_DIRNAME, content_hash, is_versioned
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "evidence_index.sqlite")
+
+KINDS = ("result", "analysis", "final")
+
+_TOKEN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+
+def tokenize(text):
+    """把文本切分为索引词: 连续的中文按相邻两字切分，英文和数字按单词切分
+
+    Returns:
+        list: 索引词列表(保留重复，顺序与原文一致)
+    """
+    tokens = []
+    for run in _TOKEN.findall(text.lower()):
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def _match_query(tokens):
+    """把索引词组合为FTS5查询，任一词命中即可，由bm25按相关度排序"""
+    return " OR ".join(f'"{token}"' for token in tokens)
+
+def _parse_timestamp(value, default):
+    try:
+        return time.mktime(time.strptime(value, "%Y%m%d_%H%M%S"))
+    except (TypeError, ValueError):
+        return default
+
+def classify_file(name):
+    """按文件名判断归档文件的类型
+
+    Returns:
+        str: "result"、"analysis"、"final"，不需要索引的文件(包括重新处理写出的版本化文件)返回None
+    """
+    if not name.endswith(".json") or is_versioned(name):
+        return None
+    if name == "final_analysis.json":
+        return "final"
+    if name.startswith("analysis_") or name.endswith("_analysis.json"):
+        return "analysis"
+    if "search" in name:
+        return "result"
+    return None
+
+def _documents(kind, data):
+    """从归档文件中取出待索引的文本
+
+    Returns:
+        list: [(关键词, 文本)]
+    """
+    if kind == "result":
+        keyword = data.get("keyword")
+        return [(keyword, block) for block in data.get("results") or [] if block and block.strip()]
+    analysis = data.get("analysis")
+    if analysis is None:
+        return []
+    if not isinstance(analysis, str):
+        analysis = json.dumps(analysis, ensure_ascii=False, indent=2)
+    return [(data.get("keyword") or data.get("topic"), analysis)]
+
+class EvidenceIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        """results/归档的全文索引
+
+        每个线程使用独立的SQLite连接(WAL模式)，流水线中的搜索线程可以同时写入新保存的结果。
+
+        Args:
+            path (str): 索引数据库文件路径
+        """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                topic TEXT,
+                keyword TEXT,
+                created REAL NOT NULL,
+                hash TEXT NOT NULL,
+                text TEXT NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS docs_path ON docs(path)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(tokens)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remove(self, conn, path):
+        ids = [(row[0],) for row in conn.execute("SELECT id FROM docs WHERE path = ?", (path,))]
+        conn.executemany("DELETE FROM docs_fts WHERE rowid = ?", ids)
+        conn.execute("DELETE FROM docs WHERE path = ?", (path,))
+        conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def index_file(self, path, topic=None, force=False):
+        """索引单个归档文件，文件未变化时跳过
+
+        Args:
+            path (str): search_*.json、analysis_*.json或final_analysis.json的路径
+            topic (str, optional): 所属话题，默认取文件所在目录名
+            force (bool): 即使文件未变化也重新索引
+
+        Returns:
+            int: 新索引的文本数，文件未变化或无需索引时为0
+        """
+        kind = classify_file(os.path.basename(path))
+        if kind is None:
+            return 0
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"跳过无法读取的文件 {path}: {e}")
+            return 0
+        if kind == "result" and "results" not in data:
+            return 0
+
+        conn = self._conn()
+        row = conn.execute("SELECT mtime, size FROM files WHERE path = ?", (path,)).fetchone()
+        if not force and row is not None and row == (stat.st_mtime, stat.st_size):
+            return 0
+
+        if topic is None:
+            topic = os.path.basename(os.path.dirname(path))
+        created = _parse_timestamp(data.get("timestamp"), stat.st_mtime)
+        reused = data.get("reused")
+        if kind == "result" and isinstance(reused, dict):
+            # 复用的搜索结果沿用来源的生成时间，复制到新的话题目录不会让它显得更新
+            created = _parse_timestamp(reused.get("created"), created)
+        documents = _documents(kind, data)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove(conn, path)
+            for keyword, text in documents:
+                cursor = conn.execute(
+                    "INSERT INTO docs (path, kind, topic, keyword, created, hash, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, kind, topic, keyword, created, content_hash(text), text))
+                conn.execute("INSERT INTO docs_fts (rowid, tokens) VALUES (?, ?)",
+                             (cursor.lastrowid, " ".join(tokenize(text))))
+            conn.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                         (path, stat.st_mtime, stat.st_size))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        tracing.count("evidence_indexed", len(documents))
+        return len(documents)
+
+    def update(self, root="results", verbose=True):
+        """增量更新root下所有归档文件的索引，并移除已删除文件的条目
+
+        Returns:
+            dict: {"files": 重新索引的文件数, "docs": 新索引的文本数, "removed": 移除的文件数}
+        """
+        seen = set()
+        files = docs = 0
+        for directory, dirnames, filenames in os.walk(root):
+            # 紧凑存储的数据块和临时文件不参与索引
+            dirnames[:] = sorted(d for d in dirnames if d != STORE_DIRNAME)
+            topic = os.path.relpath(directory, root)
+            topic = "" if topic == "." else topic
+            for name in sorted(filenames):
+                if classify_file(name) is None:
+                    continue
+                path = os.path.join(directory, name)
+                seen.add(os.path.abspath(path))
+                added = self.index_file(path, topic=topic)
+                if added:
+                    files += 1
+                    docs += added
+
+        conn = self._conn()
+        prefix = os.path.join(os.path.abspath(root), "")
+        stale = [path for (path,) in conn.execute("SELECT path FROM files")
+                 if path.startswith(prefix) and path not in seen]
+        if stale:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for path in stale:
+                    self._remove(conn, path)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if verbose:
+            print(f"索引更新: {files} 个文件，{docs} 条文本，移除 {len(stale)} 个已删除的文件")
+        return {"files": files, "docs": docs, "removed": len(stale)}
+
+    def search(self, query, kinds=None, limit=10, max_age=None):
+        """按相关度检索索引中的文本，内容相同的文本只返回一次
+
+        Args:
+            query (str): 查询文本
+            kinds (tuple, optional): 只检索这些类型("result"/"analysis"/"final")
+            limit (int): 最多返回的条数
+            max_age (float, optional): 只返回最近max_age秒内生成的文本
+
+        Returns:
+            list: [{"kind", "path", "topic", "keyword", "created", "text", "rank", "coverage"}]，
+                按bm25相关度排序；coverage为查询词在文本中出现的比例(0~1)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        sql = ("SELECT d.kind, d.path, d.topic, d.keyword, d.created, d.hash, d.text, bm25(docs_fts) AS rank "
+               "FROM docs_fts JOIN docs d ON d.id = docs_fts.rowid WHERE docs_fts MATCH ?")
+        params = [_match_query(terms)]
+        if kinds:
+            sql += f" AND d.kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        if max_age is not None:
+            sql += " AND d.created >= ?"
+            params.append(time.time() - max_age)
+        # 多取一些，去掉重复内容后仍能凑满limit条
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit * 3)
+
+        hits = []
+        seen = set()
+        with tracing.span("evidence.search", terms=len(terms)) as span:
+            for kind, path, topic, keyword, created, digest, text, rank in self._conn().execute(sql, params):
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                found = set(tokenize(text))
+                hits.append({
+                    "kind": kind, "path": path, "topic": topic, "keyword": keyword,
+                    "created": created, "text": text, "rank": round(-rank, 4),
+                    "coverage": round(sum(1 for t in terms if t in found) / len(terms), 3),
+                })
+                if len(hits) >= limit:
+                    break
+            span.set(hits=len(hits))
+        return hits
+
+    def doc_ids(self, kind=None):
+        """返回索引中(某类型)全部文本的编号"""
+        if kind is None:
+            rows = self._conn().execute("SELECT id FROM docs ORDER BY id")
+        else:
+            rows = self._conn().execute("SELECT id FROM docs WHERE kind = ? ORDER BY id", (kind,))
+        return [row[0] for row in rows]
+
+    def get_docs(self, ids):
+        """按编号读取文本，已从索引中移除的编号被忽略
+
+        Returns:
+            dict: {编号: {"kind", "path", "topic", "keyword", "created", "hash", "text"}}
+        """
+        docs = {}
+        conn = self._conn()
+        ids = list(ids)
+        # SQLite单条语句的参数个数有上限，分批查询
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows = conn.execute(
+                "SELECT id, kind, path, topic, keyword, created, hash, text FROM docs "
+                f"WHERE id IN ({', '.join('?' * len(batch))})", batch)
+            for doc_id, kind, path, topic, keyword, created, digest, text in rows:
+                docs[doc_id] = {"kind": kind, "path": path, "topic": topic, "keyword": keyword,
+                                "created": created, "hash": digest, "text": text}
+        return docs
+
+    def stats(self):
+        """返回索引的文件数和各类型文本数"""
+        conn = self._conn()
+        files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        counts = dict(conn.execute("SELECT kind, COUNT(*) FROM docs GROUP BY kind"))
+        return {"files": files, **{kind: counts.get(kind, 0) for kind in KINDS}}
+
+class EvidenceReuse:
+    def __init__(self, index, max_age=7 * 86400, min_coverage=0.8, min_results=3, limit=10):
+        """用索引中最近的高相关搜索结果代替重新搜索
+
+        Args:
+            index (EvidenceIndex): 全文索引
+            max_age (float): 只复用最近max_age秒内的搜索结果
+            min_coverage (float): 结果块至少包含多大比例的关键词索引词
+            min_results (int): 满足条件的结果块少于该数量时仍然重新搜索
+            limit (int): 最多复用的结果块数
+        """
+        self.index = index
+        self.max_age = max_age
+        self.min_coverage = min_coverage
+        self.min_results = min_results
+        self.limit = limit
+        self.reused = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, keyword):
+        """查找可以复用的搜索结果
+
+        Returns:
+            dict: {"results": 结果块文本列表, "created": 最早的来源生成时间(%Y%m%d_%H%M%S),
+                "sources": 来源文件列表}，没有足够的可复用结果时返回None
+        """
+        hits = self.index.search(keyword, kinds=("result",), limit=self.limit, max_age=self.max_age)
+        hits = [hit for hit in hits if hit["coverage"] >= self.min_coverage]
+        with self._lock:
+            if len(hits) < self.min_results:
+                self.missed += 1
+                return None
+            self.reused += 1
+        tracing.count("evidence_reused")
+        return {
+            "results": [hit["text"] for hit in hits],
+            "created": time.strftime("%Y%m%d_%H%M%S", time.localtime(min(hit["created"] for hit in hits))),
+            "sources": sorted({hit["path"] for hit in hits}),
+        }
+
+    def record(self, path):
+        """把本次运行新搜索并保存的结果加入索引，后续关键词和话题可以直接复用(复用得到的结果不再加入)"""
+        if path:
+            self.index.index_file(path)
+
+def _print_hit(i, hit, width):
+    created = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["created"]))
+    text = " ".join(hit["text"].split())
+    print(f"\n{i}. [{hit['kind']}] 相关度 {hit['rank']:.2f}  覆盖 {hit['coverage']:.0%}  {created}")
+    print(f"   {hit['topic'] or '-'} / {hit['keyword'] or '-'}  {hit['path']}")
+    print(f"   {text[:width]}{'...' if len(text) > width else ''}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="results/归档全文索引")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="索引数据库文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="增量更新索引")
+    update.add_argument("root", nargs="?", default="results")
+    query = sub.add_parser("query", help="检索索引")
+    query.add_argument("text")
+    query.add_argument("--kind", choices=KINDS, action="append", default=None,
+                       help="只检索指定类型，可重复指定")
+    query.add_argument("--limit", type=int, default=10)
+    query.add_argument("--max-age", type=float, default=None, help="只检索最近若干天内的内容")
+    query.add_argument("--width", type=int, default=160, help="每条结果显示的字符数")
+    sub.add_parser("stats", help="显示索引规模")
+    args = parser.parse_args(argv)
+
+    index = EvidenceIndex(args.index)
+    if args.command == "update":
+        start = time.time()
+        index.update(args.root)
+        print(f"用时 {time.time() - start:.2f}s")
+    elif args.command == "query":
+        start = time.perf_counter()
+        max_age = args.max_age * 86400 if args.max_age is not None else None
+        hits = index.search(args.text, kinds=args.kind, limit=args.limit, max_age=max_age)
+        elapsed = time.perf_counter() - start
+        for i, hit in enumerate(hits, 1):
+            _print_hit(i, hit, args.width)
+        print(f"\n共 {len(hits)} 条结果，用时 {elapsed * 1000:.1f}ms")
+    elif args.command == "stats":
+        print(index.stats())
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import codecs
+import os
+import re
+from collections import deque
+from html.parser import HTMLParser
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+
+# 每个搜索引擎的结果容器、标题和摘要规则: (标签, 必须包含的class之一)
+ENGINE_RULES = {
+    "bing": {
+        "container": ("li", {"b_algo"}),
+        "title": ("h2", None),
+        "snippet": [("p", None), ("div", {"b_caption"})],
+    },
+    "google": {
+        "container": ("div", {"g", "MjjYud"}),
+        "title": ("h3", None),
+        "snippet": [("div", {"VwiC3b", "IsZvec"}), ("span", {"st", "aCOpRe"})],
+    },
+    "baidu": {
+        "container": ("div", {"c-container", "result"}),
+        "title": ("h3", None),
+        "snippet": [("div", {"c-abstract"}), ("span", {"content-right_8Zs40", "c-font-normal"})],
+    },
+}
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+
+def _classes(attrs):
+    for name, value in attrs:
+        if name == 'class' and value:
+            return set(value.split())
+    return set()
+
+def _matches(tag, classes, rule):
+    rule_tag, rule_classes = rule
+    return tag == rule_tag and (rule_classes is None or bool(classes & rule_classes))
+
+class _Element:
+    """正在解析中的元素: 通过同名标签的嵌套计数判断元素何时结束"""
+    __slots__ = ('tag', 'depth', 'parts')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.depth = 1
+        self.parts = []
+
+    def text(self):
+        return re.sub(r'\s+', ' ', ''.join(self.parts)).strip()
+
+class ResultExtractor(HTMLParser):
+    def __init__(self, engine="bing"):
+        """基于事件的搜索结果页解析器，不构建DOM
+
+        每解析完一个结果容器就生成一条记录并放入records队列，可以边喂入数据边取出结果。
+
+        Args:
+            engine (str): 搜索引擎("bing"/"google"/"baidu")
+        """
+        super().__init__(convert_charrefs=True)
+        if engine not in ENGINE_RULES:
+            raise ValueError(f"Unsupported search engine: {engine}")
+        self.rules = ENGINE_RULES[engine]
+        self.records = deque()
+        self._rank = 0
+        self._container = None
+        self._title = None
+        self._snippet = None
+        self._url = None
+        self._title_text = None
+        self._snippet_text = None
+        self._anchor = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS:
+            self._skip += 1
+            return
+        classes = _classes(attrs)
+
+        container = self._container
+        if container is None:
+            if _matches(tag, classes, self.rules["container"]):
+                self._container = _Element(tag)
+                self._url = self._anchor = self._title_text = self._snippet_text = None
+            return
+        if tag == container.tag:
+            container.depth += 1
+
+        for current in (self._title, self._snippet):
+            if current is not None and tag == current.tag:
+                current.depth += 1
+
+        if tag == 'a':
+            self._anchor = dict(attrs).get('href')
+
+        if self._title is None and self._title_text is None and _matches(tag, classes, self.rules["title"]):
+            self._title = _Element(tag)
+            # Google等引擎的标题元素包在链接内部
+            self._url = self._anchor
+        elif self._title is not None and tag == 'a' and self._url is None:
+            self._url = self._anchor
+        elif (self._snippet is None and self._snippet_text is None and self._title is None
+              and self._title_text is not None
+              and any(_matches(tag, classes, rule) for rule in self.rules["snippet"])):
+            self._snippet = _Element(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+            return
+        container = self._container
+        if container is None:
+            return
+        if tag == 'a':
+            self._anchor = None
+
+        title = self._title
+        if title is not None and tag == title.tag:
+            title.depth -= 1
+            if title.depth == 0:
+                self._title_text = title.text()
+                self._title = None
+
+        snippet = self._snippet
+        if snippet is not None and tag == snippet.tag:
+            snippet.depth -= 1
+            if snippet.depth == 0:
+                text = snippet.text()
+                self._snippet = None
+                if text:
+                    self._snippet_text = text
+
+        if tag == container.tag:
+            container.depth -= 1
+            if container.depth == 0:
+                self._finish()
+
+    def handle_data(self, data):
+        if self._skip or self._container is None:
+            return
+        if self._title is not None:
+            self._title.parts.append(data)
+        if self._snippet is not None:
+            self._snippet.parts.append(data)
+
+    def _finish(self):
+        self._container = self._title = self._snippet = None
+        if not self._title_text or not self._url:
+            return
+        self._rank += 1
+        self.records.append({
+            "title": self._title_text,
+            "url": self._url,
+            "snippet": self._snippet_text or "",
+            "rank": self._rank,
+        })
+
+def detect_engine(path, default="bing"):
+    """根据快照文件名(search_<engine>_*.html)推断搜索引擎"""
+    name = os.path.basename(path).lower()
+    for engine in ENGINE_RULES:
+        if engine in name:
+            return engine
+    return default
+
+def iter_results(source, engine=None, chunk_size=64 * 1024, encoding='utf-8'):
+    """流式解析搜索结果页，逐条产出结构化结果
+
+    Args:
+        source: HTML字符串、文件路径或文件对象(文本或二进制)
+        engine (str, optional): 搜索引擎。如果为None则根据文件名推断，默认bing
+        chunk_size (int): 每次读取的字节数
+        encoding (str): 二进制输入的编码
+
+    Yields:
+        dict: {"title", "url", "snippet", "rank"}
+    """
+    if isinstance(source, str) and source.lstrip()[:1] == '<':
+        chunks = (source[i:i + chunk_size] for i in range(0, len(source), chunk_size))
+        parser = ResultExtractor(engine or "bing")
+        yield from _feed(parser, chunks)
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        engine = engine or detect_engine(str(source))
+        with open(source, 'rb') as f:
+            yield from iter_results(f, engine, chunk_size, encoding)
+        return
+
+    parser = ResultExtractor(engine or "bing")
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def chunks():
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                tail = decoder.decode(b'', final=True)
+                if tail:
+                    yield tail
+                return
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    yield from _feed(parser, chunks())
+
+def _feed(parser, chunks):
+    for chunk in chunks:
+        parser.feed(chunk)
+        while parser.records:
+            yield parser.records.popleft()
+    parser.close()
+    while parser.records:
+        yield parser.records.popleft()
+
+def extract_results(source, engine=None):
+    """解析搜索结果页，返回全部结构化结果列表"""
+    return list(iter_results(source, engine))
+
+def format_record(record):
+    """把结构化结果格式化为提供给LLM的文本块"""
+    lines = [record["title"]]
+    if record["url"]:
+        lines.append(record["url"])
+    if record["snippet"]:
+        lines.append(record["snippet"])
+    return "\n".join(lines)
@@ -0,0 +1,461 @@
+"""
+离线替身模块，用于在没有API密钥和Windows桌面的环境下测量性能:
+- FakeZhipuAI: 与ZhipuAI接口兼容的假客户端，完成时间、失败率和限流阈值可配置
+- SnapshotServer: 用results/中保存的搜索页面快照响应搜索请求的本地HTTP服务器
+- SnapshotSearchBackend: 直接读取快照的进程内搜索后端，延迟和失败率可配置
+- PageServer: 提供正常、慢速、超大和格式错误网页的本地HTTP服务器，用于测试深度抓取
+"""
+
+import collections
+import glob
+import gzip
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from .search_backends import SearchBackend, html_to_text, split_result_blocks
+
+def _latency_sampler(latency, rng):
+    """把latency配置转换为采样函数
+
+    Args:
+        latency: 数值(固定秒数)、(最小值, 最大值)元组(均匀分布)或callable(prompt)
+        rng (random.Random): 随机数生成器
+    """
+    if callable(latency):
+        return latency
+    if isinstance(latency, (tuple, list)):
+        low, high = latency
+        return lambda prompt: rng.uniform(low, high)
+    return lambda prompt: float(latency)
+
+def default_responder(prompt):
+    """默认回复: 生成关键词的提示返回由话题派生的关键词JSON，其余提示回显提示开头"""
+    if "keywords" in prompt and "话题：" in prompt:
+        topic = prompt.rsplit("话题：", 1)[1].strip().splitlines()[0]
+        keywords = [topic] + [f"{topic} {aspect}" for aspect in ("现状", "原因", "影响")]
+        return json.dumps({"keywords": keywords}, ensure_ascii=False)
+    return f"分析结果: {prompt[:50]}"
+
+class FakeRateLimitError(Exception):
+    """模拟SDK在触发限流时抛出的异常(HTTP 429)"""
+    status_code = 429
+
+class FakeServerError(Exception):
+    """模拟SDK在服务端出错时抛出的异常(HTTP 500)"""
+    status_code = 500
+
+class _FakeAsyncCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model, messages, **kwargs):
+        owner = self._owner
+        prompt = messages[-1]["content"]
+        with owner._lock:
+            owner._check_limits()
+            task_id = f"fake-{next(owner._ids)}"
+            owner.created += 1
+            failed = owner._rng.random() < owner.failure_rate
+            owner.failures += failed
+            ready_at = time.monotonic() + owner._sample(prompt)
+            owner._tasks[task_id] = (ready_at, model, prompt, failed)
+            heapq.heappush(owner._running, ready_at)
+        return SimpleNamespace(id=task_id, task_status="PROCESSING", model=model)
+
+    def retrieve_completion_result(self, id):
+        owner = self._owner
+        with owner._lock:
+            owner.retrieves += 1
+            ready_at, model, prompt, failed = owner._tasks[id]
+        if time.monotonic() < ready_at:
+            return SimpleNamespace(id=id, task_status="PROCESSING", choices=[])
+        if failed:
+            return SimpleNamespace(id=id, task_status="FAIL", model=model, choices=[])
+        message = SimpleNamespace(role="assistant", content=owner.responder(prompt))
+        return SimpleNamespace(id=id, task_status="SUCCESS", model=model,
+                               choices=[SimpleNamespace(index=0, message=message)])
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model, messages, stream=False, **kwargs):
+        """同步接口；stream=True时返回逐段产出回复的迭代器
+
+        流式回复的第一段在总延迟的first_token_ratio处到达，其余各段均匀分布在剩余时间内。
+        """
+        owner = self._owner
+        prompt = messages[-1]["content"]
+        with owner._lock:
+            owner._check_limits()
+            owner.created += 1
+            owner.streams += stream
+            failed = owner._rng.random() < owner.failure_rate
+            owner.failures += failed
+            latency = owner._sample(prompt)
+            heapq.heappush(owner._running, time.monotonic() + latency)
+        if failed:
+            raise FakeServerError("服务内部错误")
+        content = owner.responder(prompt)
+        if not stream:
+            time.sleep(latency)
+            message = SimpleNamespace(role="assistant", content=content)
+            return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message)])
+        return self._chunks(content, latency, owner.first_token_ratio)
+
+    def _chunks(self, content, latency, first_token_ratio):
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)] or [""]
+        first = latency * first_token_ratio
+        rest = (latency - first) / max(1, len(pieces) - 1)
+        for i, piece in enumerate(pieces):
+            time.sleep(first if i == 0 else rest)
+            delta = SimpleNamespace(role="assistant", content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)])
+
+class FakeZhipuAI:
+    def __init__(self, latency=1.0, responder=None, seed=None, failure_rate=0.0, max_concurrency=None, qps=None,
+                 first_token_ratio=0.1, api_key=None):
+        """模拟智谱AI客户端的asyncCompletions和completions(含流式)接口
+
+        Args:
+            latency: 每个任务的完成时间(秒)，可以是数值、(最小值, 最大值)元组或callable(prompt)
+            responder (callable, optional): responder(prompt)返回回复内容。默认见default_responder
+            seed (int, optional): 随机种子
+            failure_rate (float): 任务以FAIL状态结束(同步接口为抛出FakeServerError)的概率
+            max_concurrency (int, optional): 模拟服务端的并发配额，进行中的任务数达到该值时
+                提交新任务会抛出FakeRateLimitError
+            qps (float, optional): 模拟服务端的QPS配额，最近1秒内的提交数达到该值时抛出FakeRateLimitError
+            first_token_ratio (float): 流式回复的第一段在总延迟的多少比例处到达
+            api_key (str, optional): 与ZhipuAI的构造参数保持一致，不使用
+        """
+        self._rng = random.Random(seed)
+        self._sample = _latency_sampler(latency, self._rng)
+        self.failure_rate = failure_rate
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tasks = {}
+        self.responder = responder or default_responder
+        self.created = 0
+        self.retrieves = 0
+        self.failures = 0
+        self.max_concurrency = max_concurrency
+        self.qps = qps
+        self.throttled = 0
+        self.peak_concurrency = 0
+        self.streams = 0
+        self.first_token_ratio = first_token_ratio
+        self._running = []
+        self._recent = collections.deque()
+        self.chat = SimpleNamespace(asyncCompletions=_FakeAsyncCompletions(self),
+                                    completions=_FakeCompletions(self))
+
+    def _check_limits(self):
+        """在锁内检查并发和QPS配额，超出时抛出FakeRateLimitError"""
+        now = time.monotonic()
+        while self._running and self._running[0] <= now:
+            heapq.heappop(self._running)
+        while self._recent and self._recent[0] <= now - 1:
+            self._recent.popleft()
+        if ((self.max_concurrency is not None and len(self._running) >= self.max_concurrency) or
+                (self.qps is not None and len(self._recent) >= self.qps)):
+            self.throttled += 1
+            raise FakeRateLimitError("请求过于频繁，请稍后重试")
+        self._recent.append(now)
+        self.peak_concurrency = max(self.peak_concurrency, len(self._running) + 1)
+
+def load_snapshots(root="results"):
+    """收集results/中的搜索页面快照
+
+    Returns:
+        tuple: (关键词到HTML文件路径的映射, 全部HTML文件路径列表)
+    """
+    by_keyword = {}
+    html_files = sorted(glob.glob(os.path.join(root, "**", "search_*.html"), recursive=True))
+    for html_path in html_files:
+        json_path = html_path[:-len(".html")] + ".json"
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, encoding='utf-8') as f:
+                    by_keyword.setdefault(json.load(f).get('keyword'), html_path)
+            except (OSError, ValueError):
+                pass
+    return by_keyword, html_files
+
+class _SnapshotHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        keyword = (query.get("q") or query.get("wd") or [""])[0]
+        if server.delay:
+            time.sleep(server.delay)
+        path = server.by_keyword.get(keyword)
+        if path is None and server.html_files:
+            path = server.html_files[zlib.crc32(keyword.encode('utf-8')) % len(server.html_files)]
+        if path is None:
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class SnapshotServer:
+    def __init__(self, root="results", host="127.0.0.1", port=0, delay=0.0):
+        """用已保存的search_*.html快照模拟搜索引擎的本地HTTP服务器
+
+        请求中的q/wd参数与快照对应json中的keyword一致时返回该快照，否则按关键词哈希
+        选择一个快照，保证同一关键词总是得到同一页面。
+
+        Args:
+            root (str): 快照所在目录
+            host (str): 监听地址
+            port (int): 监听端口，0表示自动选择
+            delay (float): 每个请求的模拟延迟(秒)
+        """
+        self.httpd = ThreadingHTTPServer((host, port), _SnapshotHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.by_keyword, self.httpd.html_files = load_snapshots(root)
+        self.httpd.delay = delay
+        self.httpd.requests = 0
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url_template(self, engine="bing"):
+        """返回可传给BrowserSearch(search_url=...)的搜索地址模板"""
+        host, port = self.httpd.server_address[:2]
+        param = "wd" if engine == "baidu" else "q"
+        return f"http://{host}:{port}/{engine}/search?{param}={{}}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class SnapshotSearchBackend(SearchBackend):
+    name = "snapshot"
+    concurrent = True
+
+    def __init__(self, root="results", latency=0.0, failure_rate=0.0, seed=None):
+        """直接读取results/中快照的搜索后端，不经过网络
+
+        关键词与快照的对应规则与SnapshotServer相同。
+
+        Args:
+            root (str): 快照所在目录
+            latency: 每次搜索的模拟耗时(秒)，取值方式同FakeZhipuAI的latency
+            failure_rate (float): 搜索失败(返回空结果)的概率
+            seed (int, optional): 随机种子
+        """
+        self.by_keyword, self.html_files = load_snapshots(root)
+        self._rng = random.Random(seed)
+        self._sample = _latency_sampler(latency, self._rng)
+        self._lock = threading.Lock()
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+
+    def search(self, keyword, url_template):
+        with self._lock:
+            self.requests += 1
+            delay = self._sample(keyword)
+            failed = self._rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if delay:
+            time.sleep(delay)
+        path = self.by_keyword.get(keyword)
+        if path is None and self.html_files:
+            path = self.html_files[zlib.crc32(keyword.encode('utf-8')) % len(self.html_files)]
+        if failed or path is None:
+            return [], None
+        with open(path, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        return split_result_blocks(html_to_text(html)), html
+
+ARTICLE_PARAGRAPHS = [
+    "这是第{n}篇测试文章的第一段正文，介绍了话题的背景和主要的研究问题，篇幅足够长以便被识别为正文内容。",
+    "第二段给出了第{n}篇文章的具体数据：样本数量为一千二百个，平均增长率为百分之十三点五，明显高于去年同期。",
+    "第三段讨论了这些数据可能的解释，以及研究者对未来趋势的判断和需要进一步验证的假设。",
+]
+
+def article_html(n, charset="utf-8"):
+    """生成一篇带导航栏、侧边栏和页脚的测试文章"""
+    paragraphs = "".join(f"<p>{p.format(n=n)}</p>" for p in ARTICLE_PARAGRAPHS)
+    return (f'<!DOCTYPE html><html><head><meta charset="{charset}"><title>测试文章 {n}</title>'
+            f'<script>var nav = "<p>不是正文</p>";</script><style>p {{ color: red }}</style></head>'
+            f'<body><nav><a href="/">首页</a> | <a href="/news">新闻</a> | <a href="/about">关于我们</a></nav>'
+            f'<div class="main-sidebar"><ul><li><a href="/article/1">热门文章一</a></li>'
+            f'<li><a href="/article/2">热门文章二</a></li></ul></div>'
+            f'<article><h1>测试文章 {n}</h1>{paragraphs}</article>'
+            f'<div class="comments">评论区: 写得很好，值得一读，感谢作者的分享，期待后续的更新和更多的数据。</div>'
+            f'<footer>版权所有 © 2024 测试网站 保留所有权利 联系我们 隐私政策 使用条款</footer></body></html>')
+
+# 未闭合的标签、交错嵌套、非法UTF-8字节、错误的实体和截断在属性中间的标签
+MALFORMED_HTML = ("<html><head><title>格式错误</title><body><div><p>没有闭合的段落，中间还有非法字节".encode("utf-8")
+                  + b"\xff\xfe"
+                  + ("以及错误的实体&bogus; &#xZZ; <b><i>交错嵌套</b></i>的标签，"
+                     "解析器也应该提取出这段文字。<div <p =broken attr=\"x>").encode("utf-8")
+                  + b"<div>" * 2000 + b'<a href="unterminated')
+
+class _PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        kind, arg = parts[0], parts[1] if len(parts) > 1 else "0"
+        if kind == "article":
+            self._send(article_html(arg).encode("utf-8"))
+        elif kind == "gzip":
+            self._send(gzip.compress(article_html(arg).encode("utf-8")), encoding="gzip")
+        elif kind == "gbk":
+            self._send(article_html(arg, "gbk").encode("gbk", errors="xmlcharrefreplace"), content_type="text/html")
+        elif kind == "redirect":
+            self.send_response(302)
+            self.send_header("Location", f"/article/{arg}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif kind == "slow":
+            # 发送响应头后每隔slow_interval秒才发送一小段
+            self._stream(lambda i: f"<p>慢速网页第{i}段内容，每隔一段时间才发送一点点数据。</p>".encode("utf-8"),
+                         chunks=1000, interval=server.slow_interval)
+        elif kind == "stall":
+            time.sleep(server.stall)
+            self._send(article_html(arg).encode("utf-8"))
+        elif kind == "huge":
+            # 不断发送正文段落，直到客户端断开连接
+            paragraph = ARTICLE_PARAGRAPHS[1].format(n=arg).encode("utf-8")
+            self._stream(lambda i: b"<p>" + paragraph + b"</p>" + b" " * 4000, chunks=server.huge_chunks)
+        elif kind == "malformed":
+            self._send(MALFORMED_HTML, close=True)
+        elif kind == "binary":
+            self._send(bytes(range(256)) * 64, content_type="application/pdf")
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type="text/html; charset=utf-8", encoding=None, close=False):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if close:
+            # 没有Content-Length，以关闭连接表示响应结束
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, make_chunk, chunks, interval=0.0):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(chunks):
+                data = (b"<html><body>" if i == 0 else b"") + make_chunk(i)
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+                if interval:
+                    time.sleep(interval)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端截断、超时后主动断开连接是测试的预期行为，不打印异常
+        pass
+
+class PageServer:
+    def __init__(self, host="127.0.0.1", port=0, slow_interval=0.5, stall=30.0, huge_chunks=100000):
+        """提供各类测试网页的本地HTTP服务器
+
+        路径:
+            /article/<n>   带导航栏、侧边栏、评论和页脚的正常文章
+            /gzip/<n>      gzip压缩的文章
+            /gbk/<n>       GBK编码、只在meta中声明编码的文章
+            /redirect/<n>  302跳转到/article/<n>
+            /slow/<n>      每隔slow_interval秒发送一小段的慢速网页
+            /stall/<n>     stall秒后才返回响应的网页
+            /huge/<n>      一直发送内容直到客户端断开的超大网页
+            /malformed/<n> 标签错乱、含非法字节和不完整标签、以关闭连接结束的网页
+            /binary/<n>    非HTML内容(application/pdf)
+
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0表示自动选择
+            slow_interval (float): 慢速网页每段的发送间隔(秒)
+            stall (float): /stall/的响应延迟(秒)
+            huge_chunks (int): 超大网页最多发送的段数(每段约4KB)
+        """
+        self.httpd = _QuietHTTPServer((host, port), _PageHandler)
+        self.httpd.slow_interval = slow_interval
+        self.httpd.stall = stall
+        self.httpd.huge_chunks = huge_chunks
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url(self, kind, n=0):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/{kind}/{n}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,385 @@
+import gzip
+import http.client
+import random
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlsplit
+
+from . import tracing
+
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/122.0 Safari/537.36")
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class HttpError(Exception):
+    """HTTP请求失败(状态码错误或重试耗尽)"""
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class HttpResponse:
+    def __init__(self, url, status, headers, body):
+        """HTTP响应
+
+        Args:
+            url (str): 最终地址(跟随重定向之后)
+            status (int): 状态码
+            headers (dict): 响应头(键为小写)
+            body (bytes): 解压后的响应体
+        """
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self):
+        """按Content-Type或页面meta声明的编码解码响应体"""
+        charset = None
+        match = re.search(r'charset=([\w-]+)', self.headers.get('content-type', ''), re.I)
+        if match:
+            charset = match.group(1)
+        else:
+            match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', self.body[:4096], re.I)
+            if match:
+                charset = match.group(1).decode('ascii')
+        try:
+            return self.body.decode(charset or 'utf-8', errors='replace')
+        except LookupError:
+            return self.body.decode('utf-8', errors='replace')
+
+class HttpClient:
+    def __init__(self, timeout=10, retries=2, backoff=0.5, pool_size=8, max_redirects=5,
+                 user_agent=DEFAULT_USER_AGENT, max_per_host=None):
+        """带连接池的HTTP客户端，可被多个线程同时使用
+
+        每个(协议, 主机, 端口)维护一组keep-alive连接，请求结束后连接归还到池中复用。
+        连接错误、超时以及429/5xx响应会按指数退避(带随机抖动)重试。
+
+        Args:
+            timeout (float): 单次连接/读取超时(秒)
+            retries (int): 失败后的重试次数
+            backoff (float): 重试退避基数(秒)
+            pool_size (int): 每个主机保留的空闲连接数上限
+            max_redirects (int): 最多跟随的重定向次数
+            user_agent (str): 请求使用的User-Agent
+            max_per_host (int, optional): 每个主机同时进行的请求数上限，默认不限制
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent
+        self.max_per_host = max_per_host
+        self._idle = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _new_conn(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, key):
+        """取出一个空闲连接，没有时新建
+
+        Returns:
+            tuple: (连接, 是否为复用的连接)
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._new_conn(key), False
+
+    @contextmanager
+    def _host_slot(self, key, timeout=None):
+        """占用主机的一个并发名额，未设置max_per_host时不限制
+
+        Raises:
+            HttpError: timeout秒内没有等到空闲名额
+        """
+        if not self.max_per_host:
+            yield
+            return
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+        if not slot.acquire(timeout=timeout):
+            raise HttpError(f"等待主机连接超时: {key[1]}")
+        try:
+            yield
+        finally:
+            slot.release()
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    def _send(self, url, headers):
+        """在池化连接上发送一次GET请求
+
+        Returns:
+            tuple: (状态码, 响应头, 原始响应体)
+        """
+        key, path = _split_url(url)
+        with self._host_slot(key):
+            return self._send_on_pool(key, path, headers)
+
+    def _send_on_pool(self, key, path, headers):
+        conn, reused = self._acquire(key)
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # 复用的keep-alive连接可能已被服务器关闭，换一个新连接重发一次
+            conn = self._new_conn(key)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        response_headers = {k.lower(): v for k, v in response.getheaders()}
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return response.status, response_headers, body
+
+    def _open(self, key, path, headers, timeout):
+        """发送请求并读取响应头，复用的连接已被服务器关闭时换新连接重发一次
+
+        Returns:
+            tuple: (连接, 响应)
+        """
+        conn, reused = self._acquire(key)
+        while True:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("GET", path, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                reused = False
+                conn = self._new_conn(key)
+            except Exception:
+                conn.close()
+                raise
+
+    def stream(self, url, write, max_bytes=None, deadline=None, headers=None, accept=None,
+               chunk_size=64 * 1024):
+        """流式GET请求，解压后的响应体边读边交给write，不在内存中保留完整响应体
+
+        跟随重定向但不重试。读满max_bytes字节时截断，到达deadline时放弃剩余内容，
+        两种情况下连接都直接关闭而不归还连接池。
+
+        Args:
+            url (str): 请求地址
+            write (callable): 接收每段响应体(bytes)
+            max_bytes (int, optional): 最多读取的字节数(解压后)
+            deadline (float, optional): 截止时刻(time.monotonic())，等待连接、响应头和读取响应体都不会超过该时刻
+            headers (dict, optional): 额外的请求头
+            accept (callable, optional): accept(响应头)返回False时不读取响应体
+            chunk_size (int): 每次读取的字节数
+
+        Returns:
+            dict: {"url": 最终地址, "status", "headers", "bytes": 读取的字节数,
+                   "truncated": 是否因max_bytes截断, "timed_out": 是否因deadline中断}
+
+        Raises:
+            HttpError: 连接失败、状态码不是2xx、响应头被accept拒绝或截止前没有收到响应头
+        """
+        request_headers = self._headers(headers)
+
+        def remaining():
+            if deadline is None:
+                return self.timeout
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise HttpError(f"超过截止时间: {url}")
+            return min(self.timeout, left)
+
+        current = url
+        for _ in range(self.max_redirects + 1):
+            key, path = _split_url(current)
+            with self._host_slot(key, timeout=None if deadline is None else remaining()):
+                try:
+                    conn, response = self._open(key, path, request_headers, remaining())
+                except (OSError, http.client.HTTPException) as e:
+                    raise HttpError(f"请求失败: {current}: {e}")
+                status = response.status
+                response_headers = {k.lower(): v for k, v in response.getheaders()}
+                if status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                    conn.close()
+                    current = urljoin(current, response_headers["location"])
+                    continue
+                if not 200 <= status < 300:
+                    conn.close()
+                    raise HttpError(f"HTTP {status}: {current}", status=status)
+                if accept is not None and not accept(response_headers):
+                    conn.close()
+                    raise HttpError(f"不支持的内容类型 {response_headers.get('content-type', '')}: {current}",
+                                    status=status)
+                return self._read_stream(key, conn, response, current, response_headers, write,
+                                         max_bytes, deadline, chunk_size)
+        raise HttpError(f"重定向次数过多: {url}")
+
+    def _read_stream(self, key, conn, response, url, headers, write, max_bytes, deadline, chunk_size):
+        encoding = headers.get("content-encoding", "").lower()
+        # MAX_WBITS | 32 自动识别gzip和zlib头
+        decoder = zlib.decompressobj(zlib.MAX_WBITS | 32) if encoding in ("gzip", "deflate") else None
+        received = 0
+        truncated = timed_out = False
+        try:
+            while True:
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        timed_out = True
+                        break
+                    if conn.sock is not None:
+                        conn.sock.settimeout(min(self.timeout, left))
+                chunk = response.read1(chunk_size)
+                if not chunk:
+                    data = decoder.flush() if decoder is not None else b""
+                elif decoder is not None:
+                    # 限制解压输出，避免高压缩比的响应体占用大量内存
+                    limit = max_bytes - received + 1 if max_bytes is not None else 0
+                    data = decoder.decompress(chunk, limit)
+                else:
+                    data = chunk
+                if max_bytes is not None and received + len(data) > max_bytes:
+                    data = data[:max_bytes - received]
+                    truncated = True
+                if data:
+                    write(data)
+                    received += len(data)
+                if truncated or not chunk:
+                    break
+        except TimeoutError:
+            if deadline is None or time.monotonic() < deadline:
+                conn.close()
+                raise HttpError(f"读取超时: {url}")
+            timed_out = True
+        except (OSError, http.client.HTTPException, zlib.error) as e:
+            conn.close()
+            raise HttpError(f"读取失败: {url}: {e}")
+
+        if truncated or timed_out or response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            conn.timeout = self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(self.timeout)
+            self._release(key, conn)
+        tracing.count("http_stream_bytes", received)
+        return {"url": url, "status": response.status, "headers": headers, "bytes": received,
+                "truncated": truncated, "timed_out": timed_out}
+
+    def _headers(self, headers=None):
+        request_headers = {
+            "User-Agent": self.user_agent,
+            "Accept": "text/html,application/xhtml+xml,*/*;q=0.8",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        if headers:
+            request_headers.update(headers)
+        return request_headers
+
+    def get(self, url, headers=None):
+        """发送GET请求，自动处理重定向、压缩和重试
+
+        Args:
+            url (str): 请求地址
+            headers (dict, optional): 额外的请求头
+
+        Returns:
+            HttpResponse: 响应对象
+
+        Raises:
+            HttpError: 状态码不是2xx或重试耗尽
+        """
+        request_headers = self._headers(headers)
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                tracing.count("http_retries")
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+            try:
+                current = url
+                for _ in range(self.max_redirects + 1):
+                    status, response_headers, body = self._send(current, request_headers)
+                    if status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                        current = urljoin(current, response_headers["location"])
+                        continue
+                    break
+                else:
+                    raise HttpError(f"重定向次数过多: {url}")
+            except (OSError, http.client.HTTPException) as e:
+                last_error = HttpError(f"请求失败: {url}: {e}")
+                continue
+
+            if status in RETRY_STATUS:
+                last_error = HttpError(f"HTTP {status}: {current}", status=status)
+                continue
+            if not 200 <= status < 300:
+                raise HttpError(f"HTTP {status}: {current}", status=status)
+            return HttpResponse(current, status, response_headers, _decode_body(body, response_headers))
+
+        raise last_error
+
+def _split_url(url):
+    """拆分出连接池的键(协议, 主机, 端口)和请求路径"""
+    parts = urlsplit(url)
+    scheme = parts.scheme or "http"
+    port = parts.port or (443 if scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return (scheme, parts.hostname, port), path
+
+def _decode_body(body, headers):
+    encoding = headers.get("content-encoding", "").lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
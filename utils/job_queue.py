@@ -0,0 +1,206 @@
+"""
+基于SQLite的持久化话题任务队列，供服务模式使用
+
+任务依次经过 queued → running → 完成状态(ok/partial/failed/no_keywords/no_results)，
+排队中的任务可以取消(cancelled)。队列保存在磁盘上，服务重启后继续处理排队中的任务；
+上次运行到一半的任务重新排队，由话题目录中的检查点接着完成。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_QUEUE_PATH = os.path.join(".cache", "jobs.sqlite")
+
+# 不再变化的任务状态
+FINISHED_STATUSES = ("ok", "partial", "failed", "no_keywords", "no_results", "cancelled")
+
+_COLUMNS = ("id", "topic", "status", "options", "created", "started", "finished", "attempts",
+            "worker", "topic_path", "final_path", "error", "result")
+
+def _summarize(values):
+    """计算平均值和分位数(最近秩法)"""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def percentile(q):
+        rank = max(1, int(round(q / 100 * len(values) + 0.5)))
+        return round(values[min(rank, len(values)) - 1], 3)
+
+    return {"count": len(values), "mean": round(sum(values) / len(values), 3),
+            "p50": percentile(50), "p90": percentile(90), "p99": percentile(99), "max": round(values[-1], 3)}
+
+class JobQueue:
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        """持久化的话题任务队列
+
+        每个线程使用独立的SQLite连接(WAL模式)；领取任务在写事务中完成，多个工作线程不会领到同一个任务。
+
+        Args:
+            path (str): 队列数据库文件路径
+        """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                status TEXT NOT NULL,
+                options TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                topic_path TEXT,
+                final_path TEXT,
+                error TEXT,
+                result TEXT)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["options"] = json.loads(job["options"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, topic, options=None):
+        """提交一个话题任务
+
+        Args:
+            topic (str): 话题
+            options (dict, optional): 任务选项，覆盖服务的默认运行参数
+
+        Returns:
+            int: 任务编号
+        """
+        cursor = self._conn().execute(
+            "INSERT INTO jobs (topic, status, options, created) VALUES (?, 'queued', ?, ?)",
+            (topic, json.dumps(options or {}, ensure_ascii=False), time.time()))
+        return cursor.lastrowid
+
+    def claim(self, worker):
+        """领取最早提交的排队任务并标记为运行中
+
+        同一话题同时只运行一个任务(它们共用话题目录)，其余同话题的任务留在队列中。
+
+        Args:
+            worker (str): 工作线程名称
+
+        Returns:
+            dict: 任务，没有可领取的任务时返回None
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND topic NOT IN "
+                "(SELECT topic FROM jobs WHERE status = 'running') ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', started = ?, attempts = attempts + 1, "
+                             "worker = ?, error = NULL WHERE id = ?", (time.time(), worker, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row[0]) if row is not None else None
+
+    def set_topic_path(self, job_id, topic_path):
+        """记录任务的话题目录，用于查询各关键词的进度"""
+        self._conn().execute("UPDATE jobs SET topic_path = ? WHERE id = ?", (topic_path, job_id))
+
+    def finish(self, job_id, status, final_path=None, error=None, result=None):
+        """记录运行中任务的完成状态"""
+        if status not in FINISHED_STATUSES:
+            raise ValueError(f"Unknown job status: {status}")
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished = ?, final_path = ?, error = ?, result = ? "
+            "WHERE id = ? AND status = 'running'",
+            (status, time.time(), final_path, error,
+             json.dumps(result, ensure_ascii=False) if result is not None else None, job_id))
+
+    def cancel(self, job_id):
+        """取消排队中的任务
+
+        Returns:
+            bool: 是否已取消(运行中和已完成的任务不能取消)
+        """
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def recover(self):
+        """把上次服务退出时仍在运行的任务重新排队
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        cursor = self._conn().execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running'")
+        return cursor.rowcount
+
+    def get(self, job_id):
+        """返回任务，不存在时返回None"""
+        row = self._conn().execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row)
+
+    def list(self, status=None, limit=50):
+        """按提交时间倒序列出任务"""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        params = []
+        if status is not None:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return [self._job(row) for row in self._conn().execute(sql, params)]
+
+    def stats(self, window=3600, recent=200):
+        """队列深度、任务延迟和吞吐量
+
+        Args:
+            window (float): 统计吞吐量的时间窗口(秒)
+            recent (int): 统计延迟时使用的最近完成任务数
+
+        Returns:
+            dict: {"by_status", "depth", "running", "latency": {"wait", "run", "total"}, "throughput"}
+        """
+        conn = self._conn()
+        by_status = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        rows = conn.execute(
+            "SELECT created, started, finished FROM jobs WHERE started IS NOT NULL AND finished IS NOT NULL "
+            "ORDER BY finished DESC LIMIT ?", (recent,)).fetchall()
+        now = time.time()
+        finished = conn.execute("SELECT COUNT(*) FROM jobs WHERE finished >= ? AND status != 'cancelled'",
+                                (now - window,)).fetchone()[0]
+        oldest = conn.execute("SELECT MIN(created) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "by_status": by_status,
+            "depth": by_status.get("queued", 0),
+            "running": by_status.get("running", 0),
+            "oldest_queued_age": round(now - oldest, 3) if oldest is not None else None,
+            "latency": {
+                "wait": _summarize([started - created for created, started, _ in rows]),
+                "run": _summarize([done - started for _, started, done in rows]),
+                "total": _summarize([done - created for created, _, done in rows]),
+            },
+            "throughput": {"window": window, "finished": finished, "jobs_per_hour": round(finished / window * 3600, 1)},
+        }
@@ -0,0 +1,149 @@
+"""
+流式生成搜索关键词时逐个产出关键词
+
+生成搜索关键词的回复是形如{"keywords": ["...", "..."]}的JSON。流式接收回复时，
+keywords数组中的每个字符串一到达结束引号就立即产出，第一个关键词的搜索可以与
+后续关键词的生成同时进行。回复结束后仍按完整回复解析出最终的关键词列表，
+保证保存的搜索任务与非流式生成时相同。
+"""
+
+import json
+import queue
+import re
+import threading
+import time
+
+from . import tracing
+
+_DONE = object()
+
+class KeywordArrayParser:
+    def __init__(self, field="keywords"):
+        """增量解析JSON回复中的字符串数组字段
+
+        只识别字符串元素；遇到其他类型的元素或格式错误时停止产出，交给完整回复的解析处理。
+
+        Args:
+            field (str): 数组字段名
+        """
+        self.buffer = ""
+        self.done = False
+        self._pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(field))
+        self._pos = None
+
+    def feed(self, text):
+        """追加一段回复文本
+
+        Returns:
+            list: 这段文本到达后新完整的数组元素
+        """
+        self.buffer += text
+        if self.done:
+            return []
+        if self._pos is None:
+            match = self._pattern.search(self.buffer)
+            if match is None:
+                return []
+            self._pos = match.end()
+
+        found = []
+        buffer, pos = self.buffer, self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char in ' \t\r\n,':
+                pos += 1
+                continue
+            if char != '"':
+                # 数组结束(])或出现非字符串元素
+                self.done = True
+                break
+            end = _string_end(buffer, pos)
+            if end is None:
+                break
+            try:
+                value = json.loads(buffer[pos:end + 1])
+            except ValueError:
+                self.done = True
+                break
+            found.append(value)
+            pos = end + 1
+        self._pos = pos
+        return found
+
+def _string_end(buffer, start):
+    """返回从start处引号开始的JSON字符串的结束引号位置，字符串还不完整时返回None"""
+    pos = start + 1
+    while pos < len(buffer):
+        char = buffer[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if char == '"':
+            return pos
+        pos += 1
+    return None
+
+class KeywordStream:
+    def __init__(self, produce, parse):
+        """在后台线程中流式生成关键词，迭代时关键词一完整就产出
+
+        迭代结束时产出完整回复中有、但流式解析没有得到的关键词，因此产出的关键词
+        至少包含最终列表中的全部关键词。
+
+        Args:
+            produce (callable): produce(on_token)生成回复，每收到一段文本调用on_token(文本)，返回完整回复
+            parse (callable): parse(完整回复)返回最终的关键词列表
+        """
+        self._produce = produce
+        self._parse = parse
+        self._queue = queue.Queue()
+        self.keywords = None
+        self.error = None
+        self.first_keyword_latency = None
+        self.latency = None
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=tracing.bind(self._run), name="keywords", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        parser = KeywordArrayParser()
+
+        def on_token(text):
+            for keyword in parser.feed(text):
+                if isinstance(keyword, str):
+                    self._queue.put(keyword)
+
+        with tracing.span("search_tasks", streamed=True) as span:
+            try:
+                self.keywords = self._parse(self._produce(on_token))
+            except Exception as e:
+                self.error = e
+                self.keywords = []
+            finally:
+                self.latency = time.perf_counter() - self._start
+                span.set(keywords=len(self.keywords or []))
+                self._queue.put(_DONE)
+
+    def __iter__(self):
+        produced = []
+        while True:
+            keyword = self._queue.get()
+            if keyword is _DONE:
+                break
+            if keyword in produced:
+                continue
+            if self.first_keyword_latency is None:
+                self.first_keyword_latency = time.perf_counter() - self._start
+            produced.append(keyword)
+            yield keyword
+        for keyword in self.keywords:
+            if keyword not in produced:
+                if self.first_keyword_latency is None:
+                    self.first_keyword_latency = time.perf_counter() - self._start
+                produced.append(keyword)
+                yield keyword
+
+    def extra(self, produced):
+        """已产出但不在最终列表中的关键词(回复格式异常时才会出现)"""
+        final = self.keywords or []
+        return [keyword for keyword in produced if keyword not in final]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+def make_cache_key(model, template, prompt):
+    """根据(模型, 提示模板, 提示文本)计算缓存键
+
+    Returns:
+        str: sha256十六进制摘要
+    """
+    payload = json.dumps([model, template or "", prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=None):
+        """基于SQLite的持久化LLM回复缓存
+
+        以内容哈希为键，超过max_bytes时按最近访问时间(LRU)淘汰。SQLite的WAL模式和
+        忙等待保证多个工作进程可以安全地同时读写同一个缓存文件。
+
+        Args:
+            path (str): 缓存数据库文件路径
+            max_bytes (int): 缓存内容总大小上限(字节)
+            ttl (float, optional): 条目有效期(秒)。如果为None则永不过期
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """读取缓存
+
+        Returns:
+            str: 缓存的回复内容，未命中或已过期时返回None
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        now = time.time()
+        if self.ttl is not None and now - created > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return value
+
+    def put(self, key, value, model=None):
+        """写入缓存，并在超出容量时淘汰最久未访问的条目"""
+        conn = self._conn()
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, size, now, now))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                rows = conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed", (key,))
+                victims = []
+                for victim, victim_size in rows:
+                    if excess <= 0:
+                        break
+                    victims.append((victim,))
+                    excess -= victim_size
+                conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        """返回缓存条目数和总大小"""
+        entries, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": total}
+
+    def clear(self):
+        """清空缓存"""
+        self._conn().execute("DELETE FROM responses")
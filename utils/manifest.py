@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+
+from .result_store import atomic_write, content_hash
+
+MANIFEST_NAME = "manifest.json"
+
+# 每个关键词依次经过的阶段
+STAGES = ("searched", "extracted", "analyzed")
+
+class TopicManifest:
+    def __init__(self, topic_path):
+        """话题目录的检查点清单
+
+        记录每个关键词各阶段(searched/extracted/analyzed)的完成状态、内容哈希和结果位置，
+        以及最终分析所用输入的哈希。重新运行同一话题时据此跳过已完成的阶段，
+        只重试失败的部分。每次更新都以原子方式写回磁盘，运行中断也不会损坏清单。
+
+        Args:
+            topic_path (str): 话题目录
+        """
+        self.topic_path = topic_path
+        self.path = os.path.join(topic_path, MANIFEST_NAME)
+        self._lock = threading.RLock()
+        self.data = {"topic": None, "keywords": [], "task_hash": None, "states": {}, "final": None}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.data.update(json.load(f))
+
+    @staticmethod
+    def exists(topic_path):
+        return os.path.exists(os.path.join(topic_path, MANIFEST_NAME))
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.data, ensure_ascii=False, indent=2).encode('utf-8')
+            atomic_write(self.path, data)
+
+    # 搜索任务
+
+    def init_topic(self, topic):
+        """新建话题目录时记录话题名称并写入清单"""
+        with self._lock:
+            if self.data["topic"] is None:
+                self.data["topic"] = topic
+                self.save()
+
+    @property
+    def keywords(self):
+        return list(self.data["keywords"])
+
+    def set_task(self, topic, keywords):
+        """记录话题的搜索关键词"""
+        with self._lock:
+            self.data["topic"] = topic
+            self.data["keywords"] = list(keywords)
+            self.data["task_hash"] = content_hash(json.dumps([topic, keywords], ensure_ascii=False))
+            self.save()
+
+    def add_keyword(self, keyword):
+        """追加一个关键词(用于逐个产出关键词的场景)"""
+        with self._lock:
+            if keyword not in self.data["keywords"]:
+                self.data["keywords"].append(keyword)
+                self.save()
+
+    # 关键词阶段
+
+    def state(self, keyword):
+        """返回关键词的阶段状态字典(副本)"""
+        with self._lock:
+            return json.loads(json.dumps(self.data["states"].get(keyword, {})))
+
+    def stage(self, keyword, stage):
+        """返回关键词某阶段的完成信息，未完成时返回None"""
+        return self.state(keyword).get(stage)
+
+    def mark(self, keyword, stage, **info):
+        """标记关键词的某个阶段已完成
+
+        Args:
+            keyword (str): 关键词
+            stage (str): 阶段名，见STAGES
+            **info: 阶段信息，如hash、ref(结果位置)
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        with self._lock:
+            state = self.data["states"].setdefault(keyword, {})
+            info["time"] = time.strftime("%Y%m%d_%H%M%S")
+            state[stage] = info
+            state.pop("error", None)
+            # 上游阶段重新执行后，下游阶段的结果不再有效
+            for later in STAGES[STAGES.index(stage) + 1:]:
+                if later in state and state[later].get("source_hash") != info.get("hash"):
+                    del state[later]
+            self.save()
+
+    def mark_failed(self, keyword, stage, error):
+        """记录关键词某阶段失败，下次运行时重试"""
+        with self._lock:
+            state = self.data["states"].setdefault(keyword, {})
+            state.pop(stage, None)
+            state["error"] = {"stage": stage, "message": str(error),
+                              "time": time.strftime("%Y%m%d_%H%M%S")}
+            self.save()
+
+    def pending(self):
+        """返回还没有完成分析的关键词"""
+        with self._lock:
+            return [k for k in self.data["keywords"]
+                    if "analyzed" not in self.data["states"].get(k, {})]
+
+    # 最终分析
+
+    def final_is_current(self, inputs_hash):
+        """最终分析的输入没有变化且结果文件仍存在时返回True"""
+        with self._lock:
+            final = self.data.get("final")
+        if not final or final.get("inputs_hash") != inputs_hash:
+            return False
+        return os.path.exists(os.path.join(self.topic_path, final["file"]))
+
+    def mark_final(self, inputs_hash, file="final_analysis.json"):
+        with self._lock:
+            self.data["final"] = {"inputs_hash": inputs_hash, "file": file,
+                                  "time": time.strftime("%Y%m%d_%H%M%S")}
+            self.save()
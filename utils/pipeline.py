@@ -0,0 +1,114 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import tracing
+
+_DONE = object()
+
+def run_pipeline(keywords, search_fn, analyze_fn, workers=4, queue_size=None, search_workers=1,
+                 prepare_fn=None):
+    """以流水线方式处理关键词：搜索阶段与分析阶段并发执行
+
+    搜索阶段默认在单个线程中按顺序执行(浏览器窗口和剪贴板是独占资源)，
+    分析阶段由多个工作线程并发执行，两阶段之间通过有界队列连接，
+    因此第N个关键词的分析可以与第N+1个关键词的搜索同时进行。
+
+    Args:
+        keywords (iterable): 关键词序列，可以是逐个产出关键词的生成器
+        search_fn (callable): search_fn(keyword)，返回搜索结果，失败返回None
+        analyze_fn (callable): analyze_fn(keyword, search_result)，返回分析结果，失败返回None
+        workers (int): 分析阶段的工作线程数
+        queue_size (int, optional): 队列容量。如果为None则等于工作线程数
+        search_workers (int): 搜索阶段的线程数，仅当搜索后端支持并发时大于1
+        prepare_fn (callable, optional): prepare_fn(keyword, search_result)，在进入分析队列前按关键词顺序串行调用，
+            返回值代替搜索结果交给analyze_fn。多个线程同时搜索时，先完成的搜索结果要等前面的关键词都进入队列
+
+    Returns:
+        list: 与关键词顺序一致的分析结果列表，失败的关键词对应None
+    """
+    workers = max(1, int(workers))
+    if queue_size is None:
+        queue_size = workers
+    pending = queue.Queue(maxsize=max(1, queue_size))
+    results = {}
+    lock = threading.Lock()
+
+    def analyze_worker():
+        while True:
+            item = pending.get()
+            try:
+                if item is _DONE:
+                    return
+                index, keyword, search_result = item
+                try:
+                    analysis = analyze_fn(keyword, search_result)
+                except Exception as e:
+                    print(f"分析关键词失败({keyword}): {e}")
+                    analysis = None
+                with lock:
+                    results[index] = analysis
+            finally:
+                pending.task_done()
+
+    threads = [threading.Thread(target=tracing.bind(analyze_worker), name=f"analyze-{i}", daemon=True)
+               for i in range(workers)]
+    for t in threads:
+        t.start()
+
+    ready = {}
+    order = {"next": 0}
+    order_lock = threading.Lock()
+
+    def enqueue(index, keyword, search_result):
+        if search_result is None:
+            with lock:
+                results[index] = None
+        if prepare_fn is None:
+            if search_result is not None:
+                pending.put((index, keyword, search_result))
+            return
+        # 按关键词顺序调用prepare_fn，结果与各搜索完成的先后无关
+        with order_lock:
+            ready[index] = (keyword, search_result)
+            while order["next"] in ready:
+                current = order["next"]
+                order["next"] += 1
+                keyword, search_result = ready.pop(current)
+                if search_result is None:
+                    continue
+                try:
+                    prepared = prepare_fn(keyword, search_result)
+                except Exception as e:
+                    print(f"处理搜索结果失败({keyword}): {e}")
+                    with lock:
+                        results[current] = None
+                    continue
+                pending.put((current, keyword, prepared))
+
+    def search_one(index, keyword):
+        try:
+            search_result = search_fn(keyword)
+        except Exception as e:
+            print(f"搜索关键词失败({keyword}): {e}")
+            search_result = None
+        enqueue(index, keyword, search_result)
+
+    count = 0
+    try:
+        if search_workers <= 1:
+            for index, keyword in enumerate(keywords):
+                count = index + 1
+                search_one(index, keyword)
+        else:
+            with ThreadPoolExecutor(max_workers=search_workers) as executor:
+                for index, keyword in enumerate(keywords):
+                    count = index + 1
+                    executor.submit(tracing.bind(search_one), index, keyword)
+    finally:
+        for _ in threads:
+            pending.put(_DONE)
+        for t in threads:
+            t.join()
+
+    return [results.get(i) for i in range(count)]
@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+class CompletionTimeout(Exception):
+    """异步任务在超时时间内没有完成"""
+
+class CompletionFailed(Exception):
+    """异步任务执行失败"""
+
+class CompletionPoller:
+    def __init__(self, client, min_interval=0.2, max_interval=2.0, backoff=1.25, timeout=80):
+        """多路复用的异步任务结果轮询器
+
+        一个后台线程同时跟踪所有进行中的asyncCompletions任务。每个任务的轮询间隔
+        从min_interval开始，每次未完成后乘以backoff，最大不超过max_interval：
+        短任务能被很快取回，长时间生成的任务也不会被频繁查询。
+
+        Args:
+            client: ZhipuAI客户端(或具有相同接口的替身)
+            min_interval (float): 首次轮询间隔(秒)
+            max_interval (float): 最大轮询间隔(秒)
+            backoff (float): 轮询间隔增长倍数
+            timeout (float): 默认任务超时时间(秒)
+        """
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.polls = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, task_id, timeout=None):
+        """登记一个已提交的任务
+
+        Args:
+            task_id (str): asyncCompletions任务ID
+            timeout (float, optional): 超时时间(秒)。如果为None则使用默认值
+
+        Returns:
+            Future: 任务完成时结果为回复内容；失败或超时时设置相应异常
+        """
+        future = Future()
+        # 供调用方记录任务ID和轮询次数
+        future.task_id = task_id
+        future.polls = 0
+        now = time.monotonic()
+        deadline = now + (self.timeout if timeout is None else timeout)
+        entry = [now + self.min_interval, next(self._seq), task_id, future, self.min_interval, deadline]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("轮询器已关闭")
+            heapq.heappush(self._heap, entry)
+            self._ensure_thread()
+            self._cond.notify()
+        return future
+
+    def pending(self):
+        """返回进行中的任务数"""
+        with self._cond:
+            return len(self._heap)
+
+    def close(self):
+        """停止后台线程，未完成的任务以异常结束"""
+        with self._cond:
+            self._closed = True
+            entries, self._heap = self._heap, []
+            self._cond.notify()
+        for entry in entries:
+            entry[3].set_exception(RuntimeError("轮询器已关闭"))
+        if self._thread is not None:
+            self._thread.join()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="completion-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+                due = []
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap))
+
+            for entry in due:
+                if not self._poll(entry):
+                    continue
+                with self._cond:
+                    heapq.heappush(self._heap, entry)
+
+    def _poll(self, entry):
+        """查询一次任务状态
+
+        Returns:
+            bool: 任务仍在进行中，需要重新排队时返回True
+        """
+        _, _, task_id, future, interval, deadline = entry
+        if future.cancelled():
+            return False
+        try:
+            self.polls += 1
+            future.polls += 1
+            response = self.client.chat.asyncCompletions.retrieve_completion_result(id=task_id)
+            status = response.task_status
+            if status == "SUCCESS":
+                future.set_result(response.choices[0].message.content)
+                return False
+            if status in ("FAIL", "FAILED"):
+                future.set_exception(CompletionFailed(f"任务执行失败: {task_id}"))
+                return False
+        except Exception as e:
+            future.set_exception(e)
+            return False
+
+        now = time.monotonic()
+        if now >= deadline:
+            future.set_exception(CompletionTimeout(f"任务超时: {task_id}"))
+            return False
+        interval = min(interval * self.backoff, self.max_interval)
+        entry[0] = min(now + interval, deadline)
+        entry[4] = interval
+        return True
@@ -0,0 +1,76 @@
+"""
+多个搜索引擎结果列表的倒数排名融合(Reciprocal Rank Fusion)
+
+每条结果的融合得分为它在各引擎列表中排名的倒数之和 Σ 1/(k + rank)，
+同一结果按规范化的链接、标题或摘要开头识别，只保留一条。
+"""
+
+import re
+from urllib.parse import urlsplit
+
+from .dedup import normalize_text
+
+RRF_K = 60
+
+_TRACKING_PARAMS = re.compile(r'(^|&)(utm_[a-z]+|from|spm|ref|form|ocid)=[^&]*', re.IGNORECASE)
+
+def normalize_url(url):
+    """去掉协议、www前缀、末尾斜杠、锚点和常见跟踪参数，用于判断链接是否相同"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = _TRACKING_PARAMS.sub('', parts.query).strip('&')
+    path = parts.path.rstrip('/')
+    return f"{host}{path}?{query}" if query else f"{host}{path}"
+
+def record_keys(record, snippet_chars=40):
+    """返回用于识别同一结果的键: 链接、标题、摘要开头(规范化后)
+
+    百度等引擎的链接是跳转地址，同一网页在不同引擎中的链接往往不同，因此还按标题和摘要识别。
+    """
+    keys = []
+    url = normalize_url(record.get("url"))
+    if url:
+        keys.append("url:" + url)
+    title = normalize_text(record.get("title") or "")
+    if len(title) >= 8:
+        keys.append("title:" + title)
+    snippet = normalize_text(record.get("snippet") or "")
+    if len(snippet) >= snippet_chars:
+        keys.append("snippet:" + snippet[:snippet_chars])
+    return keys
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """融合多个引擎的结果列表
+
+    Args:
+        ranked_lists (dict): {引擎名: 按排名排列的结果列表}，结果为{"title", "url", "snippet"}
+        k (int): 平滑常数，越大则排名靠后的结果与靠前的差距越小
+
+    Returns:
+        list: 按融合得分降序排列的结果，每条增加"score"(融合得分)、"engines"(命中的引擎)
+            和"ranks"({引擎: 排名})字段；摘要取各引擎中最长的一条
+    """
+    merged = []
+    by_key = {}
+    for engine, records in ranked_lists.items():
+        for rank, record in enumerate(records, 1):
+            keys = record_keys(record)
+            item = next((by_key[key] for key in keys if key in by_key), None)
+            if item is None:
+                item = dict(record, score=0.0, engines=[], ranks={})
+                merged.append(item)
+            elif len(record.get("snippet") or "") > len(item.get("snippet") or ""):
+                item["snippet"] = record["snippet"]
+            if engine not in item["ranks"]:
+                # 同一引擎返回的重复结果只按最靠前的排名计分
+                item["ranks"][engine] = rank
+                item["engines"].append(engine)
+                item["score"] += 1.0 / (k + rank)
+            for key in keys:
+                by_key.setdefault(key, item)
+    merged.sort(key=lambda item: item["score"], reverse=True)
+    return merged
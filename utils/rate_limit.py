@@ -0,0 +1,215 @@
+"""
+LLM调用的限流与错误分类:
+- TokenBucket: 令牌桶，限制任务提交速率(QPS)
+- AdaptiveConcurrency: AIMD自适应并发上限，成功时缓慢上探，限流/过载时成倍收缩
+- LLMRateLimiter: 组合以上两者，同一进程中的AIClient可以共用一个实例
+- LLMError及其子类: 分类后的调用错误，retryable表示是否值得重试
+"""
+
+import random
+import threading
+import time
+
+from .poller import CompletionFailed, CompletionTimeout
+
+class LLMError(Exception):
+    """LLM调用失败"""
+    retryable = False
+    # 是否说明服务端已过载，需要降低并发
+    overload = False
+
+class RateLimitError(LLMError):
+    """触发服务端的QPS或并发限制(HTTP 429)"""
+    retryable = True
+    overload = True
+
+class OverloadedError(LLMError):
+    """服务端过载或内部错误(HTTP 5xx)"""
+    retryable = True
+    overload = True
+
+class TransientError(LLMError):
+    """网络连接失败等临时错误"""
+    retryable = True
+
+class TaskFailedError(LLMError):
+    """异步任务以失败状态结束"""
+    retryable = True
+
+class LLMTimeoutError(LLMError):
+    """异步任务在超时时间内没有完成"""
+    overload = True
+
+class AuthenticationError(LLMError):
+    """API密钥无效或没有权限"""
+
+class RequestError(LLMError):
+    """请求本身有误(如提示超长、参数错误)，重试没有意义"""
+
+def classify_error(exc):
+    """把SDK或轮询器抛出的异常转换为LLMError子类
+
+    按status_code和异常类名判断，不依赖具体SDK版本的异常类。
+
+    Args:
+        exc (Exception): 原始异常
+
+    Returns:
+        LLMError: 分类后的异常，原始异常保存在__cause__中
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    if isinstance(exc, CompletionTimeout):
+        error = LLMTimeoutError(str(exc))
+    elif isinstance(exc, CompletionFailed):
+        error = TaskFailedError(str(exc))
+    else:
+        status = getattr(exc, "status_code", None)
+        name = type(exc).__name__
+        if status == 429 or "ReachLimit" in name or "RateLimit" in name:
+            error = RateLimitError(str(exc))
+        elif (status is not None and status >= 500) or "FlowExceed" in name or "Internal" in name:
+            error = OverloadedError(str(exc))
+        elif status in (401, 403) or "Authentication" in name:
+            error = AuthenticationError(str(exc))
+        elif status is not None and 400 <= status < 500:
+            error = RequestError(str(exc))
+        elif isinstance(exc, (OSError, ConnectionError)) or "Connection" in name or "Timeout" in name:
+            error = TransientError(str(exc))
+        else:
+            error = LLMError(f"{name}: {exc}")
+    error.__cause__ = exc
+    return error
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """第attempt次重试前的等待时间，指数增长并加入完全随机抖动，避免大量请求同时重试"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """令牌桶
+
+        Args:
+            rate (float): 每秒补充的令牌数
+            burst (int, optional): 桶容量，即允许的瞬时突发数。默认与rate相同(至少为1)
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取走一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    def __init__(self, initial=4, min_limit=1, max_limit=64, decrease=0.5, cooldown=0.5):
+        """AIMD自适应并发上限
+
+        每次成功使上限增加1/上限(约每一轮满并发的成功增加1)，遇到限流或过载时上限乘以decrease。
+        同一波并发请求往往一起失败，cooldown秒内只收缩一次。
+
+        Args:
+            initial (int): 初始并发上限
+            min_limit (int): 并发上限的下限
+            max_limit (int): 并发上限的上限
+            decrease (float): 收缩倍数
+            cooldown (float): 两次收缩之间的最短间隔(秒)
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """占用一个并发名额，达到上限时阻塞等待"""
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, overload=False, success=True):
+        """归还并发名额并根据调用结果调整上限
+
+        Args:
+            overload (bool): 调用因限流或过载失败
+            success (bool): 调用成功
+        """
+        with self._cond:
+            self.inflight -= 1
+            if overload:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif success:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+class LLMRateLimiter:
+    def __init__(self, qps=None, burst=None, max_concurrency=16, initial_concurrency=None, min_concurrency=1):
+        """LLM任务的提交速率与并发限制
+
+        Args:
+            qps (float, optional): 每秒最多提交的任务数。如果为None则不限制
+            burst (int, optional): 令牌桶容量
+            max_concurrency (int): 同时进行中的任务数上限
+            initial_concurrency (int, optional): 初始并发上限，默认等于max_concurrency
+            min_concurrency (int): 自适应收缩的下限
+        """
+        self.bucket = TokenBucket(qps, burst) if qps else None
+        self.concurrency = AdaptiveConcurrency(
+            initial=initial_concurrency or max_concurrency, min_limit=min_concurrency,
+            max_limit=max_concurrency)
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.throttled = 0
+        self.failures = 0
+
+    def acquire(self):
+        """提交任务前调用: 先等待令牌，再等待并发名额"""
+        if self.bucket is not None:
+            self.bucket.acquire()
+        self.concurrency.acquire()
+
+    def release(self, error=None):
+        """任务结束后调用
+
+        Args:
+            error (Exception, optional): 任务失败时的异常
+        """
+        if error is not None:
+            error = classify_error(error)
+        overload = error is not None and error.overload
+        with self._lock:
+            if error is None:
+                self.successes += 1
+            elif overload:
+                self.throttled += 1
+            else:
+                self.failures += 1
+        self.concurrency.release(overload=overload, success=error is None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "concurrency_limit": round(self.concurrency.limit, 2),
+                "inflight": self.concurrency.inflight,
+                "successes": self.successes,
+                "throttled": self.throttled,
+                "failures": self.failures,
+            }
@@ -0,0 +1,420 @@
+"""
+按话题组织的紧凑结果存储:
+- records.log: 只追加的记录日志，每条记录是一个独立的gzip成员(压缩的单行JSON)
+- records.idx: 偏移索引，每行JSON记录一条日志的序号、类型、键、偏移和长度
+- blobs/: 按内容sha256存放的gzip压缩数据(HTML源码、原始文本)，相同内容只保存一次
+
+用法:
+    python -m utils.result_store migrate results      # 把旧的results/目录转换为新格式
+    python -m utils.result_store show results/<话题>   # 查看话题记录
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from . import tracing
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+STORE_DIRNAME = "store"
+
+@contextmanager
+def _locked(fd):
+    """对文件加跨进程排他锁"""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# 进程启动时的umask，atomic_write按它设置新文件的权限
+_UMASK = _current_umask()
+
+def atomic_write(path, data):
+    """先写临时文件再重命名，保证读者不会看到写了一半的文件
+
+    mkstemp创建的临时文件权限为0600，重命名前改为与open(path, 'w')相同的权限:
+    已有文件保持原来的权限，新文件按umask。
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        tracing.count("bytes_written", len(data))
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def versioned_name(name, version):
+    """重新处理时写在原文件旁边的输出文件名: <原文件名去掉扩展名>.<版本>.json"""
+    return f"{os.path.splitext(name)[0]}.{version}.json"
+
+def is_versioned(name):
+    """是否为重新处理写出的版本化文件(原文件名中只有扩展名一个点)"""
+    return name.count(".") > 1
+
+def content_hash(data):
+    """计算内容的sha256十六进制摘要"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+class TopicStore:
+    def __init__(self, path):
+        """话题的紧凑结果存储
+
+        写入通过进程内锁和文件锁串行化，多个线程或进程可以同时向同一话题追加记录；
+        读取只依赖索引中已完整写入的条目，不需要加锁。
+
+        Args:
+            path (str): 存储目录，通常为 <话题目录>/store
+        """
+        self.path = path
+        self.log_path = os.path.join(path, "records.log")
+        self.index_path = os.path.join(path, "records.idx")
+        self.blob_dir = os.path.join(path, "blobs")
+        self.lock_path = os.path.join(path, ".lock")
+        self._lock = threading.Lock()
+        # 索引中各完整行的起始偏移(下标即记录序号)和已经扫描到的位置，只增量读取新追加的行
+        self._scan_lock = threading.Lock()
+        self._line_offsets = []
+        self._scanned = 0
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    @classmethod
+    def for_topic(cls, topic_path):
+        """打开话题目录下的存储"""
+        return cls(os.path.join(topic_path, STORE_DIRNAME))
+
+    # 内容寻址的数据块
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.gz")
+
+    def put_blob(self, content):
+        """保存数据块，相同内容只保存一次
+
+        Args:
+            content (str|bytes): 数据内容
+
+        Returns:
+            str: 内容的sha256摘要
+        """
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        digest = content_hash(data)
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, gzip.compress(data, mtime=0))
+        return digest
+
+    def get_blob(self, digest, as_text=True):
+        """读取数据块
+
+        Returns:
+            str|bytes: 数据内容，不存在时返回None
+        """
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = gzip.decompress(f.read())
+        return data.decode('utf-8') if as_text else data
+
+    # 只追加的记录日志
+
+    def append(self, kind, payload, key=None):
+        """追加一条记录
+
+        Args:
+            kind (str): 记录类型，如"search"、"analysis"、"task"、"final"
+            payload (dict): 记录内容
+            key (str, optional): 记录的键(如关键词)，便于按键查找
+
+        Returns:
+            int: 记录序号
+        """
+        line = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        member = gzip.compress(line, mtime=0)
+        with self._lock:
+            lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT)
+            try:
+                with _locked(lock_fd):
+                    with open(self.log_path, 'ab') as log:
+                        offset = log.seek(0, os.SEEK_END)
+                        log.write(member)
+                        tracing.count("bytes_written", len(member))
+                        log.flush()
+                        os.fsync(log.fileno())
+                    seq = self._next_seq()
+                    entry = {"seq": seq, "kind": kind, "key": key, "offset": offset,
+                             "length": len(member), "ts": time.time()}
+                    # 索引行在日志写入完成后追加，读者看到的索引条目总是指向完整的记录
+                    with open(self.index_path, 'ab') as index:
+                        index.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b"\n")
+            finally:
+                os.close(lock_fd)
+        return seq
+
+    def _scan_index(self):
+        """读取上次扫描之后追加到索引的内容，记录新的完整行的起始偏移
+
+        其他进程也可能在追加，因此每次都按文件大小检查，但只读取新增的部分。
+
+        Returns:
+            int: 索引文件的大小
+        """
+        with self._scan_lock:
+            try:
+                size = os.path.getsize(self.index_path)
+            except FileNotFoundError:
+                size = 0
+            if size < self._scanned:
+                # 索引被替换或截断，重新扫描
+                self._line_offsets, self._scanned = [], 0
+            if size > self._scanned:
+                with open(self.index_path, 'rb') as f:
+                    f.seek(self._scanned)
+                    data = f.read(size - self._scanned)
+                start = 0
+                while True:
+                    end = data.find(b"\n", start)
+                    if end < 0:
+                        break
+                    self._line_offsets.append(self._scanned + start)
+                    start = end + 1
+                self._scanned += start
+            return size
+
+    def _next_seq(self):
+        """下一条记录的序号，即索引的行数(末尾不完整的一行也计入)"""
+        size = self._scan_index()
+        with self._scan_lock:
+            return len(self._line_offsets) + (1 if size > self._scanned else 0)
+
+    def index(self, kind=None, key=None):
+        """读取索引条目
+
+        Returns:
+            list: 索引条目列表
+        """
+        if not os.path.exists(self.index_path):
+            return []
+        entries = []
+        with open(self.index_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                if (kind is None or entry["kind"] == kind) and (key is None or entry["key"] == key):
+                    entries.append(entry)
+        return entries
+
+    def read(self, entry):
+        """根据索引条目读取记录内容"""
+        with open(self.log_path, 'rb') as log:
+            log.seek(entry["offset"])
+            return json.loads(gzip.decompress(log.read(entry["length"])))
+
+    def get(self, seq):
+        """按序号读取记录，不存在时返回None
+
+        序号就是索引的行号，直接按记录的行偏移读取那一行的索引条目。
+        """
+        self._scan_index()
+        with self._scan_lock:
+            if not 0 <= seq < len(self._line_offsets):
+                return None
+            offset = self._line_offsets[seq]
+        with open(self.index_path, 'rb') as f:
+            f.seek(offset)
+            entry = json.loads(f.readline())
+        return self.read(entry) if entry["seq"] == seq else None
+
+    def records(self, kind=None, key=None):
+        """按写入顺序惰性读取记录
+
+        Yields:
+            dict: 记录内容
+        """
+        entries = self.index(kind, key)
+        if not entries:
+            return
+        with open(self.log_path, 'rb') as log:
+            for entry in entries:
+                log.seek(entry["offset"])
+                yield json.loads(gzip.decompress(log.read(entry["length"])))
+
+    def latest(self, kind, key=None):
+        """返回某类型(和键)的最后一条记录，不存在时返回None"""
+        entries = self.index(kind, key)
+        return self.read(entries[-1]) if entries else None
+
+    # 与旧格式对应的写入接口
+
+    def save_search(self, keyword, results, html_content=None, engine="bing", timestamp=None, extra=None):
+        """保存一次搜索的结果，HTML源码按内容哈希去重存储
+
+        Returns:
+            int: 记录序号
+        """
+        payload = {
+            "keyword": keyword,
+            "engine": engine,
+            "timestamp": timestamp or time.strftime("%Y%m%d_%H%M%S"),
+            "results": results,
+            "html": self.put_blob(html_content) if html_content else None,
+        }
+        if extra:
+            payload.update(extra)
+        return self.append("search", payload, key=keyword)
+
+    def save_analysis(self, text, analysis, keyword=None, timestamp=None):
+        """保存一次分析的结果，原始文本按内容哈希引用而不是重复保存
+
+        Returns:
+            int: 记录序号
+        """
+        payload = {
+            "keyword": keyword,
+            "timestamp": timestamp or time.strftime("%Y%m%d_%H%M%S"),
+            "text": self.put_blob(text),
+            "analysis": analysis,
+        }
+        return self.append("analysis", payload, key=keyword)
+
+def open_topics(root="results"):
+    """列出root下所有已有紧凑存储的话题
+
+    Yields:
+        tuple: (话题目录, TopicStore)
+    """
+    if not os.path.isdir(root):
+        return
+    for name in sorted(os.listdir(root)):
+        store_path = os.path.join(root, name, STORE_DIRNAME)
+        if os.path.isdir(store_path):
+            yield os.path.join(root, name), TopicStore(store_path)
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+_ENGINE = re.compile(r'search_([a-z]+)_')
+
+def migrate_topic(topic_path, verbose=True):
+    """把旧格式的话题目录转换为紧凑存储，原文件保持不变
+
+    已经迁移过的文件(按文件名记录在迁移记录中)会被跳过，可以重复执行。
+
+    Returns:
+        int: 本次迁移的文件数
+    """
+    store = TopicStore.for_topic(topic_path)
+    migrated = {r["file"] for r in store.records("migrated")}
+    count = 0
+    for name in sorted(os.listdir(topic_path)):
+        path = os.path.join(topic_path, name)
+        if (name in migrated or not name.endswith(".json") or is_versioned(name)
+                or not os.path.isfile(path)):
+            continue
+        try:
+            data = _read_json(path)
+        except (OSError, ValueError) as e:
+            print(f"跳过无法读取的文件 {path}: {e}")
+            continue
+
+        if name == "task.json":
+            store.append("task", data, key=data.get("topic"))
+        elif name == "final_analysis.json":
+            store.append("final", data, key=data.get("topic"))
+        elif name.startswith("analysis_") or name.endswith("_analysis.json"):
+            store.save_analysis(data.get("original_text", ""), data.get("analysis"),
+                                timestamp=data.get("timestamp"))
+        elif "search" in name and "results" in data:
+            html_path = path[:-len(".json")] + ".html"
+            html = None
+            if os.path.exists(html_path):
+                with open(html_path, encoding='utf-8', errors='replace') as f:
+                    html = f.read()
+            match = _ENGINE.search(name)
+            store.save_search(data.get("keyword"), data["results"], html,
+                              engine=match.group(1) if match else "bing",
+                              timestamp=data.get("timestamp"))
+        else:
+            continue
+        store.append("migrated", {"file": name})
+        count += 1
+    if verbose:
+        print(f"{topic_path}: 迁移 {count} 个文件")
+    return count
+
+def migrate_results(root="results"):
+    """迁移results/下的所有话题目录(根目录下的零散文件作为一个话题处理)
+
+    Returns:
+        int: 迁移的文件总数
+    """
+    total = migrate_topic(root)
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and name != STORE_DIRNAME:
+            total += migrate_topic(path)
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="话题结果紧凑存储工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="把旧的results/目录转换为紧凑存储")
+    migrate.add_argument("root", nargs="?", default="results")
+    show = sub.add_parser("show", help="列出话题存储中的记录")
+    show.add_argument("topic_path")
+    show.add_argument("--kind", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        start = time.time()
+        total = migrate_results(args.root)
+        print(f"\n共迁移 {total} 个文件，用时 {time.time() - start:.2f}s")
+    elif args.command == "show":
+        store = TopicStore.for_topic(args.topic_path)
+        for entry in store.index(args.kind):
+            print(f"#{entry['seq']:<4} {entry['kind']:<9} {entry['key'] or ''}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+不依赖嵌入模型的本地段落检索:
+- HashingVectorizer: 把文本的字符n-gram哈希到固定维度，用NumPy向量化计算，不需要词表
+- PassageArchive: results/归档搜索结果块的向量矩阵，保存为可内存映射的磁盘文件，增量追加
+- PassageRetriever: 按关键词和话题对结果块(可选加上归档中的结果块)做余弦相似度排序，
+  只把token预算内最相关的前k个结果块交给AI分析
+
+需要安装numpy；未安装时其余流程不受影响，只是不能启用检索阶段。
+
+用法:
+    python -m utils.retrieval update                 # 根据全文索引增量更新归档向量
+    python -m utils.retrieval query "机械键盘 轴体"   # 在归档中检索最相关的结果块
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import tracing
+from .chunking import estimate_tokens
+from .dedup import normalize_text
+from .evidence_index import DEFAULT_INDEX_PATH, EvidenceIndex
+from .result_store import atomic_write, content_hash
+
+DEFAULT_ARCHIVE_PATH = os.path.join(".cache", "passage_vectors")
+
+# 多项式滚动哈希的乘数和Fibonacci哈希的黄金比例常数
+_PRIME = 1000003
+_GOLDEN = 0x9E3779B97F4A7C15
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("段落检索需要安装numpy: pip install numpy")
+
+class HashingVectorizer:
+    def __init__(self, dim=1024, ngram=2):
+        """字符n-gram哈希向量化
+
+        文本规范化(去掉链接、空白和标点并转小写)后取字符n-gram，对中文相当于按相邻两字切分。
+        每个n-gram哈希到dim个桶之一，计数取log(1 + tf)后做L2归一化。
+
+        Args:
+            dim (int): 向量维度，必须是2的幂
+            ngram (int): n-gram长度
+        """
+        _require_numpy()
+        if dim <= 0 or dim & (dim - 1):
+            raise ValueError("dim必须是2的幂")
+        self.dim = dim
+        self.ngram = ngram
+        self._shift = np.uint64(64 - dim.bit_length() + 1)
+
+    def buckets(self, text):
+        """计算文本全部n-gram所在的桶编号"""
+        codes = np.frombuffer(normalize_text(text).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        if codes.size == 0:
+            return np.empty(0, dtype=np.intp)
+        n = min(self.ngram, codes.size)
+        count = codes.size - n + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        # uint64数组运算按2^64取模回绕，正好用作滚动哈希
+        for k in range(n):
+            hashes = hashes * np.uint64(_PRIME) + codes[k:k + count]
+        return ((hashes * np.uint64(_GOLDEN)) >> self._shift).astype(np.intp)
+
+    def counts(self, texts):
+        """返回各文本的log(1 + tf)矩阵(未归一化)"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets = self.buckets(text)
+            if buckets.size:
+                matrix[i] = np.bincount(buckets, minlength=self.dim)
+        np.log1p(matrix, out=matrix)
+        return matrix
+
+    def transform(self, texts):
+        """返回各文本L2归一化后的向量矩阵，形状为(len(texts), dim)"""
+        return _normalize_rows(self.counts(texts))
+
+    def query(self, weighted_texts, idf=None):
+        """计算查询向量
+
+        Args:
+            weighted_texts (list): [(文本, 权重)]，各文本的向量归一化后按权重相加
+            idf (ndarray, optional): 各桶的逆文档频率，提供时先按idf加权
+
+        Returns:
+            ndarray: L2归一化的查询向量
+        """
+        texts = [text for text, _ in weighted_texts if text]
+        weights = np.array([weight for text, weight in weighted_texts if text], dtype=np.float32)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not texts:
+            return vector
+        matrix = self.counts(texts)
+        if idf is not None:
+            matrix *= idf
+        vector = weights @ _normalize_rows(matrix)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+def inverse_document_frequency(df, n):
+    """平滑的逆文档频率 log((n + 1) / (df + 1)) + 1"""
+    return (np.log((n + 1) / (df + 1)) + 1).astype(np.float32)
+
+class PassageArchive:
+    def __init__(self, index, path=DEFAULT_ARCHIVE_PATH, vectorizer=None):
+        """归档搜索结果块的向量矩阵
+
+        目录中的vectors.f32(行数×维度的float32矩阵)和ids.i64(每行对应的全文索引文本编号)
+        只追加写入，通过np.memmap按需读入，不需要把整个矩阵载入内存；meta.json记录已提交的行数，
+        追加中断留下的多余字节在下次追加前截掉。文本内容保存在全文索引中，只在返回结果时读取。
+
+        Args:
+            index (EvidenceIndex): 提供归档文本的全文索引
+            path (str): 向量文件所在目录
+            vectorizer (HashingVectorizer, optional): 向量化方法，维度或n-gram与已有文件不同时重建
+        """
+        _require_numpy()
+        self.index = index
+        self.path = path
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._ids_path = os.path.join(path, "ids.i64")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        if meta.get("dim") != self.vectorizer.dim or meta.get("ngram") != self.vectorizer.ngram:
+            meta = {"dim": self.vectorizer.dim, "ngram": self.vectorizer.ngram, "rows": 0,
+                    "df": [0] * self.vectorizer.dim}
+        self.rows = meta["rows"]
+        self.df = np.array(meta["df"], dtype=np.int64)
+        self._map()
+
+    def _map(self):
+        dim = self.vectorizer.dim
+        if self.rows:
+            self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(self.rows, dim))
+            self.ids = np.memmap(self._ids_path, dtype=np.int64, mode='r', shape=(self.rows,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.ids = np.zeros(0, dtype=np.int64)
+
+    def _save_meta(self):
+        meta = {"dim": self.vectorizer.dim, "ngram": self.vectorizer.ngram, "rows": self.rows,
+                "df": self.df.tolist()}
+        atomic_write(self._meta_path, json.dumps(meta).encode('utf-8'))
+
+    def update(self, batch_size=2000, verbose=True):
+        """把全文索引中新增的搜索结果块向量化并追加到矩阵
+
+        Returns:
+            int: 新增的行数
+        """
+        with self._lock:
+            known = set(self.ids.tolist())
+            new_ids = [doc_id for doc_id in self.index.doc_ids("result") if doc_id not in known]
+            dim = self.vectorizer.dim
+            for name, width in ((self._vectors_path, dim * 4), (self._ids_path, 8)):
+                if os.path.exists(name) and os.path.getsize(name) > self.rows * width:
+                    os.truncate(name, self.rows * width)
+
+            start = time.perf_counter()
+            added = 0
+            for offset in range(0, len(new_ids), batch_size):
+                docs = self.index.get_docs(new_ids[offset:offset + batch_size])
+                batch = [doc_id for doc_id in new_ids[offset:offset + batch_size] if doc_id in docs]
+                if not batch:
+                    continue
+                matrix = self.vectorizer.transform([docs[doc_id]["text"] for doc_id in batch])
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(matrix.tobytes())
+                with open(self._ids_path, 'ab') as f:
+                    f.write(np.array(batch, dtype=np.int64).tobytes())
+                self.df += (matrix > 0).sum(axis=0)
+                self.rows += len(batch)
+                added += len(batch)
+                self._save_meta()
+            self._map()
+        if verbose:
+            print(f"归档向量更新: 新增 {added} 行，共 {self.rows} 行，用时 {time.perf_counter() - start:.2f}s")
+        return added
+
+    def search(self, query_vector, k=10, exclude=()):
+        """返回与查询向量最相似的归档结果块
+
+        Args:
+            query_vector (ndarray): 归一化的查询向量
+            k (int): 返回条数
+            exclude (set): 需要排除的文本内容哈希(如本次搜索已有的结果块)
+
+        Returns:
+            list: [(相似度, 文档信息)]，按相似度降序
+        """
+        if not self.rows or k <= 0:
+            return []
+        scores = self.vectors @ query_vector
+        # 多取一些，跳过重复内容和已从索引中移除的文本后仍能凑满k条
+        take = min(self.rows, k * 3 + len(exclude))
+        top = np.argpartition(-scores, take - 1)[:take]
+        top = top[np.argsort(-scores[top])]
+        docs = self.index.get_docs(int(self.ids[i]) for i in top)
+        hits = []
+        seen = set(exclude)
+        for i in top:
+            doc = docs.get(int(self.ids[i]))
+            if doc is None or doc["hash"] in seen:
+                continue
+            seen.add(doc["hash"])
+            hits.append((float(scores[i]), doc))
+            if len(hits) >= k:
+                break
+        return hits
+
+class PassageRetriever:
+    def __init__(self, token_budget=3000, top_k=8, min_score=0.05, topic_weight=0.5,
+                 vectorizer=None, archive=None, archive_k=4):
+        """按与关键词和话题的相关度筛选交给AI分析的结果块
+
+        结果块按log(1 + tf)向量存储，查询向量按idf加权，二者的点积即余弦相似度。
+        idf由本次的结果块和归档(如果启用)共同统计，页眉、导航等在各结果块中反复出现的片段权重较低。
+
+        Args:
+            token_budget (int): 选中结果块的估算token总数上限
+            top_k (int): 最多选中的结果块数
+            min_score (float): 相似度低于该值的结果块不选
+            topic_weight (float): 查询中话题相对于关键词的权重
+            vectorizer (HashingVectorizer, optional): 向量化方法，默认与归档一致
+            archive (PassageArchive, optional): 归档向量，提供时候选中加入归档里最相关的结果块
+            archive_k (int): 最多从归档中取的候选数
+        """
+        _require_numpy()
+        self.archive = archive
+        self.vectorizer = vectorizer or (archive.vectorizer if archive is not None else HashingVectorizer())
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.min_score = min_score
+        self.topic_weight = topic_weight
+        self.archive_k = archive_k
+        self._lock = threading.Lock()
+        self.passages_in = 0
+        self.passages_out = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def select(self, keyword, topic, passages):
+        """选出token预算内与关键词和话题最相关的结果块
+
+        Args:
+            keyword (str): 搜索关键词
+            topic (str): 话题
+            passages (list): 本次搜索的结果块
+
+        Returns:
+            tuple: (按相关度降序排列的选中结果块, 其中来自归档的数量)
+        """
+        with tracing.span("retrieve", passages=len(passages)) as span:
+            matrix = self.vectorizer.transform(passages)
+            df = (matrix > 0).sum(axis=0)
+            n = len(passages)
+            if self.archive is not None:
+                df = df + self.archive.df
+                n += self.archive.rows
+            idf = inverse_document_frequency(df, n)
+            query = self.vectorizer.query([(keyword, 1.0), (topic, self.topic_weight)], idf)
+
+            candidates = [(float(score), text, False) for score, text in zip(matrix @ query, passages)]
+            if self.archive is not None and self.archive_k:
+                exclude = {content_hash(text) for text in passages}
+                candidates.extend((score, doc["text"], True)
+                                  for score, doc in self.archive.search(query, self.archive_k, exclude))
+            candidates.sort(key=lambda c: c[0], reverse=True)
+
+            selected = self._fill(c for c in candidates if c[0] >= self.min_score)
+            if not selected:
+                # 没有达到相似度下限的结果块时，仍按排序选出预算内的本次结果，避免分析内容为空
+                selected = self._fill(c for c in candidates if not c[2])
+            texts = [text for _, text, _ in selected]
+            archived = sum(1 for c in selected if c[2])
+            tokens = sum(estimate_tokens(text) for text in texts)
+            span.set(selected=len(texts), archived=archived, tokens=tokens,
+                     top_score=round(selected[0][0], 4) if selected else None)
+
+        with self._lock:
+            self.passages_in += len(passages)
+            self.passages_out += len(texts)
+            self.tokens_in += sum(estimate_tokens(text) for text in passages)
+            self.tokens_out += tokens
+        return texts, archived
+
+    def _fill(self, candidates):
+        """按顺序选取候选，直到达到top_k或token预算；单个超出剩余预算的候选被跳过"""
+        selected = []
+        remaining = self.token_budget
+        for candidate in candidates:
+            if len(selected) >= self.top_k:
+                break
+            tokens = estimate_tokens(candidate[1])
+            if tokens > remaining:
+                continue
+            selected.append(candidate)
+            remaining -= tokens
+        return selected
+
+    def stats(self):
+        with self._lock:
+            return {"passages_in": self.passages_in, "passages_out": self.passages_out,
+                    "tokens_in": self.tokens_in, "tokens_out": self.tokens_out}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="归档搜索结果段落检索")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="全文索引文件路径")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH, help="归档向量目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="更新全文索引和归档向量")
+    update.add_argument("root", nargs="?", default="results")
+    query = sub.add_parser("query", help="在归档中检索最相关的结果块")
+    query.add_argument("text")
+    query.add_argument("--limit", type=int, default=5)
+    query.add_argument("--width", type=int, default=160, help="每条结果显示的字符数")
+    args = parser.parse_args(argv)
+
+    index = EvidenceIndex(args.index)
+    archive = PassageArchive(index, args.archive)
+    if args.command == "update":
+        index.update(args.root)
+        archive.update()
+    elif args.command == "query":
+        start = time.perf_counter()
+        idf = inverse_document_frequency(archive.df, archive.rows)
+        hits = archive.search(archive.vectorizer.query([(args.text, 1.0)], idf), k=args.limit)
+        elapsed = time.perf_counter() - start
+        for i, (score, doc) in enumerate(hits, 1):
+            text = " ".join(doc["text"].split())
+            print(f"\n{i}. 相似度 {score:.3f}  {doc['topic'] or '-'} / {doc['keyword'] or '-'}")
+            print(f"   {text[:args.width]}{'...' if len(text) > args.width else ''}")
+        print(f"\n共 {len(hits)} 条结果(归档 {archive.rows} 行)，用时 {elapsed * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+from html.parser import HTMLParser
+from urllib.parse import quote_plus
+
+from . import tracing
+
+NOISE_WORDS = ['copyright', 'cookies', 'privacy', 'terms']
+
+def split_result_blocks(content, min_length=30):
+    """把页面文本按空行切分为结果块，并过滤过短和无关的内容
+
+    Args:
+        content (str): 页面的纯文本内容
+        min_length (int): 结果块的最小长度
+
+    Returns:
+        list: 结果块列表
+    """
+    results = []
+    current_result = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if line:
+            current_result.append(line)
+        elif current_result:
+            results.append('\n'.join(current_result))
+            current_result = []
+
+    if current_result:
+        results.append('\n'.join(current_result))
+
+    return [r for r in results if len(r) > min_length and
+            not any(x in r.lower() for x in NOISE_WORDS)]
+
+class _TextExtractor(HTMLParser):
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+    BLOCK_TAGS = {'p', 'div', 'li', 'ul', 'ol', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'tr',
+                  'table', 'section', 'article', 'header', 'footer', 'nav', 'main', 'aside'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+        elif tag == 'br':
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+def html_to_text(html):
+    """把HTML转换为近似于浏览器中"全选复制"得到的纯文本"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return ''.join(parser.parts)
+
+class SearchBackend:
+    """搜索后端接口
+
+    子类实现search()，返回与BrowserSearch.get_page_content相同的(搜索结果列表, HTML源码)。
+    concurrent表示是否允许多个线程同时调用search()。
+    """
+    name = None
+    concurrent = False
+
+    @classmethod
+    def from_browser(cls, browser):
+        """由BrowserSearch按后端名称创建实例时调用，需要操作浏览器的后端可以重写"""
+        return cls()
+
+    def search(self, keyword, url_template):
+        """执行一次搜索
+
+        Args:
+            keyword (str): 搜索关键词
+            url_template (str): 搜索引擎地址模板，包含一个{}占位符
+
+        Returns:
+            tuple: (搜索结果列表, HTML源码)
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """释放后端占用的资源"""
+
+class HttpSearchBackend(SearchBackend):
+    name = "http"
+    concurrent = True
+
+    def __init__(self, timeout=10, retries=2, pool_size=8, client=None):
+        """无界面的HTTP搜索后端
+
+        通过带连接池的HttpClient直接请求搜索页面，不依赖浏览器窗口和剪贴板，
+        可以在任意平台上运行，并支持多个线程同时搜索。
+
+        Args:
+            timeout (float): 请求超时(秒)
+            retries (int): 失败重试次数
+            pool_size (int): 每个主机保留的keep-alive连接数
+            client (HttpClient, optional): 共享的HTTP客户端
+        """
+        if client is None:
+            # http.client和ssl的导入开销较大，只在使用HTTP后端时导入
+            from .http_client import HttpClient
+            client = HttpClient(timeout=timeout, retries=retries, pool_size=pool_size)
+        self.client = client
+
+    def search(self, keyword, url_template):
+        url = url_template.format(quote_plus(keyword))
+        with tracing.span("http.fetch", url=url) as span:
+            try:
+                response = self.client.get(url)
+            except Exception as e:
+                print(f"请求搜索页面失败: {e}")
+                span.set(error=str(e))
+                return [], None
+            span.set(status=response.status, bytes=len(response.body))
+            html = response.text()
+        return split_result_blocks(html_to_text(html)), html
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,69 @@
+"""
+合并同时进行中的相同请求(singleflight)
+
+多个话题并发运行时，常会在同一时刻搜索相同的关键词，或提交完全相同的分析提示。
+同一个键的请求正在进行时，后来的调用者不再发起新请求，而是等待进行中的那一次并得到同一结果。
+请求结束后立即移除该键: 结果不会被缓存，失败也只传给正在等待的调用者，之后的调用会重新发起请求。
+"""
+
+import threading
+from concurrent.futures import Future
+
+from . import tracing
+
+class SingleFlight:
+    def __init__(self, name):
+        """按键合并进行中的调用，可被多个线程同时使用
+
+        Args:
+            name (str): 名称，用于追踪计数(<name>_coalesced)
+        """
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def do(self, key, fn):
+        """执行fn()，同一键已有进行中的调用时等待其结果
+
+        Args:
+            key: 可哈希的请求键
+            fn (callable): 实际发起请求的函数
+
+        Returns:
+            fn()的返回值，合并的调用者得到同一个对象
+
+        Raises:
+            fn()抛出的异常，等待中的调用者收到同一个异常
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            tracing.count(f"{self.name}_coalesced")
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+                self.failures += 1
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "failures": self.failures,
+                    "in_flight": len(self._calls)}
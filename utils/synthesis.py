@@ -0,0 +1,155 @@
+"""
+增量整合最终分析
+
+各关键词的分析一完成就并入滚动的综合分析(只发送当前综述和新的分析，提示长度不随关键词数增长)，
+每次合并后发布一份临时的最终报告，不必等最慢的关键词完成才有可读的结果。
+设置截止时间时，到期后不再接收新的分析，已经到达的分析合并完毕即定稿。
+"""
+
+import json
+import threading
+import time
+
+from . import tracing
+from .rate_limit import LLMError
+from .result_store import atomic_write
+
+class IncrementalSynthesis:
+    def __init__(self, ai, topic, path=None, deadline=None):
+        """在后台线程中逐批合并关键词分析
+
+        合并期间到达的分析会在下一次合并中一起并入。合并失败时保留之前的综述，
+        失败的这批分析在下一次合并(新的分析到达或结束时)中重试。
+
+        Args:
+            ai (AIClient): AI客户端
+            topic (str): 话题
+            path (str, optional): 最终报告路径，每次合并后写入临时报告(provisional为true)
+            deadline (float, optional): 截止时间(从创建时起的秒数)
+        """
+        self.ai = ai
+        self.topic = topic
+        self.path = path
+        self.start = time.perf_counter()
+        self.deadline = self.start + deadline if deadline is not None else None
+        self.summary = None
+        self.keywords = []
+        self.folds = 0
+        self.failures = 0
+        self.error = None
+        self.first_latency = None
+        self.partial = False
+        self._pending = []
+        self._stalled = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=tracing.bind(self._run), name="synthesis", daemon=True)
+        self._thread.start()
+
+    def remaining(self):
+        """距截止时间的秒数，没有截止时间时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.perf_counter())
+
+    def add(self, keyword, analysis):
+        """提交一个关键词的分析
+
+        Returns:
+            bool: 是否被接收(结束或截止之后提交的分析不再并入)
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            self._pending.append((keyword, analysis))
+            self._stalled = False
+            self._cond.notify()
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._pending or self._stalled):
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                final = self._closed
+            try:
+                with tracing.span("synthesis_fold", analyses=len(batch), folded=len(self.keywords)):
+                    summary = self.ai.fold_final_analysis(self.topic, self.summary, [a for _, a in batch])
+            except LLMError as e:
+                print(f"合并分析失败，稍后重试: {e}")
+                with self._cond:
+                    self._pending[:0] = batch
+                    self._stalled = True
+                    self.failures += 1
+                    self.error = e
+                if final:
+                    return
+                continue
+            with self._cond:
+                self.summary = summary
+                self.keywords.extend(keyword for keyword, _ in batch)
+                self.folds += 1
+                self.error = None
+                if self.first_latency is None:
+                    self.first_latency = time.perf_counter() - self.start
+            print(f"\n综合分析已更新: 并入 {len(batch)} 个关键词的分析，累计 {len(self.keywords)} 个")
+            if self.path is not None:
+                try:
+                    self._write(provisional=True)
+                except OSError as e:
+                    print(f"临时报告写入失败: {e}")
+
+    def finish(self, partial=False):
+        """停止接收新的分析，等已到达的分析合并完毕后定稿
+
+        Args:
+            partial (bool): 是否因截止时间到期而提前定稿
+
+        Returns:
+            dict: 最终报告记录，没有任何分析时返回None
+
+        Raises:
+            LLMError: 已到达的分析最终仍未能合并
+        """
+        with self._cond:
+            self._closed = True
+            self._stalled = False
+            self.partial = partial
+            self._cond.notify()
+        self._thread.join()
+        with self._cond:
+            unmerged = len(self._pending)
+        if unmerged:
+            raise self.error
+        if self.summary is None:
+            return None
+        return self._write(provisional=False) if self.path is not None else self.record(provisional=False)
+
+    def close(self):
+        """停止后台线程，丢弃未合并的分析，不定稿(没有生成最终报告时使用)"""
+        with self._cond:
+            self._closed = True
+            self._pending = []
+            self._cond.notify()
+        self._thread.join()
+
+    def record(self, provisional):
+        """当前综述对应的最终报告记录"""
+        total = time.perf_counter() - self.start
+        return {
+            "topic": self.topic,
+            "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+            "analysis": self.summary,
+            "provisional": provisional,
+            "timing": {"mode": "incremental", "ttft": round(self.first_latency, 4), "total": round(total, 4)},
+            "synthesis": {"keywords": list(self.keywords), "folds": self.folds, "partial": self.partial},
+        }
+
+    def _write(self, provisional):
+        # 写完整个文件后再替换，读者总能看到一份完整的报告
+        record = self.record(provisional)
+        atomic_write(self.path, json.dumps(record, ensure_ascii=False, indent=2).encode('utf-8'))
+        return record
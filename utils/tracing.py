@@ -0,0 +1,217 @@
+"""
+轻量的阶段计时(span)工具
+
+用法:
+    tracer = Tracer("话题")
+    with tracer.activate():
+        with span("search", keyword=keyword) as s:
+            ...
+            s.set(results=len(results))
+            count("bytes_written", size)
+    tracer.save("trace.json")
+    print(tracer.format_summary())
+
+当前span保存在contextvars中。没有激活Tracer时span()返回一个什么也不做的共享对象，
+开销只有一次ContextVar读取。新线程不会自动继承上下文，需要用bind()包装线程的执行函数。
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# (Tracer, 当前Span)；没有激活的Tracer时为None
+_current = contextvars.ContextVar("tracing_current", default=None)
+
+class _NoopSpan:
+    """未启用追踪时使用的空span"""
+
+    def set(self, **attrs):
+        return self
+
+    def add(self, key, n=1):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "id", "parent", "thread", "start", "end", "attrs", "_token")
+
+    def __init__(self, tracer, name, parent, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.id = next(tracer._ids)
+        self.parent = parent
+        self.thread = threading.current_thread().name
+        self.start = None
+        self.end = None
+        self.attrs = attrs
+        self._token = None
+
+    def set(self, **attrs):
+        """设置span属性"""
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, key, n=1):
+        """累加span的计数属性"""
+        self.attrs[key] = self.attrs.get(key, 0) + n
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current.set((self.tracer, self))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self)
+        return False
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+class Tracer:
+    def __init__(self, name=None):
+        """一次运行的追踪记录
+
+        Args:
+            name (str, optional): 运行名称，如话题
+        """
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+
+    def span(self, name, **attrs):
+        """创建一个span，需要用with语句进入"""
+        state = _current.get()
+        parent = state[1] if state is not None and state[0] is self else None
+        return Span(self, name, parent.id if parent is not None else None, attrs)
+
+    @contextmanager
+    def activate(self):
+        """在当前上下文中启用该Tracer"""
+        token = _current.set((self, None))
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def add(self, key, n=1):
+        """累加运行级计数"""
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """按span名称汇总耗时
+
+        Returns:
+            list: [(名称, 次数, 总耗时, 平均耗时, 最大耗时)]，按总耗时降序排列
+        """
+        groups = {}
+        with self._lock:
+            for span in self.spans:
+                groups.setdefault(span.name, []).append(span.end - span.start)
+        rows = [(name, len(d), sum(d), sum(d) / len(d), max(d)) for name, d in groups.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "duration": round(time.perf_counter() - self._t0, 4),
+            "counters": counters,
+            "summary": [
+                {"name": name, "count": n, "total": round(total, 4), "mean": round(mean, 4), "max": round(peak, 4)}
+                for name, n, total, mean, peak in self.summary()
+            ],
+            "spans": [
+                {
+                    "id": s.id,
+                    "parent": s.parent,
+                    "name": s.name,
+                    "thread": s.thread,
+                    "start": round(s.start - self._t0, 4),
+                    "duration": round(s.end - s.start, 4),
+                    "attrs": s.attrs,
+                }
+                for s in spans
+            ],
+        }
+
+    def save(self, path):
+        """把追踪记录写为JSON文件"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+    def format_summary(self):
+        """生成各阶段耗时汇总表"""
+        # 表头的中文字符显示宽度为2，按显示宽度与数据列对齐
+        lines = [f"{'阶段':<24}{'次数':>6}{'总耗时':>9}{'平均':>7}{'最大':>7}"]
+        for name, n, total, mean, peak in self.summary():
+            lines.append(f"{name:<26}{n:>8}{total:>11.2f}s{mean:>8.2f}s{peak:>8.2f}s")
+        if self.counters:
+            lines.append("  ".join(f"{key}={value}" for key, value in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+def span(name, **attrs):
+    """在当前激活的Tracer中创建span；未启用追踪时返回空span"""
+    state = _current.get()
+    if state is None:
+        return NOOP_SPAN
+    return state[0].span(name, **attrs)
+
+def current_span():
+    """返回当前span，未启用追踪时返回空span"""
+    state = _current.get()
+    if state is None or state[1] is None:
+        return NOOP_SPAN
+    return state[1]
+
+def count(key, n=1):
+    """累加当前span和Tracer上的计数，如bytes_written、retries"""
+    state = _current.get()
+    if state is None:
+        return
+    tracer, current = state
+    tracer.add(key, n)
+    if current is not None:
+        current.add(key, n)
+
+def bind(fn):
+    """把当前上下文(包括激活的Tracer和span)绑定到fn上，用于在其他线程中执行"""
+    if _current.get() is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        # 同一个Context不能同时在多个线程中进入，每次调用使用一个副本
+        return context.copy().run(fn, *args, **kwargs)
+    return bound